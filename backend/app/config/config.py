@@ -14,11 +14,142 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+    # Connection pools (the sync and the asyncio engine each get one of this size)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+    # Users and assistant ownership seen by recent requests (per process; admin changes invalidate them)
+    AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+    AUTH_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
     # Azure Storage Configuration
     AZURE_STORAGE_CONNECTION_STRING: str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
     AZURE_CONTAINER_NAME: str = os.getenv("AZURE_CONTAINER_NAME")
 
+    # Blob transfer ("azure", or "local" to use a directory as a stand-in for tests/dev)
+    BLOB_BACKEND: str = os.getenv("BLOB_BACKEND", "azure")
+    LOCAL_BLOB_DIR: str = os.getenv("LOCAL_BLOB_DIR", "local_blob_storage")
+    BLOB_FILE_CONCURRENCY: int = int(os.getenv("BLOB_FILE_CONCURRENCY", 4))
+    BLOB_BLOCK_CONCURRENCY: int = int(os.getenv("BLOB_BLOCK_CONCURRENCY", 4))
+    BLOB_BLOCK_SIZE: int = int(os.getenv("BLOB_BLOCK_SIZE", 8 * 1024 * 1024))
+
     # Google API Key
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
 
+    # In-process cache of loaded vector stores (default 1 GiB)
+    VECTOR_STORE_CACHE_MAX_BYTES: int = int(os.getenv("VECTOR_STORE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+    # Local on-disk cache of downloaded assistant data (default 20 GiB, "lru" or "lfu")
+    LOCAL_CACHE_MAX_BYTES: int = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 20 * 1024 * 1024 * 1024))
+    LOCAL_CACHE_POLICY: str = os.getenv("LOCAL_CACHE_POLICY", "lru")
+    LOCAL_CACHE_FRESHNESS_SECONDS: int = int(os.getenv("LOCAL_CACHE_FRESHNESS_SECONDS", 300))
+    PREWARM_TOP_N: int = int(os.getenv("PREWARM_TOP_N", 0))
+    # Load counts shared by all pods (index_usage table), used to pick what to pre-warm
+    INDEX_USAGE_TRACKING: bool = os.getenv("INDEX_USAGE_TRACKING", "true").lower() == "true"
+    INDEX_USAGE_FLUSH_SECONDS: float = float(os.getenv("INDEX_USAGE_FLUSH_SECONDS", 30))
+
+    # Query embedding cache (in-memory LRU backed by SQLite on disk)
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", "temp_embedding_cache")
+    QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES: int = int(os.getenv("QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES", 10000))
+    QUERY_EMBEDDING_CACHE_DISK_ENTRIES: int = int(os.getenv("QUERY_EMBEDDING_CACHE_DISK_ENTRIES", 500000))
+
+    # Embedding model for new assistants, "<provider>[:<model>]" (see app.rag.embeddings);
+    # existing assistants keep the model recorded on their row
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "gemini")
+    # "local" provider: sentence-transformers on the CPU, ONNX backend needs optimum[onnxruntime]
+    LOCAL_EMBEDDING_MODEL: str = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    # Specs clients may pick when creating an assistant (comma-separated); EMBEDDING_PROVIDER is always allowed
+    EMBEDDING_MODELS_ALLOWED: list = [
+        spec.strip() for spec in os.getenv(
+            "EMBEDDING_MODELS_ALLOWED", f"gemini:models/gemini-embedding-001,local:{LOCAL_EMBEDDING_MODEL}"
+        ).split(",") if spec.strip()
+    ]
+    LOCAL_EMBEDDING_BACKEND: str = os.getenv("LOCAL_EMBEDDING_BACKEND", "onnx")  # onnx | torch
+    LOCAL_EMBEDDING_ONNX_FILE: str = os.getenv("LOCAL_EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+    LOCAL_EMBEDDING_THREADS: int = int(os.getenv("LOCAL_EMBEDDING_THREADS", os.cpu_count() or 1))
+    LOCAL_EMBEDDING_BATCH_SIZE: int = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 64))
+    LOCAL_EMBEDDING_CONCURRENCY: int = int(os.getenv("LOCAL_EMBEDDING_CONCURRENCY", 2))
+
+    # PDF extraction ("pypdf" matches PyPDFLoader output, "pymupdf" is faster)
+    PDF_EXTRACT_BACKEND: str = os.getenv("PDF_EXTRACT_BACKEND", "pypdf")
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+    # Stored vector precision in the mmap index format ("float32" or "float16")
+    INDEX_VECTOR_DTYPE: str = os.getenv("INDEX_VECTOR_DTYPE", "float32")
+    # Memory cap for the vectors sampled to train sq8 / ivf_pq indexes (default 256 MiB)
+    ANN_TRAIN_MAX_BYTES: int = int(os.getenv("ANN_TRAIN_MAX_BYTES", 256 * 1024 * 1024))
+
+    # Ingest embedding pipeline
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+    EMBEDDING_MIN_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MIN_BATCH_SIZE", 10))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 100))
+    EMBEDDING_REQUESTS_PER_MINUTE: int = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", 600))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+
+    # Background ingestion jobs
+    INGEST_WORK_DIR: str = os.getenv("INGEST_WORK_DIR", "temp_ingest_jobs")
+    # Worker processes started by the API itself; set to 0 when running python -m app.rag.ingest_worker separately
+    INGEST_EMBEDDED_WORKERS: int = int(os.getenv("INGEST_EMBEDDED_WORKERS", 1))
+    INGEST_MAX_JOBS_PER_USER: int = int(os.getenv("INGEST_MAX_JOBS_PER_USER", 1))
+    INGEST_POLL_SECONDS: float = float(os.getenv("INGEST_POLL_SECONDS", 1.0))
+    INGEST_JOB_STALE_SECONDS: int = int(os.getenv("INGEST_JOB_STALE_SECONDS", 120))
+    INGEST_JOB_MAX_ATTEMPTS: int = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+
+    # Tracing: OpenTelemetry spans for each timed stage (needs the opentelemetry SDK + OTLP exporter)
+    OTEL_ENABLED: bool = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+    OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "dynamic-rag-backend")
+
+    # Prompt size limits (estimated tokens, see app.rag.context)
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))
+    HISTORY_RECENT_MESSAGES: int = int(os.getenv("HISTORY_RECENT_MESSAGES", 4))
+    HISTORY_CONDENSED_TOKENS: int = int(os.getenv("HISTORY_CONDENSED_TOKENS", 60))
+    QUESTION_MAX_TOKENS: int = int(os.getenv("QUESTION_MAX_TOKENS", 1000))
+    CONTEXT_DUPLICATE_SIMILARITY: float = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", 0.8))
+    CONTEXT_MIN_BLOCK_TOKENS: int = int(os.getenv("CONTEXT_MIN_BLOCK_TOKENS", 50))
+
+    # Hybrid retrieval: BM25 + vector search fused with reciprocal rank fusion
+    HYBRID_RETRIEVAL_ENABLED: bool = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATE_FACTOR: int = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 4))
+    RRF_K: int = int(os.getenv("RRF_K", 60))
+    LEXICAL_SEARCH_WORKERS: int = int(os.getenv("LEXICAL_SEARCH_WORKERS", 4))
+    # Queries of at most this many terms, each in at most this many chunks (and at most this
+    # fraction of them), skip the embedding call. Off for stores below the minimum size, where
+    # almost every term is that rare.
+    LEXICAL_ONLY_MAX_TERMS: int = int(os.getenv("LEXICAL_ONLY_MAX_TERMS", 3))
+    LEXICAL_ONLY_MAX_DF: int = int(os.getenv("LEXICAL_ONLY_MAX_DF", 20))
+    LEXICAL_ONLY_MAX_DF_RATIO: float = float(os.getenv("LEXICAL_ONLY_MAX_DF_RATIO", 0.001))
+    LEXICAL_ONLY_MIN_CHUNKS: int = int(os.getenv("LEXICAL_ONLY_MIN_CHUNKS", 5000))
+
+    # Optional cross-encoder rerank of over-fetched candidates ("onnx" or "torch" backend)
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "onnx")
+    RERANK_ONNX_FILE: str = os.getenv("RERANK_ONNX_FILE", "onnx/model_qint8_avx512.onnx")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", 20))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", 32))
+    RERANK_MAX_LENGTH: int = int(os.getenv("RERANK_MAX_LENGTH", 512))
+
+    # Semantic answer cache (opt-in)
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 5000))
+    ANSWER_CACHE_MAX_PER_ASSISTANT: int = int(os.getenv("ANSWER_CACHE_MAX_PER_ASSISTANT", 256))
+
+    # Server-side chat sessions: stored history length, and reuse of the last retrieval
+    # for follow-ups whose query embedding is this close (cosine) to the one it was made for
+    CHAT_SESSION_MAX_MESSAGES: int = int(os.getenv("CHAT_SESSION_MAX_MESSAGES", 20))
+    SESSION_RETRIEVAL_SIMILARITY: float = float(os.getenv("SESSION_RETRIEVAL_SIMILARITY", 0.9))
+    SESSION_RETRIEVAL_TTL_SECONDS: int = int(os.getenv("SESSION_RETRIEVAL_TTL_SECONDS", 1800))
+    SESSION_RETRIEVAL_MAX_ENTRIES: int = int(os.getenv("SESSION_RETRIEVAL_MAX_ENTRIES", 10000))
+
+    # POST /chat/batch: questions per call and LLM generations in flight per call
+    CHAT_BATCH_MAX_QUERIES: int = int(os.getenv("CHAT_BATCH_MAX_QUERIES", 500))
+    CHAT_BATCH_CONCURRENCY: int = int(os.getenv("CHAT_BATCH_CONCURRENCY", 8))
+
 settings = Settings()
\ No newline at end of file
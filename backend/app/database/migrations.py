@@ -0,0 +1,22 @@
+from sqlalchemy import text
+
+# create_all() only creates missing tables; columns added to existing tables go here.
+# Every statement must be idempotent, they run on each startup.
+MIGRATIONS = [
+    "ALTER TABLE assistants ADD COLUMN IF NOT EXISTS artifact_id INTEGER REFERENCES index_artifacts(id)",
+    "ALTER TABLE assistants ADD COLUMN IF NOT EXISTS index_type VARCHAR NOT NULL DEFAULT 'auto'",
+    # Base64 rows are moved to blobs by app.rag.thumbnails.migrate_inline_thumbnails
+    "ALTER TABLE assistants ADD COLUMN IF NOT EXISTS thumbnail_key VARCHAR",
+    # Every assistant before embedding providers was embedded with Gemini
+    "ALTER TABLE assistants ADD COLUMN IF NOT EXISTS embedding_model VARCHAR NOT NULL "
+    "DEFAULT 'gemini:models/gemini-embedding-001'",
+    # Single-PDF assistants from before multi-document support own their file as segment seg-0000
+    "INSERT INTO assistant_documents (assistant_id, file_name, document_key, status) "
+    "SELECT a.id, a.file_name, 'seg-0000', 'ready' FROM assistants a "
+    "WHERE NOT EXISTS (SELECT 1 FROM assistant_documents d WHERE d.assistant_id = a.id)",
+]
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Float, Integer, String, ForeignKey, DateTime, Enum, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Float, Integer, String, ForeignKey, DateTime, Enum, Text, JSON
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import enum
 from .database import Base
@@ -24,14 +24,116 @@ class Assistant(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     file_name = Column(String, nullable=False)
-    image_base64 = Column(Text, nullable=True)
+    # Legacy inline thumbnails, only read by app.rag.thumbnails when moving them to blobs
+    image_base64 = deferred(Column(Text, nullable=True))
+    thumbnail_key = Column(String, nullable=True)  # sha256 of the PNG in blob storage
     temperature = Column(Float, default=0.5) 
     top_k = Column(Integer, default=5)       
 
     chunk_size = Column(Integer, default=500)
     chunk_overlap = Column(Integer, default=50)
+    # auto | flat | hnsw | ivf_pq | sq8 (see app.rag.ann_index)
+    index_type = Column(String, default="auto", nullable=False, server_default="auto")
+    # Embedding provider spec, "<provider>:<model>" (see app.rag.embeddings)
+    embedding_model = Column(String, nullable=False, server_default="gemini:models/gemini-embedding-001")
 
     owner_id = Column(Integer, ForeignKey("users.id"))
+    artifact_id = Column(Integer, ForeignKey("index_artifacts.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    owner = relationship("User", back_populates="assistants")
\ No newline at end of file
+    owner = relationship("User", back_populates="assistants")
+    artifact = relationship("IndexArtifact", back_populates="assistants")
+    documents = relationship(
+        "AssistantDocument",
+        back_populates="assistant",
+        order_by="AssistantDocument.id",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+    @property
+    def storage_key(self) -> str:
+        # Blob prefix / local cache key of the index this assistant reads from
+        return self.artifact.blob_prefix if self.artifact else str(self.id)
+
+    @property
+    def thumbnail_url(self):
+        return f"/assistants/thumbnails/{self.thumbnail_key}.png" if self.thumbnail_key else None
+
+class IndexArtifact(Base):
+    __tablename__ = "index_artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256 of (file hash, chunk_size, chunk_overlap, embedding model[, index type])
+    content_key = Column(String, unique=True, index=True, nullable=False)
+    file_hash = Column(String, index=True, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    chunk_overlap = Column(Integer, nullable=False)
+    embedding_model = Column(String, nullable=False)
+
+    blob_prefix = Column(String, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    status = Column(String, default="pending", nullable=False)  # pending | ready | editing
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    assistants = relationship("Assistant", back_populates="artifact")
+class IndexUsage(Base):
+    __tablename__ = "index_usage"
+
+    # Storage key (blob prefix) of an index; counted across pods to pick what to pre-warm
+    storage_key = Column(String, primary_key=True)
+    hits = Column(Integer, default=0, nullable=False)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AssistantDocument(Base):
+    __tablename__ = "assistant_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    assistant_id = Column(Integer, ForeignKey("assistants.id", ondelete="CASCADE"), index=True, nullable=False)
+    file_name = Column(String, nullable=False)
+    file_hash = Column(String, nullable=True)
+    # Segment name inside the index store; also the "document_id" in chunk metadata
+    document_key = Column(String, nullable=False)
+    page_count = Column(Integer, nullable=True)
+    chunk_count = Column(Integer, nullable=True)
+    status = Column(String, default="processing", nullable=False)  # processing | ready
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    assistant = relationship("Assistant", back_populates="documents")
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # create | append
+    assistant_id = Column(Integer, ForeignKey("assistants.id", ondelete="CASCADE"), index=True, nullable=False)
+    document_id = Column(Integer, ForeignKey("assistant_documents.id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+
+    status = Column(String, default="queued", nullable=False, index=True)  # queued | running | succeeded | failed
+    stage = Column(String, default="queued", nullable=False)  # queued | extracting | embedding | indexing | uploading | done
+    progress = Column(Integer, default=0, nullable=False)
+    message = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+
+    file_path = Column(String, nullable=False)
+    params = Column(JSON, nullable=False)
+    # Stages already completed by earlier attempts (extracted / embedded / uploaded)
+    checkpoint = Column(JSON, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    id = Column(String, primary_key=True)  # uuid4 hex, handed to the client
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    assistant_id = Column(Integer, ForeignKey("assistants.id", ondelete="CASCADE"), index=True, nullable=False)
+    # [[role, content], ...] oldest first, capped at CHAT_SESSION_MAX_MESSAGES
+    messages = Column(JSON, nullable=False, default=list)
+    turns = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -35,6 +35,7 @@ class AssistantBase(BaseModel):
     top_k: int = 5
     chunk_size: int = 500
     chunk_overlap: int = 50
+    index_type: str = "auto"
 
 class AssistantCreate(AssistantBase):
     pass 
@@ -42,7 +43,36 @@ class AssistantCreate(AssistantBase):
 class AssistantResponse(AssistantBase):
     id: int
     file_name: str
-    image_base64: Optional[str] = None 
+    thumbnail_url: Optional[str] = None
+    embedding_model: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class AssistantDocumentResponse(BaseModel):
+    id: int
+    file_name: str
+    document_key: str
+    page_count: Optional[int] = None
+    chunk_count: Optional[int] = None
+    status: str
+    created_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class IngestJobResponse(BaseModel):
+    id: Optional[int] = None
+    kind: Optional[str] = None
+    document_id: Optional[int] = None
+    status: str
+    stage: str
+    progress: int
+    message: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: Optional[datetime.datetime] = None
+    updated_at: Optional[datetime.datetime] = None
 
     class Config:
         from_attributes = True
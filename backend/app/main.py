@@ -1,17 +1,48 @@
 import os
+import threading
 
 # workaround for OMP: Error #15: Initializing libomp.dylib, but found libomp.dylib already initialized.
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response, status
+from fastapi.concurrency import run_in_threadpool
 
 from app.rag import chat
 from app.routers import assistants, admin, authentication
 from app.database import models
 from app.database.database import engine
+from app.database.migrations import run_migrations
+from app.rag.load import prewarm
+from app.rag.ingest_worker import start_workers, stop_workers
+from app.rag.thumbnails import migrate_inline_thumbnails
+from app.rag.metrics import register_cache_metrics, render_metrics
+from app.rag.cache import vector_store_cache, answer_cache
+from app.rag.embeddings import query_embedding_cache
+from app.rag.sessions import session_retrieval_cache
+from app.rag.usage import index_usage
+from app.security.auth_cache import auth_cache
+from app.config.config import settings
 from fastapi.responses import RedirectResponse
 
-app = FastAPI(title="RAG Tool Backend API", version="1.0.0")
+readiness = {"ready": False}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the hottest assistants before the pod reports ready
+    if settings.PREWARM_TOP_N > 0:
+        await run_in_threadpool(prewarm, settings.PREWARM_TOP_N)
+    # Leftover base64 thumbnails move to blob storage without holding up startup
+    threading.Thread(target=migrate_inline_thumbnails, name="thumbnail-migration", daemon=True).start()
+
+    # Ingestion runs in its own processes so uploads never compete with chat for the event loop
+    ingest_workers = start_workers(settings.INGEST_EMBEDDED_WORKERS)
+    readiness["ready"] = True
+    yield
+    stop_workers(ingest_workers)
+    index_usage.flush()
+
+app = FastAPI(title="RAG Tool Backend API", version="1.0.0", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -30,9 +61,30 @@ app.include_router(chat.router)
 
 
 models.Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 @app.get("/", include_in_schema=False)
 def health_check():
     return {"status": "API is running"}
 
+register_cache_metrics({
+    "vector_store": vector_store_cache,
+    "answer": answer_cache,
+    "query_embedding": query_embedding_cache,
+    "auth": auth_cache,
+    "session_retrieval": session_retrieval_cache
+})
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/ready", include_in_schema=False)
+def readiness_check(response: Response):
+    if not readiness["ready"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "warming up"}
+    return {"status": "ready"}
+
 
@@ -0,0 +1,244 @@
+import os
+import time
+import numpy as np
+from typing import Tuple
+from app.config.config import settings
+
+# Index types an assistant can ask for; "auto" picks one from the chunk count
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf_pq", "sq8")
+ANN_INDEX_FILE = "index.faiss"
+
+# Rows added to FAISS per call when reading back from the mmap matrix
+ADD_BLOCK_ROWS = 65536
+# Candidates per result re-scored exactly for the compressed (lossy) index types
+REFINE_FACTOR = 4
+# Recall queries are stored vectors moved by this much Gaussian noise (relative to their norm),
+# so they are near but not identical to a row, like real questions
+QUERY_NOISE = 0.1
+
+
+def choose_index_type(count: int) -> str:
+    # Exact search is cheap enough below ~10k chunks; an 8-bit scan (a quarter of the bytes) next;
+    # compressed lists for very large stores. HNSW is opt-in only: it keeps a second float32 copy
+    # of every vector and cannot be mmapped, so each worker process would hold it all in RAM.
+    if count < 10_000:
+        return "flat"
+    if count < 100_000:
+        return "sq8"
+    return "ivf_pq"
+
+
+def _pq_subquantizers(dim: int) -> int:
+    # Largest sub-quantizer count <= 64 that divides the dimension
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _matrix_blocks(matrix, block_rows: int = ADD_BLOCK_ROWS):
+    for start in range(0, matrix.shape[0], block_rows):
+        yield np.ascontiguousarray(matrix[start:start + block_rows], dtype=np.float32)
+
+
+def _training_rows(dim: int, wanted: int, minimum: int = 1) -> int:
+    # Training samples are copied into memory as float32, so ANN_TRAIN_MAX_BYTES caps them
+    return max(minimum, min(wanted, settings.ANN_TRAIN_MAX_BYTES // (dim * 4)))
+
+
+def _training_sample(matrix, size: int, seed: int = 0) -> np.ndarray:
+    count = matrix.shape[0]
+    if count <= size:
+        return np.ascontiguousarray(matrix, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(seed).choice(count, size=size, replace=False))
+    return np.ascontiguousarray(matrix[rows], dtype=np.float32)
+
+
+def build_ann_index(matrix, index_type: str):
+    """Train (if needed) and fill a FAISS index over an (n, d) matrix, possibly mmap-backed."""
+    import faiss
+
+    count, dim = matrix.shape
+    params = {}
+
+    if index_type == "hnsw":
+        params = {"M": 32, "efConstruction": 80, "efSearch": 64}
+        index = faiss.IndexHNSWFlat(dim, params["M"])
+        index.hnsw.efConstruction = params["efConstruction"]
+        index.hnsw.efSearch = params["efSearch"]
+
+    elif index_type == "ivf_pq":
+        nlist = max(1, min(int(4 * np.sqrt(count)), count // 39))
+        params = {"nlist": nlist, "m": _pq_subquantizers(dim), "nbits": 8, "nprobe": min(16, nlist)}
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["m"], params["nbits"])
+        # PQ needs at least 2^nbits training vectors, IVF at least one per list
+        index.train(_training_sample(matrix, _training_rows(dim, max(nlist * 39, 256 * 39), max(nlist, 256))))
+        index.nprobe = params["nprobe"]
+
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+        index.train(_training_sample(matrix, _training_rows(dim, 100_000)))
+
+    else:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+
+    for block in _matrix_blocks(matrix):
+        index.add(block)
+    return index, params
+
+
+def configure_for_search(index, index_type: str, params: dict):
+    # Search-time knobs are not always persisted with the index
+    if index_type == "hnsw":
+        import faiss
+        faiss.downcast_index(index).hnsw.efSearch = params.get("efSearch", 64)
+    elif index_type == "ivf_pq":
+        import faiss
+        faiss.extract_index_ivf(index).nprobe = params.get("nprobe", 16)
+
+
+def read_ann_index(path: str):
+    import faiss
+
+    # Map the index file instead of copying it where the index type supports it
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def _can_mmap(path: str) -> bool:
+    import faiss
+
+    try:
+        faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        return True
+    except RuntimeError:
+        return False
+
+
+def memory_report(index_path: str, matrix) -> dict:
+    """What the ANN index costs on top of the stored vectors (kept for exact refine in every type)."""
+    index_bytes = os.path.getsize(index_path)
+    mmapped = _can_mmap(index_path)
+    return {
+        "vector_bytes": int(matrix.nbytes),
+        "index_bytes": index_bytes,
+        "disk_bytes": int(matrix.nbytes) + index_bytes,
+        "index_mmapped": mmapped,
+        # Not mappable: every process that opens the store reads the whole index into its heap
+        "heap_bytes_per_process": 0 if mmapped else index_bytes,
+    }
+
+
+def exact_search(matrix, norms, queries: np.ndarray, k: int) -> np.ndarray:
+    """Exact L2 top-k row ids for a batch of queries, scored block by block."""
+    return exact_search_with_distances(matrix, norms, queries, k)[0]
+
+
+def exact_search_with_distances(matrix, norms, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(row ids, squared L2 distances), each (len(queries), <=k) and nearest first."""
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    best_dist = np.zeros((len(queries), 0), dtype=np.float32)
+    query_norms = np.square(queries).sum(axis=1)[:, None]
+
+    for start, block in zip(range(0, matrix.shape[0], ADD_BLOCK_ROWS), _matrix_blocks(matrix)):
+        dist = norms[start:start + len(block)][None, :] - 2.0 * (queries @ block.T) + query_norms
+        ids = np.broadcast_to(np.arange(start, start + len(block)), dist.shape)
+        all_dist = np.concatenate([best_dist, dist], axis=1)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+        top = min(k, all_dist.shape[1])
+        keep = np.argpartition(all_dist, top - 1, axis=1)[:, :top]
+        best_dist = np.take_along_axis(all_dist, keep, axis=1)
+        best_ids = np.take_along_axis(all_ids, keep, axis=1)
+
+    order = np.argsort(best_dist, axis=1)
+    return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_dist, order, axis=1)
+
+
+def refine_factor(index_type: str) -> int:
+    return REFINE_FACTOR if index_type in ("ivf_pq", "sq8") else 1
+
+
+def _recall_queries(matrix, size: int, seed: int = 1) -> np.ndarray:
+    # Stored vectors themselves would always find their own row first and inflate recall
+    queries = _training_sample(matrix, size, seed=seed)
+    noise = np.random.default_rng(seed).standard_normal(queries.shape).astype(np.float32)
+    scale = QUERY_NOISE * np.linalg.norm(queries, axis=1, keepdims=True) / np.sqrt(queries.shape[1])
+    return np.ascontiguousarray(queries + noise * scale, dtype=np.float32)
+
+
+def evaluate_index(index, index_type: str, matrix, norms, k: int = 10, sample_queries: int = 100) -> dict:
+    """recall@k and per-query latency of the ANN index against exact search, on perturbed stored vectors."""
+    count = matrix.shape[0]
+    queries = _recall_queries(matrix, min(sample_queries, count))
+    k = min(k, count)
+
+    started = time.perf_counter()
+    exact = exact_search(matrix, norms, queries, k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    started = time.perf_counter()
+    _, approx = index.search(queries, k * refine_factor(index_type))
+    approx = refine(matrix_gather(matrix, norms), queries, approx, k)
+    ann_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact.tolist(), approx.tolist()))
+    return {
+        "k": k,
+        "queries": len(queries),
+        "query_source": f"stored vectors + {QUERY_NOISE:g} relative Gaussian noise",
+        f"recall@{k}": hits / (len(queries) * k),
+        "exact_ms_per_query": round(exact_ms, 3),
+        "ann_ms_per_query": round(ann_ms, 3),
+    }
+
+
+def matrix_gather(matrix, norms):
+    def gather(row_ids: np.ndarray):
+        return np.asarray(matrix[row_ids], dtype=np.float32), norms[row_ids]
+    return gather
+
+
+def refine(gather, queries: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """Re-rank ANN candidates with exact distances from the stored vectors.
+
+    `gather(row_ids)` returns (vectors, squared norms) for sorted global row ids.
+    """
+    if candidates.shape[1] <= k:
+        return candidates
+
+    results = []
+    for query, row_ids in zip(queries, candidates):
+        row_ids = np.sort(row_ids[row_ids >= 0])
+        vectors, norms = gather(row_ids)
+        dist = norms - 2.0 * (vectors @ query)
+        results.append(row_ids[np.argsort(dist)[:k]])
+
+    width = max(len(r) for r in results)
+    return np.stack([np.pad(r, (0, width - len(r)), constant_values=-1) for r in results])
+
+
+def build_and_save(store_dir: str, matrix, norms, requested_type: str) -> dict:
+    """Build the requested (or automatic) index next to the store; returns its descriptor."""
+    index_type = choose_index_type(matrix.shape[0]) if requested_type in (None, "auto") else requested_type
+    if index_type == "ivf_pq" and matrix.shape[0] < 256 * 39:
+        # Too few vectors to train 256-centroid product quantizers
+        print(f"Only {matrix.shape[0]} vectors, using sq8 instead of ivf_pq")
+        index_type = "sq8"
+    if index_type == "flat":
+        return {"type": "flat"}
+
+    import faiss
+
+    started = time.perf_counter()
+    index, params = build_ann_index(matrix, index_type)
+    build_seconds = time.perf_counter() - started
+    index_path = os.path.join(store_dir, ANN_INDEX_FILE)
+    faiss.write_index(index, index_path)
+
+    report = evaluate_index(index, index_type, matrix, norms)
+    report["build_seconds"] = round(build_seconds, 2)
+    report.update(memory_report(index_path, matrix))
+    return {"type": index_type, "file": ANN_INDEX_FILE, "params": params, "report": report}
@@ -0,0 +1,57 @@
+import os
+import shutil
+import hashlib
+from sqlalchemy.orm import Session
+from app.database import models
+from app.rag.cache import vector_store_cache, answer_cache
+from app.rag.embedding_store import chunk_embedding_store
+from app.rag.ingest import TEMP_DATA_DIR, DOCUMENT_EMBEDDING_KEY
+from app.rag.storage import delete_assistant_data
+from app.rag.load import local_cache
+from app.rag.usage import index_usage
+
+
+def artifact_content_key(file_hash: str, chunk_size: int, chunk_overlap: int, embedding_model: str = DOCUMENT_EMBEDDING_KEY, index_type: str = "auto") -> str:
+    # "auto" keeps the pre-index-type key so existing artifacts stay shareable
+    suffix = "" if index_type == "auto" else f":{index_type}"
+    return hashlib.sha256(f"{file_hash}:{chunk_size}:{chunk_overlap}:{embedding_model}{suffix}".encode("utf-8")).hexdigest()
+
+
+def find_ready_artifact(db: Session, content_key: str):
+    return db.query(models.IndexArtifact).filter(
+        models.IndexArtifact.content_key == content_key,
+        models.IndexArtifact.status == "ready"
+    ).with_for_update().first()
+
+
+def release_assistant_storage(db: Session, assistant: models.Assistant):
+    """Drop an assistant's hold on its index; delete the artifacts once nobody shares them.
+
+    Must run before the assistant row itself is deleted. The caller commits.
+    """
+    storage_key = assistant.storage_key
+    answer_cache.invalidate(str(assistant.id))
+
+    artifact = assistant.artifact
+    if artifact is not None:
+        artifact.ref_count -= 1
+        if artifact.ref_count > 0:
+            print(f"--- Index {storage_key} still shared by {artifact.ref_count} assistant(s), keeping blobs ---")
+            return
+
+        assistant.artifact_id = None
+        db.flush()
+        db.delete(artifact)
+
+    # Clean up cloud storage
+    delete_assistant_data(storage_key)
+    index_usage.forget(db, storage_key)
+
+    # Clean up local temp files
+    local_path = os.path.join(TEMP_DATA_DIR, storage_key)
+    if os.path.exists(local_path):
+        shutil.rmtree(local_path)
+
+    vector_store_cache.invalidate(storage_key)
+    local_cache.forget(storage_key)
+    chunk_embedding_store.release(storage_key)
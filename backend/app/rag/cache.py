@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.config.config import settings
+
+
+def estimate_vector_store_bytes(vector_store) -> int:
+    """Rough in-memory footprint of a loaded store (vectors + chunk text)."""
+    if hasattr(vector_store, "nbytes"):
+        return vector_store.nbytes
+
+    index = vector_store.index
+    size = index.ntotal * index.d * 4
+
+    docstore = getattr(vector_store.docstore, "_dict", {})
+    for doc in docstore.values():
+        size += len(doc.page_content.encode("utf-8"))
+
+    return size
+
+
+class VectorStoreCache:
+    """Process-wide LRU of loaded vector stores, bounded by an estimated byte budget."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # assistant_id -> (vector_store, size)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        # Bumped by invalidate(), so a load that started before it cannot put stale data back
+        self._generations = {}
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, assistant_id: str, record_stats: bool = True):
+        with self._lock:
+            entry = self._entries.get(assistant_id)
+            if entry is None:
+                if record_stats:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(assistant_id)
+            if record_stats:
+                self.hits += 1
+            return entry[0]
+
+    def load_lock(self, assistant_id: str) -> threading.Lock:
+        """Per-assistant lock so concurrent misses deserialize the index only once."""
+        with self._lock:
+            return self._load_locks.setdefault(assistant_id, threading.Lock())
+
+    def generation(self, assistant_id: str) -> int:
+        """Take before loading; pass to put() along with the loaded store."""
+        with self._lock:
+            return self._generations.get(assistant_id, 0)
+
+    def put(self, assistant_id: str, vector_store, size: int, generation: int = None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(assistant_id, 0):
+                # Invalidated mid-load: the store was opened from files that are gone or replaced
+                return
+            old = self._entries.pop(assistant_id, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+
+            # A single store larger than the whole budget is served but never cached
+            if size > self.max_bytes:
+                return
+
+            self._entries[assistant_id] = (vector_store, size)
+            self._total_bytes += size
+
+            while self._total_bytes > self.max_bytes and self._entries:
+                evicted_id, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+                print(f"--- Vector Store Cache: evicted Assistant {evicted_id} ---")
+
+    def invalidate(self, assistant_id: str):
+        with self._lock:
+            entry = self._entries.pop(assistant_id, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+            # The load lock stays: a new request must wait for a load still running, not start a second one
+            self._generations[assistant_id] = self._generations.get(assistant_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+vector_store_cache = VectorStoreCache(max_bytes=settings.VECTOR_STORE_CACHE_MAX_BYTES)
+
+
+class AnswerCache:
+    """Per-assistant semantic cache of chat answers.
+
+    An entry is reused when the assistant config matches and the cosine similarity
+    of the query embeddings clears the threshold. Entries expire after a TTL and
+    the cache is bounded both per assistant and in total (oldest first).
+    """
+
+    def __init__(self, similarity: float, ttl_seconds: int, max_entries: int, max_per_assistant: int):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_per_assistant = max_per_assistant
+        self._assistants = OrderedDict()  # assistant_id -> list of entries, oldest first
+        self._lock = threading.Lock()
+        self._count = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, assistant_id: str, config: tuple, query_vector):
+        query = self._normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            entries = self._assistants.get(assistant_id)
+            if entries:
+                fresh = [e for e in entries if now - e["created_at"] < self.ttl_seconds]
+                self._count -= len(entries) - len(fresh)
+                self._assistants[assistant_id] = fresh
+                entries = fresh
+
+            candidates = [e for e in entries or [] if e["config"] == config]
+            if candidates:
+                scores = np.stack([e["vector"] for e in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    self._assistants.move_to_end(assistant_id)
+                    self.hits += 1
+                    return candidates[best]["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, assistant_id: str, config: tuple, query_vector, answer):
+        entry = {
+            "config": config,
+            "vector": self._normalize(query_vector),
+            "answer": answer,
+            "created_at": time.time(),
+        }
+
+        with self._lock:
+            entries = self._assistants.setdefault(assistant_id, [])
+            self._assistants.move_to_end(assistant_id)
+            entries.append(entry)
+            self._count += 1
+
+            if len(entries) > self.max_per_assistant:
+                entries.pop(0)
+                self._count -= 1
+
+            # Evict whole least-recently-used assistants until under the global bound
+            while self._count > self.max_entries and len(self._assistants) > 1:
+                _, evicted = self._assistants.popitem(last=False)
+                self._count -= len(evicted)
+
+    def invalidate(self, assistant_id: str):
+        with self._lock:
+            entries = self._assistants.pop(assistant_id, None)
+            if entries:
+                self._count -= len(entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": settings.ANSWER_CACHE_ENABLED,
+                "assistants": len(self._assistants),
+                "entries": self._count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache(
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_per_assistant=settings.ANSWER_CACHE_MAX_PER_ASSISTANT
+)
+
+
+def invalidate_assistant(assistant_id: str):
+    """Drop everything cached in-process for an assistant (on delete or re-ingest)."""
+    vector_store_cache.invalidate(assistant_id)
+    answer_cache.invalidate(assistant_id)
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import json
+import time
+import asyncio
+import datetime
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 # LangChain & Gemini Imports
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -9,10 +16,20 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 # App Imports
-from app.database.database import get_db
+from app.database.database import get_db, AsyncSessionLocal
 from app.database import models
 from app.security.Oauth2 import get_current_user
+from app.security.auth_cache import auth_cache
 from app.rag.load import load_rag_engine
+from app.rag.embeddings import get_query_embeddings
+from app.rag.cache import answer_cache
+from app.rag.sessions import (
+    new_session_id, session_history, get_chat_session, aget_chat_session,
+    record_turn, arecord_turn, session_retrieval_cache
+)
+from app.rag.retrieval import HybridSearch, search_many
+from app.rag.metrics import stage, observe_stage
+from app.rag.context import estimate_tokens, truncate_to_tokens, pack_context, compress_history
 from app.config.config import settings
 import re
 
@@ -71,6 +88,45 @@ def convert_backticks_to_latex(text: str) -> str:
     
     return text
 
+def _safe_cut(text: str) -> int:
+    """Index up to which `text` holds no unterminated backtick, \\( or \\[ span."""
+    cut = len(text)
+
+    # An odd number of backticks means the last one is still open
+    if text.count('`') % 2 == 1:
+        cut = min(cut, text.rfind('`'))
+
+    for opener, closer in (('\\(', '\\)'), ('\\[', '\\]')):
+        start = text.rfind(opener)
+        if start != -1 and text.find(closer, start) == -1:
+            cut = min(cut, start)
+
+    # A trailing backslash may be the first half of a delimiter
+    if text.endswith('\\'):
+        cut = min(cut, len(text) - 1)
+
+    return cut
+
+class LatexStreamConverter:
+    """Incremental convert_backticks_to_latex for token streams.
+
+    Text is only held back while a math span is still open, so each converted
+    piece contains complete spans and matches the one-shot conversion.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        self._pending += chunk
+        cut = _safe_cut(self._pending)
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return convert_backticks_to_latex(ready) if ready else ""
+
+    def flush(self) -> str:
+        ready, self._pending = self._pending, ""
+        return convert_backticks_to_latex(ready) if ready else ""
+
 # --- Pydantic Models for Request/Response ---
 class ChatMessage(BaseModel):
     role: str  # 'user' or 'assistant'
@@ -80,50 +136,35 @@ class ChatRequest(BaseModel):
     assistant_id: int
     query: str
     chat_history: List[ChatMessage] = []  # Last 6 messages (3 pairs)
+    # Server-side history instead of chat_history (see POST /chat/sessions)
+    session_id: Optional[str] = None
 
-class ChatResponse(BaseModel):
-    response: str
-    sources: List[int] = []
-
-# --- The Chat Endpoint ---
-@router.post("/", response_model=ChatResponse)
-def chat_with_assistant(
-    request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    assistant = db.query(models.Assistant).filter(
-        models.Assistant.id == request.assistant_id,
-        models.Assistant.owner_id == current_user.id
-    ).first()
+class ChatSessionCreate(BaseModel):
+    assistant_id: int
 
-    if not assistant:
-        raise HTTPException(status_code=404, detail="Assistant not found or access denied")
+class ChatSessionResponse(BaseModel):
+    id: str
+    assistant_id: int
+    turns: int = 0
+    messages: List[ChatMessage] = []
+    created_at: Optional[datetime.datetime] = None
 
-    try:
-        vector_store = load_rag_engine(str(assistant.id))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to load assistant data: {str(e)}")
+class BatchChatRequest(BaseModel):
+    assistant_id: int
+    queries: List[str]
 
-    retriever = vector_store.as_retriever(search_kwargs={"k": assistant.top_k})
+class Citation(BaseModel):
+    document_id: Optional[int] = None
+    file_name: str
+    page: int
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=assistant.temperature,
-        google_api_key=settings.GOOGLE_API_KEY,
-        convert_system_message_to_human=True 
-    )
+class ChatResponse(BaseModel):
+    response: str
+    sources: List[int] = []
+    citations: List[Citation] = []
+    prompt_tokens: Optional[int] = None  # estimated, see app.rag.context
 
-    # Format chat history if present
-    history_text = ""
-    if request.chat_history:
-        history_lines = []
-        for msg in request.chat_history:
-            role_label = "User" if msg.role == "user" else "Assistant"
-            history_lines.append(f"{role_label}: {msg.content}")
-        history_text = "\n".join(history_lines)
-
-    template = """
+TUTOR_TEMPLATE = """
 You are a friendly, expert Tutor. Your goal is to help the user understand the provided text by explaining it in simple, clear terms. Imagine you are explaining this to a smart student who is learning this for the first time.
 
 INSTRUCTIONS
@@ -150,29 +191,458 @@ CONTEXT
 USER QUESTION
 {question}
 """
-    prompt = ChatPromptTemplate.from_template(template)
 
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+def _owned_assistant_query(assistant_id: int, user_id: int):
+    # Documents and artifact are loaded up front: the cached copy is used detached from any session
+    return select(models.Assistant).options(
+        selectinload(models.Assistant.documents),
+        selectinload(models.Assistant.artifact)
+    ).where(
+        models.Assistant.id == assistant_id,
+        models.Assistant.owner_id == user_id
+    )
+
+def get_owned_assistant(db: Session, assistant_id: int, user_id: int) -> models.Assistant:
+    assistant = auth_cache.get_assistant(user_id, assistant_id)
+    if assistant is None:
+        assistant = db.execute(_owned_assistant_query(assistant_id, user_id)).scalar_one_or_none()
+        if not assistant:
+            raise HTTPException(status_code=404, detail="Assistant not found or access denied")
+        db.expunge(assistant)
+        auth_cache.put_assistant(user_id, assistant_id, assistant)
+    return assistant
+
+async def aget_owned_assistant(assistant_id: int, user_id: int) -> models.Assistant:
+    assistant = auth_cache.get_assistant(user_id, assistant_id)
+    if assistant is None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(_owned_assistant_query(assistant_id, user_id))
+            assistant = result.scalar_one_or_none()
+        if not assistant:
+            raise HTTPException(status_code=404, detail="Assistant not found or access denied")
+        auth_cache.put_assistant(user_id, assistant_id, assistant)
+    return assistant
+
+def build_llm(assistant: models.Assistant) -> ChatGoogleGenerativeAI:
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=assistant.temperature,
+        google_api_key=settings.GOOGLE_API_KEY,
+        convert_system_message_to_human=True 
+    )
+
+# Template text outside the placeholders, counted once against the prompt budget
+TEMPLATE_TOKENS = estimate_tokens(TUTOR_TEMPLATE.format(context="", chat_history="", question=""))
+
+def build_prompt_vars(request: ChatRequest, retrieved_docs, history=None) -> Tuple[dict, list, int]:
+    """Prompt variables within PROMPT_TOKEN_BUDGET, the chunks that made it in, and the prompt's token count.
+
+    `history` (a session's messages) replaces request.chat_history when given.
+    """
+    question = truncate_to_tokens(request.query, settings.QUESTION_MAX_TOKENS)
+    history = request.chat_history if history is None else history
+
+    # Format chat history if present, newest turns first in line for the budget
+    history_text = ""
+    if history:
+        history_budget = min(settings.HISTORY_TOKEN_BUDGET, settings.PROMPT_TOKEN_BUDGET // 4)
+        history_text = compress_history(history, history_budget)
+    chat_history = f"PREVIOUS CONVERSATION:\n{history_text}" if history_text else ""
+
+    # Retrieved chunks get whatever is left, so top_k never grows the prompt past the budget
+    context_budget = settings.PROMPT_TOKEN_BUDGET - TEMPLATE_TOKENS - estimate_tokens(question) - estimate_tokens(chat_history)
+    context, used_docs = pack_context(retrieved_docs, max(context_budget, 0))
+
+    prompt_tokens = TEMPLATE_TOKENS + estimate_tokens(question) + estimate_tokens(chat_history) + estimate_tokens(context)
+    print(f"Prompt: ~{prompt_tokens} tokens ({len(used_docs)}/{len(retrieved_docs)} chunks, "
+          f"history ~{estimate_tokens(chat_history)})")
+
+    return {
+        "context": context,
+        "question": question,
+        "chat_history": chat_history
+    }, used_docs, prompt_tokens
+
+def get_sources(retrieved_docs) -> List[int]:
+    # Get all page numbers including duplicates, then sort
+    return sorted([doc.metadata.get("page", 0) for doc in retrieved_docs])
+
+def get_citations(assistant: models.Assistant, retrieved_docs) -> List[Citation]:
+    # Chunk metadata carries the store's document id; legacy FAISS chunks have none
+    by_key = {doc.document_key: doc for doc in assistant.documents}
+    fallback = assistant.documents[0] if assistant.documents else None
+
+    citations = []
+    for retrieved in retrieved_docs:
+        document = by_key.get(retrieved.metadata.get("document_id"), fallback)
+        citations.append(Citation(
+            document_id=document.id if document else None,
+            file_name=document.file_name if document else assistant.file_name,
+            page=retrieved.metadata.get("page", 0)
+        ))
+    return sorted(citations, key=lambda c: (c.file_name, c.page))
+
+def answer_cache_config(assistant: models.Assistant) -> tuple:
+    # Everything that changes the answer for the same question
+    return (assistant.temperature, assistant.top_k, assistant.chunk_size, assistant.chunk_overlap)
+
+def use_answer_cache(history) -> bool:
+    # Answers to follow-up questions depend on the conversation, so only standalone ones are cached
+    return settings.ANSWER_CACHE_ENABLED and not history
+
+# --- The Chat Endpoint ---
+@router.post("/", response_model=ChatResponse)
+def chat_with_assistant(
+    request: ChatRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    assistant = get_owned_assistant(db, request.assistant_id, current_user.id)
+    chat_session = get_chat_session(db, request.session_id, current_user.id, assistant.id) if request.session_id else None
+    history = session_history(chat_session) if chat_session else request.chat_history
+
+    try:
+        with stage("cache_load"):
+            vector_store = load_rag_engine(assistant.storage_key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load assistant data: {str(e)}")
+
+    embeddings = get_query_embeddings(assistant.embedding_model)
+    query_vector = None
+    retrieved_docs = None
+    if chat_session is not None:
+        # Follow-ups close to the session's last retrieval reuse its chunks (no BM25, no vector search)
+        with stage("query_embed"):
+            query_vector = embeddings.embed_query(request.query)
+        retrieved_docs = session_retrieval_cache.lookup(chat_session.id, vector_store, query_vector)
+    cacheable = use_answer_cache(history)
+
+    if retrieved_docs is None:
+        # BM25 starts now and overlaps with the embedding call below
+        search = HybridSearch(vector_store, request.query, assistant.top_k)
+
+        # Rare-term lookups are answered from the lexical index without embedding the query
+        with stage("lexical_lookup"):
+            retrieved_docs = search.lexical_only()
+
+        if retrieved_docs is None:
+            # Embed once: the vector serves both the answer cache and retrieval
+            if query_vector is None:
+                with stage("query_embed"):
+                    query_vector = embeddings.embed_query(request.query)
+
+            if cacheable:
+                cached = answer_cache.lookup(str(assistant.id), answer_cache_config(assistant), query_vector)
+                if cached is not None:
+                    if chat_session is not None:
+                        record_turn(db, chat_session, request.query, cached.response)
+                    return cached
 
-    retrieved_docs = retriever.invoke(request.query)
-    formatted_context = format_docs(retrieved_docs)
+            with stage("vector_search"):
+                retrieved_docs = search.fused(query_vector)
+
+        if chat_session is not None:
+            session_retrieval_cache.store(chat_session.id, vector_store, query_vector, retrieved_docs)
+
+    llm = build_llm(assistant)
+    prompt = ChatPromptTemplate.from_template(TUTOR_TEMPLATE)
 
     chain = prompt | llm | StrOutputParser()
-    
-    # Prepare the prompt variables
-    prompt_vars = {
-        "context": formatted_context,
-        "question": request.query,
-        "chat_history": f"PREVIOUS CONVERSATION:\n{history_text}" if history_text else ""
-    }
-    
-    response_text = chain.invoke(prompt_vars)
-    
+    with stage("prompt_build"):
+        prompt_vars, used_docs, prompt_tokens = build_prompt_vars(request, retrieved_docs, history)
+    with stage("llm_total"):
+        response_text = chain.invoke(prompt_vars)
+
     # Convert backticks to LaTeX format for proper math rendering
-    response_text = convert_backticks_to_latex(response_text)
+    with stage("post_process"):
+        response_text = convert_backticks_to_latex(response_text)
 
-    # Get all page numbers including duplicates, then sort
-    sources = sorted([doc.metadata.get("page", 0) for doc in retrieved_docs])
+    result = ChatResponse(
+        response=response_text,
+        sources=get_sources(used_docs),
+        citations=get_citations(assistant, used_docs),
+        prompt_tokens=prompt_tokens
+    )
+    if cacheable and query_vector is not None:
+        answer_cache.store(str(assistant.id), answer_cache_config(assistant), query_vector, result)
+    if chat_session is not None:
+        record_turn(db, chat_session, request.query, response_text)
+    return result
+
+# --- Server-side chat sessions ---
+@router.post("/sessions", response_model=ChatSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_chat_session(
+    request: ChatSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    assistant = get_owned_assistant(db, request.assistant_id, current_user.id)
+    chat_session = models.ChatSession(
+        id=new_session_id(), user_id=current_user.id, assistant_id=assistant.id, messages=[]
+    )
+    db.add(chat_session)
+    db.commit()
+    db.refresh(chat_session)
+    return _session_response(chat_session)
+
+@router.get("/sessions/{session_id}", response_model=ChatSessionResponse)
+def get_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return _session_response(get_chat_session(db, session_id, current_user.id))
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    chat_session = get_chat_session(db, session_id, current_user.id)
+    db.delete(chat_session)
+    db.commit()
+    session_retrieval_cache.invalidate(session_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+def _session_response(chat_session: models.ChatSession) -> ChatSessionResponse:
+    return ChatSessionResponse(
+        id=chat_session.id,
+        assistant_id=chat_session.assistant_id,
+        turns=chat_session.turns or 0,
+        messages=[ChatMessage(role=m.role, content=m.content) for m in session_history(chat_session)],
+        created_at=chat_session.created_at
+    )
+
+async def _record_stream_turn(chat_session: models.ChatSession, query: str, answer: str):
+    # Shielded: a client disconnecting mid-write cancels the stream, not the write
+    await asyncio.shield(arecord_turn(chat_session, query, answer))
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- The Streaming Chat Endpoint ---
+@router.post("/stream")
+async def chat_with_assistant_stream(
+    request: ChatRequest,
+    current_user: models.User = Depends(get_current_user)
+):
+    assistant = await aget_owned_assistant(request.assistant_id, current_user.id)
+    chat_session = None
+    if request.session_id:
+        chat_session = await aget_chat_session(request.session_id, current_user.id, assistant.id)
+    history = session_history(chat_session) if chat_session else request.chat_history
+
+    try:
+        with stage("cache_load"):
+            vector_store = await run_in_threadpool(load_rag_engine, assistant.storage_key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load assistant data: {str(e)}")
+
+    embeddings = get_query_embeddings(assistant.embedding_model)
+    query_vector = None
+    retrieved_docs = None
+    if chat_session is not None:
+        with stage("query_embed"):
+            query_vector = await embeddings.aembed_query(request.query)
+        retrieved_docs = session_retrieval_cache.lookup(chat_session.id, vector_store, query_vector)
+    reused = retrieved_docs is not None
+    cacheable = use_answer_cache(history)
+    config_key = answer_cache_config(assistant)
+    cached = None
+
+    if not reused:
+        search = HybridSearch(vector_store, request.query, assistant.top_k)
+        with stage("lexical_lookup"):
+            retrieved_docs = await search.alexical_only()
+
+        if retrieved_docs is None:
+            if query_vector is None:
+                with stage("query_embed"):
+                    query_vector = await embeddings.aembed_query(request.query)
+            cached = answer_cache.lookup(str(assistant.id), config_key, query_vector) if cacheable else None
+
+    # Server-Sent Events: "token" events carry text deltas, "sources" and "done" close the stream
+    async def cached_stream():
+        yield _sse("token", {"text": cached.response})
+        if chat_session is not None:
+            await _record_stream_turn(chat_session, request.query, cached.response)
+        yield _sse("sources", {"sources": cached.sources, "citations": [c.model_dump() for c in cached.citations]})
+        yield _sse("done", {"cached": True, "prompt_tokens": cached.prompt_tokens})
+
+    if cached is not None:
+        return StreamingResponse(
+            cached_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    llm = build_llm(assistant)
+    prompt = ChatPromptTemplate.from_template(TUTOR_TEMPLATE)
+
+    if retrieved_docs is None:
+        with stage("vector_search"):
+            retrieved_docs = await search.afused(query_vector)
+    if chat_session is not None and not reused and query_vector is not None:
+        session_retrieval_cache.store(chat_session.id, vector_store, query_vector, retrieved_docs)
+    with stage("prompt_build"):
+        prompt_vars, used_docs, prompt_tokens = build_prompt_vars(request, retrieved_docs, history)
+    sources = get_sources(used_docs)
+    citations = get_citations(assistant, used_docs)
+
+    chain = prompt | llm | StrOutputParser()
+
+    async def event_stream():
+        converter = LatexStreamConverter()
+        response_parts = []
+        started = time.perf_counter()
+        first_token = None
+        convert_seconds = 0.0
+        # Time spent handing tokens to a slow client is not the model's; llm_total leaves it out
+        send_seconds = 0.0
+        try:
+            async for token in chain.astream(prompt_vars):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    observe_stage("llm_first_token", first_token)
+                converting = time.perf_counter()
+                text = converter.feed(token)
+                convert_seconds += time.perf_counter() - converting
+                if text:
+                    response_parts.append(text)
+                    sending = time.perf_counter()
+                    yield _sse("token", {"text": text})
+                    send_seconds += time.perf_counter() - sending
+
+            generated = time.perf_counter() - started
+            # Comparable with the sync path's llm_total; stream_total is what the user experienced
+            observe_stage("llm_total", generated - send_seconds - convert_seconds)
+            observe_stage("stream_total", generated)
+            tail = converter.flush()
+            observe_stage("post_process", convert_seconds)
+            if tail:
+                response_parts.append(tail)
+                yield _sse("token", {"text": tail})
+
+            # Before the closing events: clients may disconnect as soon as they see "done"
+            if cacheable and query_vector is not None:
+                result = ChatResponse(response="".join(response_parts), sources=sources, citations=citations,
+                                      prompt_tokens=prompt_tokens)
+                answer_cache.store(str(assistant.id), config_key, query_vector, result)
+            if chat_session is not None:
+                await _record_stream_turn(chat_session, request.query, "".join(response_parts))
+
+            yield _sse("sources", {"sources": sources, "citations": [c.model_dump() for c in citations]})
+            yield _sse("done", {"cached": False, "prompt_tokens": prompt_tokens})
+
+        except Exception as e:
+            print(f" [STREAM ERROR] {str(e)}")
+            yield _sse("error", {"message": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+# --- The Batch Chat Endpoint ---
+@router.post("/batch")
+async def chat_with_assistant_batch(
+    request: BatchChatRequest,
+    current_user: models.User = Depends(get_current_user)
+):
+    """Answer many standalone questions in one call (evaluation sets, pre-generation).
+
+    The store is loaded once, all queries are embedded in one call and searched in
+    one vectorized pass, then up to CHAT_BATCH_CONCURRENCY answers are generated at
+    a time. Streams NDJSON: one line per question in completion order (with its
+    index and timing), then a summary line.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(request.queries) > settings.CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CHAT_BATCH_MAX_QUERIES} queries per batch")
+
+    started = time.perf_counter()
+    assistant = await aget_owned_assistant(request.assistant_id, current_user.id)
+
+    try:
+        with stage("cache_load"):
+            vector_store = await run_in_threadpool(load_rag_engine, assistant.storage_key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load assistant data: {str(e)}")
+    loaded = time.perf_counter()
+
+    with stage("batch_retrieval"):
+        retrieved, retrieval = await run_in_threadpool(
+            search_many, vector_store, request.queries, assistant.top_k,
+            get_query_embeddings(assistant.embedding_model)
+        )
+    retrieved_at = time.perf_counter()
+
+    chain = ChatPromptTemplate.from_template(TUTOR_TEMPLATE) | build_llm(assistant) | StrOutputParser()
+    semaphore = asyncio.Semaphore(settings.CHAT_BATCH_CONCURRENCY)
+
+    async def answer(index: int, query: str, retrieved_docs) -> dict:
+        async with semaphore:
+            generating = time.perf_counter()
+            try:
+                prompt_vars, used_docs, prompt_tokens = build_prompt_vars(
+                    ChatRequest(assistant_id=assistant.id, query=query), retrieved_docs
+                )
+                response_text = convert_backticks_to_latex(await chain.ainvoke(prompt_vars))
+                item = {
+                    "index": index,
+                    "query": query,
+                    "response": response_text,
+                    "sources": get_sources(used_docs),
+                    "citations": [c.model_dump() for c in get_citations(assistant, used_docs)],
+                    "prompt_tokens": prompt_tokens
+                }
+            except Exception as e:
+                print(f" [BATCH ERROR] item {index}: {str(e)}")
+                item = {"index": index, "query": query, "error": str(e)}
+            finished = time.perf_counter()
+
+        observe_stage("llm_total", finished - generating)
+        item["timing"] = {
+            "queue_ms": _ms(generating - retrieved_at),
+            "generation_ms": _ms(finished - generating),
+            "total_ms": _ms(finished - started)
+        }
+        return item
+
+    async def results():
+        tasks = [
+            asyncio.create_task(answer(index, query, docs))
+            for index, (query, docs) in enumerate(zip(request.queries, retrieved))
+        ]
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                failed += "error" in item
+                yield json.dumps(item) + "\n"
+
+            yield json.dumps({
+                "status": "complete",
+                "count": len(tasks),
+                "failed": failed,
+                "lexical_only": retrieval["lexical_only"],
+                "timing": {
+                    "load_ms": _ms(loaded - started),
+                    "embed_ms": _ms(retrieval["embed_seconds"]),
+                    "search_ms": _ms(retrieval["search_seconds"]),
+                    "retrieval_ms": _ms(retrieved_at - loaded),
+                    "total_ms": _ms(time.perf_counter() - started)
+                }
+            }) + "\n"
+        finally:
+            # Client disconnected: don't keep generating answers nobody reads
+            for task in tasks:
+                task.cancel()
 
-    return ChatResponse(response=response_text, sources=sources)
\ No newline at end of file
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,155 @@
+import re
+from typing import List, Tuple
+from langchain_core.documents import Document
+from app.config.config import settings
+
+# Builds the context and history parts of the chat prompt within a token budget:
+#   1. Chunks of the same page are merged into one block; where the splitter's
+#      overlap repeats text, it is stitched instead of repeated.
+#   2. Blocks that are near-duplicates of a better-ranked block are dropped.
+#   3. Blocks are added in retrieval order until the context budget is spent.
+#   4. Recent history turns are kept verbatim, older ones condensed, the rest dropped.
+
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP_CHARS = 20
+SHINGLE_SIZE = 5
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini has no local tokenizer; ~4 characters per token holds well for English prose
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars - 1)
+    return text[:cut if cut > max_chars // 2 else max_chars - 1].rstrip() + "…"
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def _stitch(texts: List[str]) -> List[str]:
+    # Greedily join pieces whose ends overlap; contained pieces disappear
+    pieces = list(texts)
+    merged = True
+    while merged and len(pieces) > 1:
+        merged = False
+        for i in range(len(pieces)):
+            for j in range(len(pieces)):
+                if i == j:
+                    continue
+                if pieces[j] in pieces[i]:
+                    joined = pieces[i]
+                else:
+                    size = _overlap(pieces[i], pieces[j])
+                    if not size:
+                        continue
+                    joined = pieces[i] + pieces[j][size:]
+                pieces[i] = joined
+                del pieces[j]
+                merged = True
+                break
+            if merged:
+                break
+    return pieces
+
+
+def merge_chunks(docs: List[Document]) -> List[dict]:
+    """One block per (document, page), ordered by its best-ranked chunk."""
+    blocks = {}
+    for doc in docs:
+        key = (doc.metadata.get("document_id"), doc.metadata.get("page", 0))
+        blocks.setdefault(key, []).append(doc)
+
+    return [
+        {"text": "\n...\n".join(_stitch([doc.page_content.strip() for doc in group])), "docs": group}
+        for group in blocks.values()
+    ]
+
+
+def _shingles(text: str) -> frozenset:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def drop_near_duplicates(blocks: List[dict], threshold: float) -> List[dict]:
+    """Drop blocks mostly contained in a better-ranked one (the same passage from another page or document)."""
+    kept, kept_shingles = [], []
+    for block in blocks:
+        shingles = _shingles(block["text"])
+        duplicate_of = None
+        for index, other in enumerate(kept_shingles):
+            shared = len(shingles & other)
+            if shared and shared / min(len(shingles), len(other)) >= threshold:
+                duplicate_of = index
+                break
+
+        if duplicate_of is None:
+            kept.append(block)
+            kept_shingles.append(shingles)
+        else:
+            # The passage is still represented, so its chunks stay citable
+            kept[duplicate_of]["docs"] = kept[duplicate_of]["docs"] + block["docs"]
+    return kept
+
+
+def pack_context(docs: List[Document], budget: int) -> Tuple[str, List[Document]]:
+    """Context text within `budget` tokens, plus the retrieved chunks it actually contains."""
+    blocks = drop_near_duplicates(merge_chunks(docs), settings.CONTEXT_DUPLICATE_SIMILARITY)
+
+    parts, used, remaining = [], [], budget
+    for block in blocks:
+        cost = estimate_tokens(block["text"]) + 1
+        if cost > remaining:
+            # A useful piece of the next block still fits; anything smaller is noise
+            if remaining >= settings.CONTEXT_MIN_BLOCK_TOKENS:
+                parts.append(truncate_to_tokens(block["text"], remaining - 1))
+                used.extend(block["docs"])
+            break
+        parts.append(block["text"])
+        used.extend(block["docs"])
+        remaining -= cost
+
+    return "\n\n".join(parts), used
+
+
+def compress_history(messages, budget: int) -> str:
+    """Newest turns verbatim, older ones cut to a short excerpt, the rest dropped."""
+    lines, remaining = [], budget
+    for position, message in enumerate(reversed(messages)):
+        role_label = "User" if message.role == "user" else "Assistant"
+        content = message.content.strip()
+        if position >= settings.HISTORY_RECENT_MESSAGES:
+            content = truncate_to_tokens(content, settings.HISTORY_CONDENSED_TOKENS)
+
+        line = f"{role_label}: {content}"
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            if position == 0 and remaining > settings.HISTORY_CONDENSED_TOKENS:
+                # Never lose the last turn completely, the question usually refers to it
+                lines.append(truncate_to_tokens(line, remaining - 1))
+                position = 1
+            omitted = len(messages) - position
+            if omitted:
+                lines.append(f"({omitted} earlier messages omitted)")
+            break
+        lines.append(line)
+        remaining -= cost
+
+    return "\n".join(reversed(lines))
@@ -0,0 +1,99 @@
+"""Convert assistants from the legacy FAISS + joblib layout to the mmap store format.
+
+Run from backend/:
+    python -m app.rag.convert_index 12 15     # specific storage keys
+    python -m app.rag.convert_index --all     # every assistant in the database
+"""
+import os
+import sys
+import shutil
+from langchain_community.vectorstores import FAISS
+from app.config.config import settings
+from app.database import models
+from app.database.database import SessionLocal
+from app.rag.cache import vector_store_cache
+from app.rag.embeddings import GeminiEmbeddingProvider, get_query_embeddings
+from app.rag.index_format import IndexWriter
+from app.rag.ingest import DOCUMENT_EMBEDDING_KEY
+from app.rag.load import TEMP_DATA_DIR, download_assistant_data, local_cache
+from app.rag.storage import get_blob_backend, upload_assistant_data
+
+LEGACY_BLOBS = ("faiss_index/", "chunks.jil", "metadata.jil")
+CONVERT_BATCH = 1024
+
+
+def convert_local_dir(legacy_dir: str, output_dir: str, dtype: str = None) -> int:
+    """Write the store format for a legacy directory; returns the number of chunks."""
+    vector_store = FAISS.load_local(
+        folder_path=os.path.join(legacy_dir, "faiss_index"),
+        embeddings=get_query_embeddings(GeminiEmbeddingProvider.name),
+        allow_dangerous_deserialization=True
+    )
+    index = vector_store.index
+    total = index.ntotal
+
+    writer = IndexWriter(output_dir, dtype=dtype or settings.INDEX_VECTOR_DTYPE, embedding_model=DOCUMENT_EMBEDDING_KEY)
+    for start in range(0, total, CONVERT_BATCH):
+        stop = min(start + CONVERT_BATCH, total)
+        docs = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in range(start, stop)]
+        writer.add(
+            texts=[doc.page_content for doc in docs],
+            metadatas=[doc.metadata for doc in docs],
+            vectors=index.reconstruct_n(start, stop - start)
+        )
+    writer.close()
+    return total
+
+
+def convert_assistant(storage_key: str) -> bool:
+    backend = get_blob_backend()
+    blobs = backend.list(f"{storage_key}/")
+    if any(blob.name.startswith(f"{storage_key}/store/") for blob in blobs):
+        print(f"Assistant {storage_key}: already converted")
+        return False
+    if not any(blob.name.startswith(f"{storage_key}/faiss_index/") for blob in blobs):
+        print(f"Assistant {storage_key}: no legacy index found")
+        return False
+
+    legacy_dir = download_assistant_data(storage_key)
+    output_dir = os.path.join(TEMP_DATA_DIR, f".convert-{storage_key}")
+    try:
+        count = convert_local_dir(legacy_dir, output_dir)
+        upload_assistant_data(output_dir, storage_key)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    # New blobs are in place; drop the pickles and every local copy of the old layout
+    for blob in blobs:
+        relative_path = blob.name.replace(f"{storage_key}/", "", 1)
+        if relative_path.startswith(LEGACY_BLOBS):
+            backend.delete(blob.name)
+
+    shutil.rmtree(legacy_dir, ignore_errors=True)
+    local_cache.forget(storage_key)
+    vector_store_cache.invalidate(storage_key)
+
+    print(f"Assistant {storage_key}: converted {count} chunks")
+    return True
+
+
+def all_storage_keys() -> list:
+    db = SessionLocal()
+    try:
+        return sorted({assistant.storage_key for assistant in db.query(models.Assistant).all()})
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    keys = all_storage_keys() if args == ["--all"] else args
+    for key in keys:
+        try:
+            convert_assistant(key)
+        except Exception as e:
+            print(f"Assistant {key}: conversion failed: {e}")
@@ -0,0 +1,132 @@
+import os
+import uuid
+import shutil
+from filelock import FileLock
+from sqlalchemy.orm import Session
+from app.database import models
+from app.rag.index_format import STORE_DIR, copy_store
+from app.rag.load import TEMP_DATA_DIR, LOCK_DIR, local_cache, ensure_local_copy, read_manifest, replace_local_copy, checksum_matches
+from app.rag.storage import upload_assistant_data, delete_assistant_data
+from app.rag.artifacts import release_assistant_storage
+from app.rag.embedding_store import chunk_embedding_store
+from app.rag.cache import answer_cache
+
+# Editing an assistant's documents:
+#   1. edit_target() decides where the edited index is written. A shared (deduplicated)
+#      index is forked to a new prefix; an index only this assistant uses is edited in place.
+#   2. open_working_copy() hard-links the current store into a scratch directory.
+#   3. Ingest appends a segment (or index_format.remove_document drops one) in that copy.
+#   4. publish_working_copy() uploads only the files that changed and swaps the copy in locally.
+#   5. commit_edit() points the assistant at the fork, if one was made; abandon_edit()
+#      undoes step 1 when the edit fails.
+
+
+class LegacyIndexError(Exception):
+    """The index still uses the pickle-based layout, which cannot be edited in place."""
+
+
+def document_key(file_hash: str) -> str:
+    # Same bytes, same key: an assistant cannot hold one PDF twice, and shared indexes agree on ids
+    return f"doc-{file_hash[:16]}"
+
+
+def edit_target(db: Session, assistant: models.Assistant) -> str:
+    artifact = assistant.artifact
+    if artifact is not None and artifact.ref_count > 1:
+        return f"{assistant.id}-{uuid.uuid4().hex[:8]}"
+
+    if artifact is not None:
+        # find_ready_artifact skips it, so nothing dedups onto an index while it is being edited
+        artifact.status = "editing"
+        db.commit()
+    return assistant.storage_key
+
+
+def open_working_copy(storage_key: str, work_dir: str = None) -> str:
+    source_dir = ensure_local_copy(storage_key)
+    if not os.path.exists(os.path.join(source_dir, STORE_DIR)):
+        raise LegacyIndexError(
+            "This assistant uses the old index format; run python -m app.rag.convert_index first."
+        )
+
+    work_dir = work_dir or os.path.join(TEMP_DATA_DIR, f".edit-{storage_key}-{uuid.uuid4().hex}")
+    # Held so cache eviction cannot delete the source mid-copy
+    with FileLock(os.path.join(LOCK_DIR, f"{storage_key}.lock")):
+        copy_store(source_dir, work_dir)
+    return work_dir
+
+
+def _unchanged_files(work_dir: str, source_dir: str) -> frozenset:
+    manifest = read_manifest(source_dir) or {"files": {}}
+    unchanged = set()
+    for relative_path, expected in manifest["files"].items():
+        path = os.path.join(work_dir, *relative_path.split("/"))
+        if not os.path.exists(path):
+            continue
+        source_path = os.path.join(source_dir, *relative_path.split("/"))
+        # Hard-linked segment files are untouched by definition; anything else is compared by checksum
+        if os.path.exists(source_path) and os.path.samefile(path, source_path):
+            unchanged.add(relative_path)
+        elif os.path.getsize(path) == expected["size"] and checksum_matches(path, expected):
+            unchanged.add(relative_path)
+    return frozenset(unchanged)
+
+
+def publish_working_copy(work_dir: str, source_key: str, target_key: str):
+    if target_key == source_key:
+        unchanged = _unchanged_files(work_dir, os.path.join(TEMP_DATA_DIR, source_key))
+        print(f"--- Uploading changed files only ({len(unchanged)} unchanged) ---")
+        upload_assistant_data(work_dir, target_key, unchanged=unchanged, remove_missing=True)
+    else:
+        upload_assistant_data(work_dir, target_key)
+    replace_local_copy(target_key, work_dir)
+
+
+def discard_working_copy(work_dir: str):
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def commit_edit(db: Session, assistant: models.Assistant, target_key: str):
+    """Record a fork made by edit_target; the caller commits."""
+    answer_cache.invalidate(str(assistant.id))
+
+    artifact = assistant.artifact
+    if artifact is None:
+        return
+    if artifact.blob_prefix == target_key:
+        # Edited in place: the index no longer matches its upload, so nothing may dedup onto it
+        artifact.content_key = f"private:{uuid.uuid4().hex}"
+        artifact.status = "ready"
+        return
+
+    fork = models.IndexArtifact(
+        content_key=f"private:{uuid.uuid4().hex}",
+        file_hash=artifact.file_hash,
+        chunk_size=artifact.chunk_size,
+        chunk_overlap=artifact.chunk_overlap,
+        embedding_model=artifact.embedding_model,
+        blob_prefix=target_key,
+        ref_count=1,
+        status="ready"
+    )
+    # Drops this assistant's hold on the shared index (deleting it if it was the last one)
+    release_assistant_storage(db, assistant)
+    db.add(fork)
+    db.flush()
+    assistant.artifact = fork
+
+
+def abandon_edit(db: Session, assistant: models.Assistant, target_key: str):
+    """Undo edit_target after a failed edit; the caller commits."""
+    artifact = assistant.artifact
+    if artifact is not None and artifact.blob_prefix == target_key:
+        artifact.status = "ready"
+        return
+    if target_key == assistant.storage_key:
+        return
+
+    # The fork was never committed, so nothing else holds its blobs or chunk embeddings
+    delete_assistant_data(target_key)
+    shutil.rmtree(os.path.join(TEMP_DATA_DIR, target_key), ignore_errors=True)
+    local_cache.forget(target_key)
+    chunk_embedding_store.release(target_key)
@@ -0,0 +1,137 @@
+import time
+import random
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Iterable, Iterator, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from app.config.config import settings
+
+# How long to wait on the head batch before emitting a heartbeat
+HEARTBEAT_SECONDS = 5
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveBatchSize:
+    """Halve the batch size on quota errors, grow it back slowly after successes."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self._size = max(minimum, min(initial, maximum))
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._size
+
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= 5 and self._size < self.maximum:
+                self._size = min(self.maximum, int(self._size * 1.5) + 1)
+                self._successes = 0
+
+    def on_quota_error(self):
+        with self._lock:
+            self._size = max(self.minimum, self._size // 2)
+            self._successes = 0
+
+
+def is_quota_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in ("429", "resource_exhausted", "resource exhausted", "quota", "rate limit"))
+
+
+def embed_concurrently(
+    embedding_model: Embeddings,
+    items: Iterable[Tuple[str, dict]],
+    max_workers: int = None,
+    requests_per_minute: int = None,
+) -> Iterator[Optional[Tuple[List[Tuple[str, dict]], List[List[float]]]]]:
+    """Embed (text, metadata) items with several batches in flight.
+
+    Yields (batch, vectors) in input order, so vectors always line up with their
+    metadata, or None as a heartbeat while the next batch is still outstanding.
+    """
+    max_workers = max_workers or settings.EMBEDDING_MAX_CONCURRENCY
+    requests_per_minute = requests_per_minute or settings.EMBEDDING_REQUESTS_PER_MINUTE
+
+    bucket = TokenBucket(rate=requests_per_minute / 60, capacity=max_workers)
+    batch_size = AdaptiveBatchSize(
+        initial=settings.EMBEDDING_BATCH_SIZE,
+        minimum=settings.EMBEDDING_MIN_BATCH_SIZE,
+        maximum=settings.EMBEDDING_MAX_BATCH_SIZE
+    )
+
+    def embed_with_retry(texts: List[str]) -> List[List[float]]:
+        for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+            bucket.acquire()
+            try:
+                vectors = embedding_model.embed_documents(texts)
+                batch_size.on_success()
+                return vectors
+            except Exception as e:
+                if not is_quota_error(e) or attempt == settings.EMBEDDING_MAX_RETRIES:
+                    raise
+                batch_size.on_quota_error()
+                backoff = min(60, 2 ** attempt) + random.uniform(0, 1)
+                print(f"Embedding quota hit, retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                time.sleep(backoff)
+
+    iterator = iter(items)
+    in_flight = []  # (batch, future) in submission order
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while True:
+                # Keep the pool saturated, one extra batch queued per worker
+                while not exhausted and len(in_flight) < max_workers * 2:
+                    batch = list(islice(iterator, batch_size.size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    future = pool.submit(embed_with_retry, [text for text, _ in batch])
+                    in_flight.append((batch, future))
+
+                if not in_flight:
+                    return
+
+                batch, future = in_flight[0]
+                try:
+                    vectors = future.result(timeout=HEARTBEAT_SECONDS)
+                except FutureTimeout:
+                    yield None
+                    continue
+
+                in_flight.pop(0)
+                yield batch, vectors
+        finally:
+            # On failure or early close, don't start batches nobody will read
+            for _, future in in_flight:
+                future.cancel()
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import threading
+import hashlib
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from app.config.config import settings
+from app.rag.embedding_pipeline import embed_concurrently
+
+
+def chunk_hash(model_key: str, text: str) -> str:
+    return hashlib.sha256(f"{model_key}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingStore:
+    """Content-addressed store of document chunk embeddings, shared by all assistants.
+
+    Vectors are keyed by a hash of (embedding model, chunk text). Each assistant
+    holds references to the hashes it uses; releasing an assistant drops its
+    references and garbage-collects vectors nobody references any more.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "hash TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_refs ("
+            "owner TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (owner, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunk_refs_hash ON chunk_refs (hash)")
+        self._conn.commit()
+
+    def get(self, hash_: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM chunk_embeddings WHERE hash = ?", (hash_,)
+            ).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put_many(self, owner: str, model_key: str, entries: List[Tuple[str, List[float]]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (hash, model, vector) VALUES (?, ?, ?)",
+                [(h, model_key, array("f", vector).tobytes()) for h, vector in entries]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_refs (owner, hash) VALUES (?, ?)",
+                [(owner, h) for h, _ in entries]
+            )
+            self._conn.commit()
+
+    def add_refs(self, owner: str, hashes: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_refs (owner, hash) VALUES (?, ?)",
+                [(owner, h) for h in hashes]
+            )
+            self._conn.commit()
+
+    def release(self, owner: str) -> int:
+        """Drop an owner's references and delete vectors left unreferenced."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_refs WHERE owner = ?", (owner,))
+            deleted = self._conn.execute(
+                "DELETE FROM chunk_embeddings WHERE NOT EXISTS ("
+                "SELECT 1 FROM chunk_refs WHERE chunk_refs.hash = chunk_embeddings.hash)"
+            ).rowcount
+            self._conn.commit()
+        print(f"--- Released chunk embeddings for {owner}: {deleted} vectors collected ---")
+        return deleted
+
+
+class DedupEmbedder:
+    """Embed chunks through the store, calling the model only for unseen chunk text.
+
+    `run` has the same contract as embed_concurrently: batches in input order,
+    None as a heartbeat. `reused` and `embedded` count where vectors came from.
+    """
+
+    def __init__(self, store: ChunkEmbeddingStore, embedding_model: Embeddings, model_key: str, owner: str,
+                 max_workers: int = None, requests_per_minute: int = None):
+        self.store = store
+        self.embedding_model = embedding_model
+        self.model_key = model_key
+        self.owner = owner
+        self.max_workers = max_workers
+        self.requests_per_minute = requests_per_minute
+        self.reused = 0
+        self.embedded = 0
+
+    def run(self, items: Iterable[Tuple[str, dict]]) -> Iterator[Optional[Tuple[List[Tuple[str, dict]], List[List[float]]]]]:
+        pending = deque()  # [text, metadata, hash, vector] in input order
+        known_hashes = []
+
+        def missing_items():
+            for text, metadata in items:
+                h = chunk_hash(self.model_key, text)
+                entry = [text, metadata, h, self.store.get(h)]
+                pending.append(entry)
+                if entry[3] is None:
+                    yield text, entry
+                else:
+                    known_hashes.append(h)
+
+        def flush_ready():
+            batch, vectors = [], []
+            while pending and pending[0][3] is not None:
+                text, metadata, _, vector = pending.popleft()
+                batch.append((text, metadata))
+                vectors.append(vector)
+            return batch, vectors
+
+        for result in embed_concurrently(self.embedding_model, missing_items(), self.max_workers,
+                                         self.requests_per_minute):
+            if result is None:
+                yield None
+                continue
+
+            batch, vectors = result
+            for (_, entry), vector in zip(batch, vectors):
+                entry[3] = vector
+            self.store.put_many(self.owner, self.model_key, [(entry[2], entry[3]) for _, entry in batch])
+            self.embedded += len(batch)
+
+            ready = flush_ready()
+            if ready[0]:
+                yield ready
+
+        # Everything left is already known
+        ready = flush_ready()
+        if ready[0]:
+            yield ready
+
+        self.store.add_refs(self.owner, known_hashes)
+        self.reused = len(known_hashes)
+
+
+chunk_embedding_store = ChunkEmbeddingStore(
+    db_path=os.path.join(settings.EMBEDDING_CACHE_DIR, "chunk_embeddings.sqlite")
+)
@@ -0,0 +1,404 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import hashlib
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.config.config import settings
+
+QUERY_EMBEDDING_MODEL = "models/gemini-embedding-001"
+
+
+def normalize_query(text: str) -> str:
+    # Case and whitespace differences should not cost another embedding call
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class QueryEmbeddingCache:
+    """Two-tier query embedding cache: in-memory LRU in front of a SQLite table.
+
+    The tiers have separate locks, so async callers can check memory on the event loop
+    while another thread is in SQLite (see CachedQueryEmbeddings.aembed_query).
+    """
+
+    def __init__(self, db_path: str, memory_entries: int, disk_entries: int):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._inserts_since_prune = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        vector = self.get_memory(key)
+        return vector if vector is not None else self.get_disk(key)
+
+    def get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def get_disk(self, key: str) -> Optional[List[float]]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        vector = _unpack(row[0])
+        with self._lock:
+            self._remember(key, vector)
+            self.disk_hits += 1
+        return vector
+
+    def put(self, key: str, model: str, vector: List[float], elapsed: float):
+        self.put_memory(key, vector, elapsed)
+        self.put_disk(key, model, vector)
+
+    def put_memory(self, key: str, vector: List[float], elapsed: float):
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+            self._remember(key, vector)
+
+    def put_disk(self, key: str, model: str, vector: List[float]):
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, _pack(vector), time.time())
+            )
+            self._inserts_since_prune += 1
+            if self._inserts_since_prune >= 1000:
+                self._prune()
+            self._conn.commit()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self):
+        self._inserts_since_prune = 0
+        self._conn.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            avg_miss = (self.miss_seconds / self.misses) if self.misses else 0.0
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (hits / lookups) if lookups else 0.0,
+                "avg_miss_seconds": avg_miss,
+                "estimated_seconds_saved": hits * avg_miss,
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that serves embed_query from QueryEmbeddingCache.
+
+    Documents are passed straight through; only queries repeat often enough to cache.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: QueryEmbeddingCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model_name, text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        started = time.perf_counter()
+        vector = self.underlying.embed_query(text)
+        self.cache.put(key, self.model_name, vector, time.perf_counter() - started)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query for many texts, with every cache miss embedded in one underlying call."""
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            started = time.perf_counter()
+            embedded = self.underlying.embed_documents([texts[i] for i in missing])
+            elapsed = (time.perf_counter() - started) / len(missing)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self.cache.put(keys[i], self.model_name, vector, elapsed)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Memory hits stay on the event loop; SQLite reads and writes go to the threadpool
+        key = self.cache.make_key(self.model_name, text)
+        vector = self.cache.get_memory(key)
+        if vector is None:
+            vector = await run_in_threadpool(self.cache.get_disk, key)
+        if vector is not None:
+            return vector
+
+        started = time.perf_counter()
+        vector = await self.underlying.aembed_query(text)
+        self.cache.put_memory(key, vector, time.perf_counter() - started)
+        await run_in_threadpool(self.cache.put_disk, key, self.model_name, vector)
+        return vector
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    db_path=os.path.join(settings.EMBEDDING_CACHE_DIR, "query_embeddings.sqlite"),
+    memory_entries=settings.QUERY_EMBEDDING_CACHE_MEMORY_ENTRIES,
+    disk_entries=settings.QUERY_EMBEDDING_CACHE_DISK_ENTRIES
+)
+
+class EmbeddingProvider(ABC):
+    """An embedding backend, selected by a spec "<name>:<model>" (as stored on Assistant.embedding_model).
+
+    document_key tags chunk vectors (dedup store, store descriptor, artifact content
+    key) and query_key tags cached query vectors, so models never share vectors.
+    """
+
+    name = None
+    default_model = None
+    # Ingest pipeline limits, None = the EMBEDDING_* settings
+    max_concurrency = None
+    requests_per_minute = None
+
+    def __init__(self, model: str = None):
+        self.model = model or self.default_model
+
+    @property
+    def spec(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @property
+    def document_key(self) -> str:
+        return f"{self.spec}:document"
+
+    @property
+    def query_key(self) -> str:
+        return f"{self.spec}:query"
+
+    @abstractmethod
+    def document_embeddings(self) -> Embeddings:
+        ...
+
+    @abstractmethod
+    def query_embeddings(self) -> Embeddings:
+        ...
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    name = "gemini"
+    default_model = QUERY_EMBEDDING_MODEL
+
+    # Keys from before providers existed, so stored chunk vectors, artifacts and cached queries stay valid
+    @property
+    def document_key(self) -> str:
+        return f"{self.model}:retrieval_document"
+
+    @property
+    def query_key(self) -> str:
+        return self.model
+
+    def _client(self, task_type: str) -> Embeddings:
+        return GoogleGenerativeAIEmbeddings(
+            model=self.model,
+            google_api_key=settings.GOOGLE_API_KEY,
+            task_type=task_type
+        )
+
+    def document_embeddings(self) -> Embeddings:
+        return self._client("retrieval_document")
+
+    def query_embeddings(self) -> Embeddings:
+        return self._client("retrieval_query")
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers model on the CPU: no network, no quota.
+
+    The ONNX backend runs the quantized export (LOCAL_EMBEDDING_ONNX_FILE) when
+    optimum/onnxruntime are installed, otherwise the PyTorch weights are used.
+    One model per process serves both ingest batches and single queries.
+    """
+
+    name = "local"
+    default_model = settings.LOCAL_EMBEDDING_MODEL
+    max_concurrency = settings.LOCAL_EMBEDDING_CONCURRENCY
+    requests_per_minute = 10 ** 9  # no quota, CPU-bound
+
+    def __init__(self, model: str = None):
+        super().__init__(model)
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        encode_kwargs = {"batch_size": settings.LOCAL_EMBEDDING_BATCH_SIZE, "normalize_embeddings": True}
+        if settings.LOCAL_EMBEDDING_BACKEND == "onnx":
+            try:
+                import onnxruntime
+
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = settings.LOCAL_EMBEDDING_THREADS
+                return HuggingFaceEmbeddings(
+                    model_name=self.model,
+                    model_kwargs={
+                        "device": "cpu",
+                        "backend": "onnx",
+                        "model_kwargs": {
+                            "file_name": settings.LOCAL_EMBEDDING_ONNX_FILE,
+                            "provider": "CPUExecutionProvider",
+                            "session_options": session_options
+                        }
+                    },
+                    encode_kwargs=encode_kwargs
+                )
+            except Exception as e:
+                print(f"ONNX embedding backend unavailable, using PyTorch: {e}")
+
+        import torch
+        torch.set_num_threads(settings.LOCAL_EMBEDDING_THREADS)
+        return HuggingFaceEmbeddings(model_name=self.model, model_kwargs={"device": "cpu"}, encode_kwargs=encode_kwargs)
+
+    def document_embeddings(self) -> Embeddings:
+        with self._lock:
+            if self._embeddings is None:
+                started = time.perf_counter()
+                self._embeddings = self._load()
+                print(f"--- Loaded local embedding model {self.model} in {time.perf_counter() - started:.1f}s ---")
+            return self._embeddings
+
+    def query_embeddings(self) -> Embeddings:
+        return self.document_embeddings()
+
+
+EMBEDDING_PROVIDERS: Dict[str, type] = {
+    GeminiEmbeddingProvider.name: GeminiEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider
+}
+
+_providers: Dict[str, EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def register_embedding_provider(provider_class: type) -> type:
+    EMBEDDING_PROVIDERS[provider_class.name] = provider_class
+    return provider_class
+
+
+def _full_spec(spec: str = None) -> str:
+    name, _, model = (spec or settings.EMBEDDING_PROVIDER).partition(":")
+    provider_class = EMBEDDING_PROVIDERS.get(name)
+    if provider_class is None:
+        raise ValueError(f"Unknown embedding provider '{name}' (available: {', '.join(sorted(EMBEDDING_PROVIDERS))})")
+    return f"{name}:{model or provider_class.default_model}"
+
+
+def get_embedding_provider(spec: str = None) -> EmbeddingProvider:
+    """Provider for "<name>[:<model>]" (default: EMBEDDING_PROVIDER); raises ValueError for unknown names."""
+    key = _full_spec(spec)
+    name, _, model = key.partition(":")
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = EMBEDDING_PROVIDERS[name](model)
+        return _providers[key]
+
+
+def get_allowed_embedding_provider(spec: str = None) -> EmbeddingProvider:
+    """get_embedding_provider for client-chosen specs: only EMBEDDING_MODELS_ALLOWED (or the default) pass.
+
+    Checked before the provider is created, so arbitrary models are never downloaded or loaded.
+    """
+    key = _full_spec(spec)
+    allowed = {
+        _full_spec(allowed_spec) for allowed_spec in settings.EMBEDDING_MODELS_ALLOWED
+        if allowed_spec.partition(":")[0] in EMBEDDING_PROVIDERS
+    }
+    if key not in allowed and key != _full_spec():
+        raise ValueError(f"Embedding model '{key}' is not allowed (allowed: {', '.join(sorted(allowed))})")
+    return get_embedding_provider(key)
+
+
+def spec_for_document_key(document_key: Optional[str]) -> str:
+    """Provider spec of a store, from the document key in its descriptor."""
+    if not document_key:
+        return GeminiEmbeddingProvider().spec
+    base = document_key.rsplit(":", 1)[0]
+    if base.partition(":")[0] in EMBEDDING_PROVIDERS:
+        return base
+    # Gemini keys predate providers and carry no prefix
+    return f"{GeminiEmbeddingProvider.name}:{base}"
+
+
+_query_embeddings: Dict[str, CachedQueryEmbeddings] = {}
+_query_embeddings_lock = threading.Lock()
+
+
+def get_query_embeddings(spec: str = None) -> CachedQueryEmbeddings:
+    """Shared, cached query embedding client for a provider (default: EMBEDDING_PROVIDER)."""
+    provider = get_embedding_provider(spec)
+    with _query_embeddings_lock:
+        if provider.spec not in _query_embeddings:
+            _query_embeddings[provider.spec] = CachedQueryEmbeddings(
+                underlying=provider.query_embeddings(),
+                model_name=provider.query_key,
+                cache=query_embedding_cache
+            )
+        return _query_embeddings[provider.spec]
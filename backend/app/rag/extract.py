@@ -0,0 +1,85 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.config.config import settings
+
+# Thumbnail scale: 30% of the first page keeps the PNG small
+THUMBNAIL_SCALE = 0.3
+
+
+def _extract_range(file_path: str, backend: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    # Runs in a worker process: open the PDF once per range, not per page
+    if backend == "pymupdf":
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as doc:
+            return [(i, doc.load_page(i).get_text()) for i in range(start, stop)]
+
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def inspect_pdf(file_path: str, with_thumbnail: bool = True) -> Tuple[int, Optional[bytes]]:
+    """Page count and (optionally) a first-page PNG thumbnail from a single open."""
+    import fitz  # PyMuPDF
+
+    thumbnail = None
+    with fitz.open(file_path) as doc:
+        total_pages = len(doc)
+        if with_thumbnail and total_pages > 0:
+            try:
+                pix = doc.load_page(0).get_pixmap(matrix=fitz.Matrix(THUMBNAIL_SCALE, THUMBNAIL_SCALE))
+                thumbnail = pix.tobytes("png")
+            except Exception as e:
+                print(f"Thumbnail generation failed: {e}")
+    return total_pages, thumbnail
+
+
+def iter_pdf_pages(
+    file_path: str,
+    total_pages: int = None,
+    backend: str = None,
+    workers: int = None,
+    pages_per_task: int = None,
+) -> Iterator[Document]:
+    """Yield one Document per page, in page order, extracting ranges in a process pool.
+
+    At most two ranges per worker are in flight, so memory stays bounded no matter
+    how many pages the PDF has. Metadata matches PyPDFLoader ("source", "page").
+    """
+    backend = backend or settings.PDF_EXTRACT_BACKEND
+    workers = workers or settings.PDF_EXTRACT_WORKERS
+    pages_per_task = pages_per_task or settings.PDF_PAGES_PER_TASK
+    if total_pages is None:
+        total_pages, _ = inspect_pdf(file_path, with_thumbnail=False)
+
+    ranges = [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+
+    def to_documents(extracted):
+        for page_number, text in extracted:
+            yield Document(
+                page_content=text,
+                metadata={"source": file_path, "page": page_number, "total_pages": total_pages}
+            )
+
+    # Small documents aren't worth the process start-up cost
+    if workers <= 1 or len(ranges) <= 2:
+        for start, stop in ranges:
+            yield from to_documents(_extract_range(file_path, backend, start, stop))
+        return
+
+    # spawn: forking a process that is running server threads is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = list(ranges)
+        in_flight = []
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < workers * 2:
+                    start, stop = pending.pop(0)
+                    in_flight.append(pool.submit(_extract_range, file_path, backend, start, stop))
+                yield from to_documents(in_flight.pop(0).result())
+        finally:
+            for future in in_flight:
+                future.cancel()
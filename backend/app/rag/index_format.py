@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+from typing import Any, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.rag.ann_index import (
+    ANN_INDEX_FILE, build_and_save, configure_for_search, exact_search_with_distances, read_ann_index,
+    refine, refine_factor
+)
+from app.rag.lexical import LEXICAL_DIR, LexicalIndexWriter, open_lexical_index
+
+# On-disk layout (everything little-endian, opened with mmap, no pickles):
+#
+#   store/format.json            version, dim, dtype, count and segment list
+#   store/<segment>/vectors.bin  (count, dim) float32 or float16 matrix
+#   store/<segment>/norms.bin    (count,) float32 squared L2 norms
+#   store/<segment>/texts.bin    UTF-8 chunk texts, concatenated
+#   store/<segment>/offsets.bin  (count + 1,) int64 byte offsets into texts.bin
+#   store/<segment>/pages.bin    (count,) int32 page numbers
+#   store/index.faiss            optional ANN index over all rows (see app.rag.ann_index)
+#   store/lexical/               BM25 inverted index over all rows (see app.rag.lexical)
+#
+# Each source document is one segment, named by its document id (stores written
+# before multi-document assistants have a single "seg-0000"). Appending a document
+# adds a segment and deleting one drops it; the store-wide ANN and lexical indexes
+# are rebuilt from the segments each time, without re-embedding anything.
+STORE_DIR = "store"
+LEGACY_SEGMENT = "seg-0000"
+FORMAT_FILE = "format.json"
+FORMAT_VERSION = 1
+
+# Rows scored per matrix multiply; bounds the float32 temporaries for float16 stores
+SEARCH_BLOCK_ROWS = 65536
+# Queries scored together in batched search (with SEARCH_BLOCK_ROWS, ~16 MB of distances)
+SEARCH_BLOCK_QUERIES = 64
+
+
+class SegmentWriter:
+    """Append-only writer for one segment; vectors and text stream straight to disk."""
+
+    def __init__(self, segment_dir: str, dtype: str):
+        os.makedirs(segment_dir, exist_ok=True)
+        self.segment_dir = segment_dir
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self.count = 0
+
+        self._vectors = open(os.path.join(segment_dir, "vectors.bin"), "wb")
+        self._norms = open(os.path.join(segment_dir, "norms.bin"), "wb")
+        self._texts = open(os.path.join(segment_dir, "texts.bin"), "wb")
+        self._offsets = [0]
+        self._pages = []
+
+    def add(self, texts: List[str], metadatas: List[dict], vectors: List[List[float]]):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {matrix.shape[1]}")
+
+        # Norms come from the stored precision so distances stay consistent on load
+        stored = matrix.astype(self.dtype)
+        self._vectors.write(stored.tobytes())
+        self._norms.write(np.square(stored.astype(np.float32)).sum(axis=1).astype(np.float32).tobytes())
+
+        for text, metadata in zip(texts, metadatas):
+            encoded = text.encode("utf-8")
+            self._texts.write(encoded)
+            self._offsets.append(self._offsets[-1] + len(encoded))
+            self._pages.append(int(metadata.get("page", 0)))
+        self.count += len(texts)
+
+    def close(self) -> dict:
+        for file in (self._vectors, self._norms, self._texts):
+            file.close()
+        np.asarray(self._offsets, dtype="<i8").tofile(os.path.join(self.segment_dir, "offsets.bin"))
+        np.asarray(self._pages, dtype="<i4").tofile(os.path.join(self.segment_dir, "pages.bin"))
+        return {"name": os.path.basename(self.segment_dir), "count": self.count}
+
+
+class IndexWriter:
+    """Writes one document's segment into a store directory.
+
+    `add` mirrors FAISS.add_embeddings in spirit. With append=True the existing
+    segments are kept and the new document is added next to them; otherwise the
+    store is written from scratch.
+    """
+
+    def __init__(self, local_dir: str, dtype: str = "float32", embedding_model: str = None, index_type: str = "flat",
+                 document_id: str = None, append: bool = False):
+        self.store_dir = os.path.join(local_dir, STORE_DIR)
+        existing = read_format(self.store_dir) if append else None
+        if existing is None and os.path.exists(self.store_dir):
+            shutil.rmtree(self.store_dir)
+
+        # Appended segments must match the store they join
+        self._existing = existing["segments"] if existing else []
+        self.dtype = existing["dtype"] if existing else dtype
+        self.embedding_model = existing["embedding_model"] if existing else embedding_model
+        self.index_type = index_type
+        self.index_descriptor = None
+
+        segment_name = document_id or LEGACY_SEGMENT
+        if any(seg["name"] == segment_name for seg in self._existing):
+            raise ValueError(f"Document {segment_name} is already in this index")
+        self._segment = SegmentWriter(os.path.join(self.store_dir, segment_name), self.dtype)
+        if existing:
+            self._segment.dim = existing["dim"]
+
+    @property
+    def count(self) -> int:
+        return self._segment.count
+
+    def add(self, texts: List[str], metadatas: List[dict], vectors: List[List[float]]):
+        self._segment.add(texts, metadatas, vectors)
+
+    def close(self) -> str:
+        segment = self._segment.close()
+        if segment["count"] == 0:
+            raise ValueError("Cannot write an empty index")
+
+        segments = self._existing + [segment]
+        descriptor = {
+            "version": FORMAT_VERSION,
+            "dim": self._segment.dim,
+            "dtype": self.dtype,
+            "count": sum(seg["count"] for seg in segments),
+            "embedding_model": self.embedding_model,
+            "segments": segments,
+        }
+        self.index_descriptor = finalize_store(self.store_dir, descriptor, self.index_type)["index"]
+        return self.store_dir
+
+
+def finalize_store(store_dir: str, descriptor: dict, index_type: str) -> dict:
+    """Build the store-wide ANN and lexical indexes over the listed segments, then publish format.json."""
+    segments = [
+        Segment(os.path.join(store_dir, seg["name"]), seg["count"], descriptor["dim"], descriptor["dtype"])
+        for seg in descriptor["segments"]
+    ]
+
+    # The previous indexes may be hard links into a published copy: replace, never rewrite
+    ann_path = os.path.join(store_dir, ANN_INDEX_FILE)
+    if os.path.exists(ann_path):
+        os.remove(ann_path)
+    shutil.rmtree(os.path.join(store_dir, LEXICAL_DIR), ignore_errors=True)
+
+    if len(segments) == 1:
+        vectors, norms = segments[0].vectors, segments[0].norms
+    else:
+        vectors = np.concatenate([np.asarray(seg.vectors) for seg in segments])
+        norms = np.concatenate([np.asarray(seg.norms) for seg in segments])
+    descriptor["index"] = build_and_save(store_dir, vectors, norms, index_type)
+
+    # Lexical rows follow segment order, like the ANN ids
+    lexical = LexicalIndexWriter(os.path.join(store_dir, LEXICAL_DIR))
+    for segment in segments:
+        for start in range(0, segment.count, SEARCH_BLOCK_ROWS):
+            lexical.add([segment.text(i) for i in range(start, min(start + SEARCH_BLOCK_ROWS, segment.count))])
+    descriptor["lexical"] = lexical.close()
+
+    write_format(store_dir, descriptor)
+    return descriptor
+
+
+def remove_document(local_dir: str, document_id: str, index_type: str) -> dict:
+    """Drop one document's segment from a store and rebuild the store-wide indexes."""
+    store_dir = os.path.join(local_dir, STORE_DIR)
+    descriptor = read_format(store_dir)
+    if descriptor is None:
+        raise FileNotFoundError(f"No index store at {store_dir}")
+
+    remaining = [seg for seg in descriptor["segments"] if seg["name"] != document_id]
+    if len(remaining) == len(descriptor["segments"]):
+        raise KeyError(f"Document {document_id} is not in this index")
+    if not remaining:
+        raise ValueError("Cannot remove the last document of an index")
+
+    descriptor["segments"] = remaining
+    descriptor["count"] = sum(seg["count"] for seg in remaining)
+    descriptor = finalize_store(store_dir, descriptor, index_type)
+    shutil.rmtree(os.path.join(store_dir, document_id))
+    return descriptor
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def copy_store(src_local_dir: str, dest_local_dir: str):
+    """Working copy of a store for editing; unchanged segment files are hard links, not copies."""
+    shutil.copytree(
+        os.path.join(src_local_dir, STORE_DIR),
+        os.path.join(dest_local_dir, STORE_DIR),
+        copy_function=_link_or_copy
+    )
+
+
+def write_format(store_dir: str, descriptor: dict):
+    # Written last (and atomically) so a readable format.json means a complete store
+    tmp_path = os.path.join(store_dir, FORMAT_FILE + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(descriptor, file)
+    os.replace(tmp_path, os.path.join(store_dir, FORMAT_FILE))
+
+
+def read_format(store_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(store_dir, FORMAT_FILE)) as file:
+            descriptor = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if descriptor.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version {descriptor.get('version')}")
+    return descriptor
+
+
+class Segment:
+    """Read-only, memory-mapped view of one segment."""
+
+    def __init__(self, segment_dir: str, count: int, dim: int, dtype: str):
+        self.count = count
+        # Segments are named after the document they hold
+        self.document_id = os.path.basename(segment_dir)
+
+        def mapped(name, dtype, shape):
+            return np.memmap(os.path.join(segment_dir, name), dtype=dtype, mode="r", shape=shape)
+
+        self.vectors = mapped("vectors.bin", np.dtype(dtype), (count, dim))
+        self.norms = mapped("norms.bin", np.float32, (count,))
+        self.offsets = mapped("offsets.bin", np.dtype("<i8"), (count + 1,))
+        self.pages = mapped("pages.bin", np.dtype("<i4"), (count,))
+        texts_size = int(self.offsets[-1])
+        self.texts = mapped("texts.bin", np.uint8, (texts_size,)) if texts_size else np.zeros(0, dtype=np.uint8)
+
+    def text(self, i: int) -> str:
+        return self.texts[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode("utf-8")
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata={"page": int(self.pages[i]), "document_id": self.document_id})
+
+    def l2_distances(self, query: np.ndarray) -> np.ndarray:
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, scored block by block
+        distances = np.empty(self.count, dtype=np.float32)
+        query_norm = float(query @ query)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self.count)
+            block = np.asarray(self.vectors[start:stop], dtype=np.float32)
+            distances[start:stop] = self.norms[start:stop] - 2.0 * (block @ query) + query_norm
+        return distances
+
+
+class ReadOnlyStoreError(NotImplementedError):
+    """Opened stores are memory-mapped and shared between processes, so they are never written to."""
+
+
+class MmapVectorStore(VectorStore):
+    """LangChain VectorStore over the mmap store format (exact L2 search, like FAISS flat).
+
+    Nothing is copied into the Python heap on open, so loading is near-instant and
+    worker processes share the vectors through the OS page cache.
+    """
+
+    def __init__(self, store_dir: str, embedding: Embeddings):
+        descriptor = read_format(store_dir)
+        if descriptor is None:
+            raise FileNotFoundError(f"No index store at {store_dir}")
+
+        self.store_dir = store_dir
+        self.descriptor = descriptor
+        self.opened_at = time.time()
+        self.embedding_function = embedding
+        self.dim = descriptor["dim"]
+        self.segments = [
+            Segment(os.path.join(store_dir, seg["name"]), seg["count"], self.dim, descriptor["dtype"])
+            for seg in descriptor["segments"]
+        ]
+        # Global row id of each segment's first row (ANN ids are global, in segment order)
+        self._segment_starts = np.cumsum([0] + [seg.count for seg in self.segments])[:-1]
+
+        self.index_type = descriptor.get("index", {}).get("type", "flat")
+        self.ann_index = None
+        if self.index_type != "flat":
+            index_info = descriptor["index"]
+            self.ann_index = read_ann_index(os.path.join(store_dir, index_info["file"]))
+            configure_for_search(self.ann_index, self.index_type, index_info.get("params", {}))
+
+        # Stores written before hybrid retrieval have no lexical index
+        self.lexical = open_lexical_index(store_dir, descriptor)
+
+    @classmethod
+    def open(cls, local_dir: str, embedding: Embeddings) -> "MmapVectorStore":
+        return cls(os.path.join(local_dir, STORE_DIR), embedding)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    @property
+    def nbytes(self) -> int:
+        # Upper bound on resident size: mapped pages are shared and may be evicted by the OS
+        size = sum(seg.vectors.nbytes + seg.texts.nbytes + seg.offsets.nbytes + seg.pages.nbytes for seg in self.segments)
+        if self.ann_index is not None:
+            size += os.path.getsize(os.path.join(self.store_dir, self.descriptor["index"]["file"]))
+        if self.lexical is not None:
+            size += self.lexical.nbytes
+        return size
+
+    def _locate(self, row: int) -> Tuple[int, int]:
+        seg_index = int(np.searchsorted(self._segment_starts, row, side="right")) - 1
+        return seg_index, row - int(self._segment_starts[seg_index])
+
+    def _gather(self, row_ids: np.ndarray):
+        located = [self._locate(int(row)) for row in row_ids]
+        vectors = np.stack([np.asarray(self.segments[s].vectors[r], dtype=np.float32) for s, r in located])
+        norms = np.asarray([self.segments[s].norms[r] for s, r in located], dtype=np.float32)
+        return vectors, norms
+
+    def _ann_search(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        _, candidates = self.ann_index.search(queries, k * refine_factor(self.index_type))
+        results = []
+        for query, row_ids in zip(queries, refine(self._gather, queries, candidates, k)):
+            row_ids = row_ids[row_ids >= 0]
+            if len(row_ids) == 0:
+                results.append([])
+                continue
+
+            # Report exact distances so scores mean the same thing for every index type
+            vectors, norms = self._gather(row_ids)
+            distances = norms - 2.0 * (vectors @ query) + float(query @ query)
+            results.append(sorted(zip(row_ids.tolist(), distances.tolist()), key=lambda pair: pair[1]))
+        return results
+
+    def search_rows(self, embedding: List[float], k: int) -> List[Tuple[int, float]]:
+        """Top-k (global row, L2 distance) pairs, nearest first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.ann_index is not None:
+            return self._ann_search(query[None, :], k)[0]
+
+        candidates = []  # (distance, global row)
+        for start, segment in zip(self._segment_starts.tolist(), self.segments):
+            if segment.count == 0:
+                continue
+            distances = segment.l2_distances(query)
+            top = min(k, segment.count)
+            rows = np.argpartition(distances, top - 1)[:top]
+            candidates.extend((float(distances[row]), start + int(row)) for row in rows)
+
+        candidates.sort()
+        return [(row, distance) for distance, row in candidates[:k]]
+
+    def search_rows_batch(self, embeddings, k: int) -> List[List[Tuple[int, float]]]:
+        """search_rows for many queries: one ANN call, or one pass over each segment per block of queries."""
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if self.ann_index is not None:
+            return self._ann_search(queries, k)
+
+        results = []
+        for block_start in range(0, len(queries), SEARCH_BLOCK_QUERIES):
+            block = queries[block_start:block_start + SEARCH_BLOCK_QUERIES]
+            ids, distances = [], []
+            for start, segment in zip(self._segment_starts.tolist(), self.segments):
+                if segment.count == 0:
+                    continue
+                segment_ids, segment_distances = exact_search_with_distances(
+                    segment.vectors, segment.norms, block, min(k, segment.count)
+                )
+                ids.append(segment_ids + start)
+                distances.append(segment_distances)
+            if not ids:
+                results.extend([] for _ in block)
+                continue
+
+            ids, distances = np.concatenate(ids, axis=1), np.concatenate(distances, axis=1)
+            order = np.argsort(distances, axis=1)[:, :k]
+            ids, distances = np.take_along_axis(ids, order, axis=1), np.take_along_axis(distances, order, axis=1)
+            results.extend(list(zip(row_ids.tolist(), row_distances.tolist())) for row_ids, row_distances in zip(ids, distances))
+        return results
+
+    def document(self, row: int) -> Document:
+        seg_index, local_row = self._locate(row)
+        return self.segments[seg_index].document(local_row)
+
+    def __len__(self) -> int:
+        return sum(seg.count for seg in self.segments)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self.document(row), distance) for row, distance in self.search_rows(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        # Same mapping LangChain uses for FAISS L2 distances
+        return self._euclidean_relevance_score_fn
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise ReadOnlyStoreError(
+            "MmapVectorStore is read-only; add documents with IndexWriter(local_dir, append=True, document_id=...) "
+            "on a working copy (app.rag.documents.open_working_copy) and open the result"
+        )
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   local_dir: str = None, dtype: str = "float32", embedding_model: str = None,
+                   index_type: str = "flat", document_id: str = None, **kwargs: Any) -> "MmapVectorStore":
+        """Embed `texts` and write them as a new single-segment store in `local_dir` (default: a temp directory)."""
+        texts = list(texts)
+        local_dir = local_dir or tempfile.mkdtemp(prefix="mmap-store-")
+        writer = IndexWriter(local_dir, dtype=dtype, embedding_model=embedding_model, index_type=index_type,
+                             document_id=document_id)
+        writer.add(texts, metadatas or [{} for _ in texts], embedding.embed_documents(texts))
+        writer.close()
+        return cls.open(local_dir, embedding)
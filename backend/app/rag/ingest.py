@@ -1,105 +1,201 @@
 import os
+import time
 import shutil
-import joblib
 import json  
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from app.config.config import settings
+from app.rag.index_format import IndexWriter
+from app.rag.extract import iter_pdf_pages, inspect_pdf
+from app.rag.embedding_store import DedupEmbedder, chunk_embedding_store
+from app.rag.embeddings import GeminiEmbeddingProvider, get_embedding_provider
+from app.rag.metrics import stage, observe_stage, record_ingest
 
 TEMP_DATA_DIR = "temp_rag_data"
+# Key of the Gemini vectors every assistant used before embedding providers; legacy stores carry it
+DOCUMENT_EMBEDDING_KEY = GeminiEmbeddingProvider().document_key
+
+# Extraction checkpoint files (chunks as JSON lines, then page stats as the completion marker)
+EXTRACTED_CHUNKS = "chunks.jsonl"
+EXTRACTED_STATS = "extracted.json"
+
+def read_extraction_checkpoint(checkpoint_dir: str):
+    # The stats file is written last, so its presence means the chunk list is complete
+    if not checkpoint_dir or not os.path.exists(os.path.join(checkpoint_dir, EXTRACTED_STATS)):
+        return None
+    with open(os.path.join(checkpoint_dir, EXTRACTED_STATS)) as file:
+        stats = json.load(file)
+
+    def chunks():
+        with open(os.path.join(checkpoint_dir, EXTRACTED_CHUNKS), encoding="utf-8") as file:
+            for line in file:
+                text, metadata = json.loads(line)
+                yield text, metadata
+
+    print(f"--- Resuming from extracted chunks in {checkpoint_dir} ---")
+    return {"stats": stats, "chunks": chunks()}
+
+def write_extraction_checkpoint(checkpoint_dir: str, chunks, page_stats: dict):
+    """Pass chunks through while saving them; marks extraction complete once exhausted."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(os.path.join(checkpoint_dir, EXTRACTED_CHUNKS), "w", encoding="utf-8") as file:
+        for text, metadata in chunks:
+            file.write(json.dumps([text, metadata], ensure_ascii=False) + "\n")
+            yield text, metadata
+
+    with open(os.path.join(checkpoint_dir, EXTRACTED_STATS), "w") as file:
+        json.dump(page_stats, file)
+
+def ingest_pdf(file_path: str, assistant_id: str, chunk_size: int, chunk_overlap: int, total_pages: int = None,
+               index_type: str = "auto", document_id: str = None, append_to: str = None,
+               output_dir: str = None, checkpoint_dir: str = None, embedding_model: str = None):
+    """Ingest one PDF as document `document_id`.
+
+    With `append_to` (a working copy of an existing store, see app.rag.documents) the
+    document is added next to the ones already indexed instead of starting over.
+    With `checkpoint_dir`, the extracted chunks are kept there so a retried run
+    skips PDF extraction (see app.rag.ingest_jobs). `embedding_model` is the
+    provider spec recorded on the assistant (default: EMBEDDING_PROVIDER).
+    """
+    provider = get_embedding_provider(embedding_model)
 
-def ingest_pdf(file_path: str, assistant_id: str, chunk_size: int, chunk_overlap: int):
-    
     # Output Directory
-    output_dir = os.path.join(TEMP_DATA_DIR, str(assistant_id))
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir)
+    if append_to:
+        output_dir = append_to
+    else:
+        output_dir = output_dir or os.path.join(TEMP_DATA_DIR, str(assistant_id))
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
 
     # Analysis Started
+    started = time.perf_counter()
     yield json.dumps({"status": "starting", "message": "Analyzing PDF Structure..."})
 
-    # Load PDF
-    print(f"--- Loading PDF: {file_path} ---")
-    loader = PyPDFLoader(file_path)
-    pages = loader.load()
-    
-    cleaned_pages = []
-    for page in pages:
-        if page.page_content and page.page_content.strip():
-            cleaned_pages.append(page)
-    
-    if not cleaned_pages:
-        raise ValueError("No text found in PDF. Is it a scanned image?")
-        
-    print(f"Original Pages: {len(pages)} -> Cleaned Pages: {len(cleaned_pages)}")
+    print(f"--- Streaming PDF: {file_path} ---")
+    if total_pages is None:
+        total_pages, _ = inspect_pdf(file_path, with_thumbnail=False)
 
-    # Split Text
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, 
         chunk_overlap=chunk_overlap, 
         length_function=len, 
         is_separator_regex=False
     )
-    chunks = text_splitter.split_documents(cleaned_pages)
 
-    chunks_content = []
-    chunks_metadata = []
-    for chunk in chunks:
-        if chunk.page_content and chunk.page_content.strip():
-            chunks_content.append(chunk.page_content)
-            chunks_metadata.append(chunk.metadata)
+    page_stats = {"pages": 0, "text_pages": 0}
+    extracted = read_extraction_checkpoint(checkpoint_dir)
 
-    if not chunks_content:
-        raise ValueError("PDF was empty after splitting/filtering!")
+    # Pages are extracted in a process pool and split as they arrive, so the
+    # embedder starts on the first chunks while later pages are still being parsed
+    def extracted_chunks():
+        for page in iter_pdf_pages(file_path, total_pages=total_pages):
+            page_stats["pages"] += 1
+            if not (page.page_content and page.page_content.strip()):
+                continue
+            page_stats["text_pages"] += 1
 
-    total_chunks = len(chunks_content)
-    print(f"Total Chunks to Embed: {total_chunks}")
+            for chunk in text_splitter.split_documents([page]):
+                if chunk.page_content and chunk.page_content.strip():
+                    yield chunk.page_content, chunk.metadata
 
-    # 4. Setup Google Embeddings
-    embedding_model = GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001",
-        google_api_key=settings.GOOGLE_API_KEY,
-        task_type="retrieval_document" 
-    )
+    def chunk_stream():
+        if extracted is not None:
+            # Extraction finished in an earlier attempt
+            page_stats.update(extracted["stats"])
+            yield from extracted["chunks"]
+        elif checkpoint_dir:
+            yield from write_extraction_checkpoint(checkpoint_dir, extracted_chunks(), page_stats)
+        else:
+            yield from extracted_chunks()
 
-    batch_size = 100
-    vector_store = None
-    
-    print("--- Starting Batch Embedding with Heartbeat ---")
+    # 4. Setup Embeddings
+    embedding_client = provider.document_embeddings()
+
+    # Vectors and chunk text stream straight into the mmap store format
+    writer = IndexWriter(
+        output_dir,
+        dtype=settings.INDEX_VECTOR_DTYPE,
+        embedding_model=provider.document_key,
+        index_type=index_type,
+        document_id=document_id,
+        append=bool(append_to)
+    )
+    embedded = 0
     
-    for i in range(0, total_chunks, batch_size):
-        batch_texts = chunks_content[i : i + batch_size]
-        batch_metas = chunks_metadata[i : i + batch_size]
-        
-        # Calculate Progress
-        current_progress = min(i + batch_size, total_chunks)
-        percent = int((current_progress / total_chunks) * 100)
-        
+    print("--- Starting Concurrent Batch Embedding with Heartbeat ---")
+    yield json.dumps({"status": "processing", "message": "Embedding chunks...", "progress": 0})
+
+    # Only chunk text never embedded before (by any assistant) goes to the model.
+    # Batches come back in input order, so vectors stay aligned with their metadata
+    embedder = DedupEmbedder(
+        store=chunk_embedding_store,
+        embedding_model=embedding_client,
+        model_key=provider.document_key,
+        owner=str(assistant_id),
+        max_workers=provider.max_concurrency,
+        requests_per_minute=provider.requests_per_minute
+    )
+    percent = 0
+    for result in embedder.run(chunk_stream()):
+        if result is None:
+            # Heartbeat while the next batch is still in flight
+            yield json.dumps({
+                "status": "processing",
+                "message": "Embedding chunks...",
+                "progress": percent
+            })
+            continue
+
+        batch, vectors = result
+        writer.add(
+            texts=[text for text, _ in batch],
+            metadatas=[meta for _, meta in batch],
+            vectors=vectors
+        )
+
+        # Calculate Progress (pages are embedded in order, so the last page done is the progress)
+        embedded += len(batch)
+        percent = int(((batch[-1][1].get("page", 0) + 1) / max(total_pages, 1)) * 100)
+
         yield json.dumps({
             "status": "processing", 
             "message": f"Embedding chunks...",
             "progress": percent
         })
-        
-        if vector_store is None:
-            vector_store = FAISS.from_texts(
-                texts=batch_texts, 
-                embedding=embedding_model, 
-                metadatas=batch_metas
-            )
-        else:
-            vector_store.add_texts(texts=batch_texts, metadatas=batch_metas)
 
-    vector_store.save_local(os.path.join(output_dir, "faiss_index"))
-    joblib.dump(chunks_content, os.path.join(output_dir, "chunks.jil"))
-    joblib.dump(chunks_metadata, os.path.join(output_dir, "metadata.jil"))
+    if page_stats["text_pages"] == 0:
+        raise ValueError("No text found in PDF. Is it a scanned image?")
+    if writer.count == 0:
+        raise ValueError("PDF was empty after splitting/filtering!")
+
+    print(f"Original Pages: {page_stats['pages']} -> Cleaned Pages: {page_stats['text_pages']}")
+    print(f"Total Chunks Embedded: {writer.count}")
+    print(f"Embedded {embedder.embedded} new chunks, reused {embedder.reused} cached embeddings")
+    # Extraction and embedding overlap, so they are timed together
+    observe_stage("ingest_extract_embed", time.perf_counter() - started)
+
+    # Approximate index types are trained here, then checked against exact search
+    yield json.dumps({"status": "processing", "message": "Building search index...", "progress": 100})
+    with stage("index_build"):
+        writer.close()
+
+    index_info = writer.index_descriptor
+    if index_info.get("report"):
+        print(f"Index {index_info['type']} {index_info['params']}: {index_info['report']}")
+    yield json.dumps({
+        "status": "index_built",
+        "index_type": index_info["type"],
+        "report": index_info.get("report")
+    })
 
-    print(f"--- Ingestion Complete for Assistant {assistant_id} ---")
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    record_ingest(page_stats["pages"], writer.count, elapsed)
+    print(f"--- Ingestion Complete for Assistant {assistant_id} in {elapsed:.1f}s "
+          f"({page_stats['pages'] / elapsed:.1f} pages/s, {writer.count / elapsed:.1f} chunks/s) ---")
 
     yield json.dumps({
         "status": "ingestion_complete", 
-        "output_dir": output_dir
+        "output_dir": output_dir,
+        "chunks": writer.count,
+        "pages": total_pages
     })
\ No newline at end of file
@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import datetime
+import threading
+from sqlalchemy import func, text
+from fastapi.concurrency import run_in_threadpool
+from app.config.config import settings
+from app.database import models
+from app.database.database import SessionLocal
+from app.rag.ingest import ingest_pdf
+from app.rag.embeddings import GeminiEmbeddingProvider
+from app.rag.cache import invalidate_assistant
+from app.rag.load import local_cache
+from app.rag.storage import upload_assistant_data
+from app.rag.documents import open_working_copy, publish_working_copy, commit_edit, abandon_edit
+from app.rag.thumbnails import generate_thumbnail
+from app.rag.metrics import stage
+from app.security.auth_cache import auth_cache
+
+# Durable ingestion: the API records a job row and returns; worker processes
+# (app.rag.ingest_worker) claim queued jobs and run them. Each job keeps a
+# checkpoint of finished stages, so a retried job skips them:
+#   extracted  chunks saved in the job directory (no PDF parsing again)
+#   embedded   the store is complete in <job dir>/index (no embedding again)
+#   uploaded   blobs are in place; only the database bookkeeping is left
+HEARTBEAT_SECONDS = 15
+PROGRESS_WRITE_SECONDS = 1.0
+FOLLOW_POLL_SECONDS = 0.5
+
+os.makedirs(settings.INGEST_WORK_DIR, exist_ok=True)
+
+
+def job_dir(job_id: int) -> str:
+    return os.path.join(settings.INGEST_WORK_DIR, str(job_id))
+
+
+def enqueue_job(db, kind: str, assistant: models.Assistant, document: models.AssistantDocument,
+                file_path: str, params: dict) -> models.IngestJob:
+    """Add a queued job; the caller commits."""
+    job = models.IngestJob(
+        kind=kind,
+        assistant_id=assistant.id,
+        document_id=document.id,
+        user_id=assistant.owner_id,
+        status="queued",
+        stage="queued",
+        progress=0,
+        message="Waiting for an ingestion worker...",
+        file_path=file_path,
+        params=params,
+        checkpoint={}
+    )
+    db.add(job)
+    return job
+
+
+def _requeue_stale_jobs(db):
+    # Running jobs whose worker stopped sending heartbeats crashed or were killed
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    stale = db.query(models.IngestJob).filter(
+        models.IngestJob.status == "running",
+        models.IngestJob.heartbeat_at < cutoff
+    ).with_for_update(skip_locked=True).all()
+
+    failed = []
+    for job in stale:
+        if job.attempts >= settings.INGEST_JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = f"Worker {job.worker_id} stopped responding ({job.attempts} attempts)"
+            failed.append(job)
+            print(f"--- Ingest job {job.id} failed after {job.attempts} attempts ---")
+        else:
+            job.status = "queued"
+            job.message = "Retrying after a worker failure..."
+            print(f"--- Requeued stale ingest job {job.id} ---")
+    db.commit()
+
+    # After the commit: cleanup deletes documents, whose jobs reference them and were locked above
+    for job in failed:
+        try:
+            _fail(job, job.params)
+        except Exception as e:
+            print(f" [INGEST JOB {job.id} ERROR] Cleanup after failure: {str(e)}")
+        _remove_job_files(job)
+
+
+def _running_jobs(db, user_id: int) -> int:
+    return db.query(func.count(models.IngestJob.id)).filter(
+        models.IngestJob.status == "running",
+        models.IngestJob.user_id == user_id
+    ).scalar()
+
+
+def claim_next_job(worker_id: str):
+    """Atomically take the oldest queued job whose owner is under the per-user limit."""
+    db = SessionLocal()
+    try:
+        _requeue_stale_jobs(db)
+
+        busy_users = set(
+            user_id for user_id, running in db.query(models.IngestJob.user_id, func.count(models.IngestJob.id))
+            .filter(models.IngestJob.status == "running")
+            .group_by(models.IngestJob.user_id)
+            .all()
+            if running >= settings.INGEST_MAX_JOBS_PER_USER
+        )
+
+        while True:
+            query = db.query(models.IngestJob).filter(models.IngestJob.status == "queued")
+            if busy_users:
+                query = query.filter(models.IngestJob.user_id.notin_(busy_users))
+            # SKIP LOCKED: workers racing for the same row each get a different one
+            job = query.order_by(models.IngestJob.created_at).with_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+
+            # ...but two rows of one owner could still be claimed side by side: claims are serialized
+            # per owner (released at commit) and the running jobs counted again under that lock
+            db.execute(text("SELECT pg_advisory_xact_lock(:user_id)"), {"user_id": job.user_id})
+            if _running_jobs(db, job.user_id) >= settings.INGEST_MAX_JOBS_PER_USER:
+                busy_users.add(job.user_id)
+                db.rollback()
+                continue
+
+            job.status = "running"
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.heartbeat_at = func.now()
+            db.commit()
+            return job.id
+    finally:
+        db.close()
+
+
+class JobReporter:
+    """Writes progress and heartbeats for one running job."""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._last_write = 0.0
+        self._stage = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self):
+        # Long uploads emit no progress events, so liveness is reported separately
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            self._update(heartbeat_at=func.now())
+
+    def _update(self, **values):
+        db = SessionLocal()
+        try:
+            db.query(models.IngestJob).filter(models.IngestJob.id == self.job_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def progress(self, stage: str, message: str, progress: int = None):
+        now = time.monotonic()
+        if stage == self._stage and now - self._last_write < PROGRESS_WRITE_SECONDS:
+            return
+        self._stage, self._last_write = stage, now
+
+        values = {"stage": stage, "message": message, "heartbeat_at": func.now()}
+        if progress is not None:
+            values["progress"] = progress
+        self._update(**values)
+
+    def checkpoint(self, checkpoint: dict):
+        self._update(checkpoint=dict(checkpoint))
+
+    def finish(self, status: str, error: str = None):
+        self._stop.set()
+        values = {"status": status, "error": error}
+        if status == "succeeded":
+            values.update(stage="done", progress=100, message="Done")
+        self._update(**values)
+
+
+def _stage_for(event: dict) -> str:
+    if event.get("status") == "starting":
+        return "extracting"
+    if event.get("status") == "index_built" or event.get("message", "").startswith("Building"):
+        return "indexing"
+    return "embedding"
+
+
+def mark_artifact_ready(artifact_id: int):
+    db = SessionLocal()
+    try:
+        artifact = db.query(models.IndexArtifact).filter(models.IndexArtifact.id == artifact_id).first()
+        if artifact:
+            artifact.status = "ready"
+            db.commit()
+    finally:
+        db.close()
+
+
+def finish_document(document_id: int, status: str, chunks: int = None, pages: int = None):
+    db = SessionLocal()
+    try:
+        document = db.query(models.AssistantDocument).filter(models.AssistantDocument.id == document_id).first()
+        if document:
+            document.status = status
+            document.chunk_count = chunks
+            document.page_count = pages or document.page_count
+            db.commit()
+    finally:
+        db.close()
+
+
+def finish_document_edit(assistant_id: int, target_key: str, document_id: int, status: str, chunks: int = None, pages: int = None):
+    """Record the outcome of a document edit.
+
+    "ready"/"deleted" mean the edited index was published; "failed" drops an appended
+    document that never made it, "restored" puts a document back after a failed delete.
+    """
+    db = SessionLocal()
+    try:
+        assistant = db.query(models.Assistant).filter(models.Assistant.id == assistant_id).first()
+        document = db.query(models.AssistantDocument).filter(models.AssistantDocument.id == document_id).first()
+        if assistant and status in ("ready", "deleted"):
+            commit_edit(db, assistant, target_key)
+        elif assistant:
+            abandon_edit(db, assistant, target_key)
+
+        if document and status in ("deleted", "failed"):
+            db.delete(document)
+            remaining = [doc for doc in assistant.documents if doc.id != document_id]
+            if remaining:
+                assistant.file_name = remaining[0].file_name
+        elif document and status == "restored":
+            document.status = "ready"
+        elif document:
+            document.status = status
+            document.chunk_count = chunks if chunks is not None else document.chunk_count
+            document.page_count = pages or document.page_count
+        db.commit()
+    finally:
+        db.close()
+
+
+def _finalize(job, params: dict, checkpoint: dict):
+    if job.kind == "create":
+        storage_key = params["storage_key"]
+        invalidate_assistant(storage_key)
+        local_cache.forget(storage_key)
+        if params.get("artifact_id") is not None:
+            mark_artifact_ready(params["artifact_id"])
+        finish_document(job.document_id, "ready", checkpoint.get("chunks"), checkpoint.get("pages"))
+    else:
+        finish_document_edit(job.assistant_id, params["target_key"], job.document_id, "ready",
+                             checkpoint.get("chunks"), checkpoint.get("pages"))
+
+
+def discard_artifact(artifact_id: int, assistant_id: int):
+    """Unregister a failed create job's artifact, so the next upload of that PDF can register its own."""
+    db = SessionLocal()
+    try:
+        artifact = db.query(models.IndexArtifact).filter(models.IndexArtifact.id == artifact_id).with_for_update().first()
+        if artifact is None or artifact.ref_count > 1:
+            return
+        # The blob prefix is the assistant id, so its storage key stays the same without the artifact
+        db.query(models.Assistant).filter(
+            models.Assistant.id == assistant_id,
+            models.Assistant.artifact_id == artifact_id
+        ).update({"artifact_id": None}, synchronize_session=False)
+        db.delete(artifact)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _fail(job, params: dict):
+    if job.kind == "create":
+        if params.get("artifact_id") is not None:
+            discard_artifact(params["artifact_id"], job.assistant_id)
+        finish_document(job.document_id, "failed")
+    else:
+        finish_document_edit(job.assistant_id, params["target_key"], job.document_id, "failed")
+
+
+def run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+        db.expunge(job)
+    finally:
+        db.close()
+
+    params = dict(job.params)
+    checkpoint = dict(job.checkpoint or {})
+    work_dir = job_dir(job.id)
+    index_dir = os.path.join(work_dir, "index")
+    reporter = JobReporter(job.id)
+    print(f"--- Running ingest job {job.id} ({job.kind}, attempt {job.attempts}) for Assistant {job.assistant_id} ---")
+
+    try:
+        if job.kind == "create" and "thumbnail" not in checkpoint:
+            # Rendered here rather than in the upload request; the page count comes with it
+            reporter.progress("extracting", "Rendering thumbnail...", 0)
+            params["total_pages"] = generate_thumbnail(job.assistant_id, job.file_path)
+            checkpoint["thumbnail"] = True
+            checkpoint["total_pages"] = params["total_pages"]
+            reporter.checkpoint(checkpoint)
+
+        if not checkpoint.get("embedded"):
+            append_to = None
+            if job.kind == "append":
+                # A partially written segment from a failed attempt is discarded with the copy
+                shutil.rmtree(index_dir, ignore_errors=True)
+                append_to = open_working_copy(params["source_key"], work_dir=index_dir)
+
+            result = None
+            for message_json in ingest_pdf(
+                file_path=job.file_path,
+                assistant_id=params.get("storage_key") or params["target_key"],
+                chunk_size=params["chunk_size"],
+                chunk_overlap=params["chunk_overlap"],
+                total_pages=params.get("total_pages") or checkpoint.get("total_pages"),
+                index_type=params["index_type"],
+                document_id=params["document_key"],
+                append_to=append_to,
+                output_dir=index_dir,
+                checkpoint_dir=work_dir,
+                # Jobs queued before embedding providers were all Gemini
+                embedding_model=params.get("embedding_model") or GeminiEmbeddingProvider.name
+            ):
+                event = json.loads(message_json)
+                if event.get("status") == "ingestion_complete":
+                    result = event
+                    continue
+                if event.get("status") == "index_built":
+                    checkpoint["index_report"] = event.get("report")
+                reporter.progress(_stage_for(event), event.get("message", "Building index..."), event.get("progress"))
+
+            if result is None:
+                raise RuntimeError("Ingestion failed to produce output.")
+            checkpoint.update(extracted=True, embedded=True, chunks=result.get("chunks"), pages=result.get("pages"))
+            reporter.checkpoint(checkpoint)
+
+        # publish_working_copy moves the copy into the local cache only after uploading it
+        if job.kind == "append" and not os.path.exists(index_dir):
+            checkpoint["uploaded"] = True
+
+        if not checkpoint.get("uploaded"):
+            reporter.progress("uploading", "Uploading index...", 100)
+            with stage("index_upload"):
+                if job.kind == "create":
+                    upload_assistant_data(index_dir, params["storage_key"])
+                else:
+                    publish_working_copy(index_dir, params["source_key"], params["target_key"])
+            checkpoint["uploaded"] = True
+            reporter.checkpoint(checkpoint)
+
+        _finalize(job, params, checkpoint)
+        reporter.finish("succeeded")
+        print(f"--- Ingest job {job.id} complete ---")
+
+    except Exception as e:
+        print(f" [INGEST JOB {job.id} ERROR] {str(e)}")
+        _fail(job, params)
+        reporter.finish("failed", str(e))
+
+    _remove_job_files(job)
+
+
+def _remove_job_files(job):
+    # Finished either way: the upload and checkpoints are no longer needed
+    shutil.rmtree(job_dir(job.id), ignore_errors=True)
+    if os.path.exists(job.file_path):
+        os.remove(job.file_path)
+
+
+def job_event(job: models.IngestJob) -> dict:
+    """NDJSON event in the format the create/append streams have always used."""
+    if job.status == "succeeded":
+        message = "Assistant Ready!" if job.kind == "create" else "Document added!"
+        return {"status": "complete", "message": message, "assistant_id": str(job.assistant_id), "job_id": job.id}
+    if job.status == "failed":
+        return {"status": "error", "message": job.error or "Ingestion failed.", "job_id": job.id}
+    return {
+        "status": "queued" if job.status == "queued" else "processing",
+        "stage": job.stage,
+        "message": job.message,
+        "progress": job.progress,
+        "assistant_id": str(job.assistant_id),
+        "job_id": job.id
+    }
+
+
+def _read_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+        if job is not None:
+            db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+
+async def follow_job(job_id: int):
+    """Live NDJSON view of a job; closing it never affects the job itself."""
+    last = None
+    while True:
+        job = await run_in_threadpool(_read_job, job_id)
+        if job is None:
+            yield json.dumps({"status": "error", "message": "Ingestion job not found."}) + "\n"
+            return
+
+        event = job_event(job)
+        if event != last:
+            yield json.dumps(event) + "\n"
+            last = event
+        if job.status in ("succeeded", "failed"):
+            # The job ran in another process; drop this process's snapshot of the assistant now
+            auth_cache.invalidate_assistant(job.assistant_id)
+            return
+        await asyncio.sleep(FOLLOW_POLL_SECONDS)
@@ -0,0 +1,68 @@
+"""Ingestion worker processes.
+
+Run from backend/ next to the API (set INGEST_EMBEDDED_WORKERS=0 on the API then):
+    python -m app.rag.ingest_worker --processes 4
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import multiprocessing
+from app.config.config import settings
+
+
+def worker_loop():
+    # Imported here so spawned children set up their own engine and pools
+    from app.rag.ingest_jobs import claim_next_job, run_job
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"--- Ingest worker {worker_id} started ---")
+    while True:
+        try:
+            job_id = claim_next_job(worker_id)
+        except Exception as e:
+            print(f"Ingest worker {worker_id} could not claim a job: {e}")
+            job_id = None
+
+        if job_id is None:
+            time.sleep(settings.INGEST_POLL_SECONDS)
+            continue
+        run_job(job_id)
+
+
+def start_workers(processes: int) -> list:
+    # Not daemonic: PDF extraction starts its own process pool inside each worker
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(processes):
+        process = context.Process(target=worker_loop, name="ingest-worker")
+        process.start()
+        workers.append(process)
+    return workers
+
+
+def stop_workers(workers: list):
+    # Interrupted jobs are picked up again once their heartbeat goes stale
+    for process in workers:
+        process.terminate()
+    for process in workers:
+        process.join(timeout=10)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=max(settings.INGEST_EMBEDDED_WORKERS, 1))
+    args = parser.parse_args(argv)
+
+    workers = start_workers(args.processes)
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+from array import array
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+
+# BM25 inverted index stored next to the vectors (store/lexical/):
+#
+#   vocab.json        term list (term id = position), chunk count, average length
+#   offsets.bin       (terms + 1,) int64 start of each term's postings
+#   rows.bin          (postings,) int32 chunk row ids, ascending per term
+#   tfs.bin           (postings,) uint16 term frequency in that chunk
+#   lengths.bin       (count,) int32 chunk lengths in tokens
+LEXICAL_DIR = "lexical"
+VOCAB_FILE = "vocab.json"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Section numbers ("3.2.1") stay one token; everything else splits on non-word characters
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|[^\W_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can did do does for from had has have how i if in into is it its
+me my of on or so than that the their then there these they this those to was we were what when
+where which who why will with you your about explain tell give show
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndexWriter:
+    """Accumulates postings while ingest streams chunks; rows follow the vector store's row order."""
+
+    def __init__(self, lexical_dir: str):
+        self.lexical_dir = lexical_dir
+        self._vocab = {}
+        self._term_ids = array("i")
+        self._rows = array("i")
+        self._tfs = array("H")
+        self._lengths = array("i")
+
+    def add(self, texts: List[str]):
+        for text in texts:
+            row = len(self._lengths)
+            tokens = tokenize(text)
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = self._vocab.setdefault(term, len(self._vocab))
+                self._term_ids.append(term_id)
+                self._rows.append(row)
+                self._tfs.append(min(tf, 65535))
+
+    def close(self) -> dict:
+        os.makedirs(self.lexical_dir, exist_ok=True)
+        term_ids = np.frombuffer(self._term_ids, dtype=np.int32)
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+
+        # Group postings by term; a stable sort keeps rows ascending inside each term
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(self._vocab) + 1, dtype="<i8")
+        np.cumsum(np.bincount(term_ids, minlength=len(self._vocab)), out=offsets[1:])
+
+        np.frombuffer(self._rows, dtype=np.int32)[order].astype("<i4").tofile(os.path.join(self.lexical_dir, "rows.bin"))
+        np.frombuffer(self._tfs, dtype=np.uint16)[order].astype("<u2").tofile(os.path.join(self.lexical_dir, "tfs.bin"))
+        offsets.tofile(os.path.join(self.lexical_dir, "offsets.bin"))
+        lengths.astype("<i4").tofile(os.path.join(self.lexical_dir, "lengths.bin"))
+
+        stats = {
+            "count": int(len(lengths)),
+            "avg_len": float(lengths.mean()) if len(lengths) else 0.0,
+            "vocab_size": len(self._vocab),
+            "postings": int(len(term_ids)),
+        }
+        terms = sorted(self._vocab, key=self._vocab.get)
+        with open(os.path.join(self.lexical_dir, VOCAB_FILE), "w", encoding="utf-8") as file:
+            json.dump({"terms": terms, **stats}, file, ensure_ascii=False)
+
+        return {"dir": LEXICAL_DIR, **stats}
+
+
+class LexicalIndex:
+    """Memory-mapped BM25 index; only the vocabulary is loaded into the heap."""
+
+    def __init__(self, lexical_dir: str):
+        with open(os.path.join(lexical_dir, VOCAB_FILE), encoding="utf-8") as file:
+            vocab = json.load(file)
+        self.lexical_dir = lexical_dir
+        self.count = vocab["count"]
+        self.avg_len = vocab["avg_len"] or 1.0
+        self.term_ids = {term: i for i, term in enumerate(vocab["terms"])}
+
+        def mapped(name, dtype, size):
+            if size == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(os.path.join(lexical_dir, name), dtype=dtype, mode="r", shape=(size,))
+
+        self.offsets = mapped("offsets.bin", np.dtype("<i8"), len(self.term_ids) + 1)
+        self.rows = mapped("rows.bin", np.dtype("<i4"), vocab["postings"])
+        self.tfs = mapped("tfs.bin", np.dtype("<u2"), vocab["postings"])
+        self.lengths = mapped("lengths.bin", np.dtype("<i4"), self.count)
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.rows.nbytes + self.tfs.nbytes + self.lengths.nbytes
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return 0
+        return int(self.offsets[term_id + 1] - self.offsets[term_id])
+
+    def is_rare_lookup(self, query: str, max_terms: int, max_df: int, max_df_ratio: float = 1.0,
+                       min_chunks: int = 0) -> bool:
+        """Short queries made only of rare, known terms (names, symbols, section numbers).
+
+        Rarity is relative to the store size; in small stores nearly every term is rare,
+        so they never qualify.
+        """
+        if self.count < min_chunks:
+            return False
+        terms = set(tokenize(query))
+        if not terms or len(terms) > max_terms:
+            return False
+        cutoff = min(max_df, int(max_df_ratio * self.count))
+        return all(0 < self.document_frequency(term) <= cutoff for term in terms)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (row, BM25 score) pairs, best first."""
+        rows_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, stop = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            rows = np.asarray(self.rows[start:stop])
+            tfs = np.asarray(self.tfs[start:stop], dtype=np.float32)
+            df = stop - start
+            idf = np.log(1.0 + (self.count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.lengths[rows] / self.avg_len)
+            rows_parts.append(rows)
+            score_parts.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+
+        if not rows_parts:
+            return []
+
+        # Sum per-term contributions for rows that match several terms
+        unique_rows, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        top = min(k, len(unique_rows))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(int(unique_rows[i]), float(scores[i])) for i in best]
+
+
+def open_lexical_index(store_dir: str, descriptor: dict) -> Optional[LexicalIndex]:
+    info = descriptor.get("lexical")
+    if not info:
+        return None
+    return LexicalIndex(os.path.join(store_dir, info["dir"]))
@@ -1,63 +1,291 @@
 import os
-from azure.storage.blob import BlobServiceClient
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from typing import Optional
+from filelock import FileLock
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from app.config.config import settings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.rag.storage import download_assistant_blobs, get_blob_backend, file_md5
+from app.rag.local_cache import LocalArtifactCache
+from app.rag.usage import index_usage
+from app.rag.index_format import MmapVectorStore, STORE_DIR, read_format
+from app.rag.embeddings import GeminiEmbeddingProvider, get_query_embeddings, spec_for_document_key
+from app.rag.cache import vector_store_cache, estimate_vector_store_bytes
+from app.rag.metrics import stage
 
 TEMP_DATA_DIR = "temp_rag_data"
+LOCK_DIR = os.path.join(TEMP_DATA_DIR, ".locks")
+MANIFEST_NAME = "manifest.json"
+
+local_cache = LocalArtifactCache(
+    data_dir=TEMP_DATA_DIR,
+    lock_dir=LOCK_DIR,
+    max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+    policy=settings.LOCAL_CACHE_POLICY,
+    freshness_seconds=settings.LOCAL_CACHE_FRESHNESS_SECONDS
+)
+
+_download_locks = {}
+_download_locks_guard = threading.Lock()
+
+def _download_lock(assistant_id: str) -> threading.Lock:
+    with _download_locks_guard:
+        return _download_locks.setdefault(assistant_id, threading.Lock())
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def checksum_matches(path: str, expected: dict) -> Optional[bool]:
+    """Compare a file with its manifest entry's checksum; None if the entry has none."""
+    if expected.get("md5"):
+        return file_md5(path) == expected["md5"]
+    if expected.get("sha256"):
+        # Manifests from before checksums came from blob storage
+        return _sha256_file(path) == expected["sha256"]
+    return None
+
+def write_manifest(local_dir: str, blobs, prefix: str):
+    """Record what blob storage says each file should be: its listed size and Content-MD5.
+
+    The mtime is the local file's, so later opens can cheaply tell it was not touched.
+    """
+    files = {}
+    for blob in blobs:
+        relative_path = blob.name[len(prefix):]
+        path = os.path.join(local_dir, *relative_path.split("/"))
+        mtime_ns = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        files[relative_path] = {"size": blob.size, "md5": blob.md5, "mtime_ns": mtime_ns}
+
+    manifest = {
+        "files": files,
+        "etags": {blob.name: blob.etag for blob in blobs},
+        "downloaded_at": time.time()
+    }
+    _save_manifest(local_dir, manifest)
+
+def _save_manifest(local_dir: str, manifest: dict):
+    # Written aside and renamed: readers never see a partial manifest
+    tmp_path = os.path.join(local_dir, f".{MANIFEST_NAME}.{uuid.uuid4().hex}")
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(local_dir, MANIFEST_NAME))
+
+def read_manifest(local_dir: str):
+    try:
+        with open(os.path.join(local_dir, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def verify_manifest(local_dir: str, full: bool = True) -> bool:
+    """Check every file listed in the manifest is present and matches blob storage.
+
+    `full` also compares checksums (when storage has one); otherwise only size and
+    modification time are compared, which avoids re-reading the whole store on every open.
+    """
+    manifest = read_manifest(local_dir)
+    if manifest is None:
+        return False
+
+    for relative_path, expected in manifest["files"].items():
+        path = os.path.join(local_dir, *relative_path.split("/"))
+        try:
+            info = os.stat(path)
+        except OSError:
+            return False
+        if info.st_size != expected["size"]:
+            return False
+        if expected.get("mtime_ns") is not None and info.st_mtime_ns != expected["mtime_ns"]:
+            return False
+        if full and checksum_matches(path, expected) is False:
+            return False
+    return True
+
+def mark_verified(local_dir: str):
+    """Record that the checksums were verified, so later opens only run the quick check."""
+    manifest = read_manifest(local_dir)
+    if manifest is not None:
+        manifest["verified_at"] = time.time()
+        _save_manifest(local_dir, manifest)
 
 def download_assistant_data(assistant_id: str):
 
     local_path = os.path.join(TEMP_DATA_DIR, assistant_id)
 
-    if os.path.exists(os.path.join(local_path, "faiss_index")):
+    # The manifest is written last, so its presence means the download completed
+    if read_manifest(local_path) is not None:
         return local_path
 
-    print(f"--- Cache Miss: Downloading Assistant {assistant_id} from Azure ---")
-    os.makedirs(local_path, exist_ok=True)
-    
+    # Single flight: one download per assistant, across threads (lock) and worker processes (file lock)
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with _download_lock(assistant_id), FileLock(os.path.join(LOCK_DIR, f"{assistant_id}.lock")):
+        if read_manifest(local_path) is not None:
+            return local_path
+
+        # Leftovers of a crashed download for this assistant
+        for name in os.listdir(TEMP_DATA_DIR):
+            if name.startswith(f".tmp-{assistant_id}-"):
+                shutil.rmtree(os.path.join(TEMP_DATA_DIR, name), ignore_errors=True)
+
+        print(f"--- Cache Miss: Downloading Assistant {assistant_id} from Azure ---")
+        tmp_path = os.path.join(TEMP_DATA_DIR, f".tmp-{assistant_id}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+
+        try:
+            with stage("blob_download"):
+                blobs = download_assistant_blobs(assistant_id, tmp_path)
+            if not blobs:
+                raise FileNotFoundError(f"No stored data for Assistant {assistant_id}")
+            # Verified once, against the sizes and checksums blob storage listed, before going live
+            write_manifest(tmp_path, blobs, f"{assistant_id}/")
+            if not verify_manifest(tmp_path):
+                raise IOError(f"Downloaded data for Assistant {assistant_id} does not match blob storage")
+            mark_verified(tmp_path)
+
+            # A half-written directory from before manifests existed is never trusted
+            if os.path.exists(local_path):
+                shutil.rmtree(local_path)
+            os.rename(tmp_path, local_path)
+
+            print(f"--- Download Complete for Assistant {assistant_id} ---")
+            local_cache.record_download(assistant_id, LocalArtifactCache.directory_bytes(local_path))
+            # Evicted stores must be dropped too: their mmaps would keep the deleted files' space in use
+            local_cache.enforce_budget(protect=assistant_id, on_evict=vector_store_cache.invalidate)
+            return local_path
+
+        except Exception as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            print(f"Error downloading from Azure: {e}")
+            raise e
+
+def refresh_if_stale(assistant_id: str) -> bool:
+    """Drop the local copy (and loaded store) if the blobs were replaced since download."""
+    local_path = os.path.join(TEMP_DATA_DIR, assistant_id)
+    manifest = read_manifest(local_path)
+    if manifest is None:
+        return False
+
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER_NAME)
-        
-        blobs = container_client.list_blobs(name_starts_with=f"{assistant_id}/")
-        
-        for blob in blobs:
-            relative_path = blob.name.replace(f"{assistant_id}/", "", 1)
-            dest_file_path = os.path.join(local_path, relative_path)
-
-            os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
-
-            print(f"Downloading: {blob.name}")
-            with open(dest_file_path, "wb") as file:
-                data = container_client.download_blob(blob.name).readall()
-                file.write(data)
-                
-        print(f"--- Download Complete for Assistant {assistant_id} ---")
-        return local_path
+        current = {blob.name: blob.etag for blob in get_blob_backend().list(f"{assistant_id}/")}
+    except Exception as e:
+        # Storage unreachable: keep serving the local copy, check again later
+        print(f"Freshness check failed for Assistant {assistant_id}: {e}")
+        local_cache.mark_checked(assistant_id)
+        return False
 
+    if current == manifest.get("etags"):
+        # The local copy may have been replaced by a document edit in another worker
+        loaded = vector_store_cache.get(assistant_id, record_stats=False)
+        if loaded is not None and manifest.get("downloaded_at", 0) > getattr(loaded, "opened_at", float("inf")):
+            vector_store_cache.invalidate(assistant_id)
+        local_cache.mark_checked(assistant_id)
+        return False
+
+    print(f"--- Stale local copy of Assistant {assistant_id}, refreshing ---")
+    with _download_lock(assistant_id), FileLock(os.path.join(LOCK_DIR, f"{assistant_id}.lock")):
+        shutil.rmtree(local_path, ignore_errors=True)
+    local_cache.forget(assistant_id)
+    local_cache.stale_refreshes += 1
+    vector_store_cache.invalidate(assistant_id)
+    return True
+
+def prewarm(top_n: int) -> list:
+    """Download and load the top-N most used assistants; returns the keys that loaded."""
+    try:
+        # Ranked across all pods, so a freshly started one warms up too
+        keys = index_usage.most_used(top_n)
     except Exception as e:
-        print(f"Error downloading from Azure: {e}")
-        raise e
+        print(f"Shared usage ranking unavailable, using this pod's: {e}")
+        keys = local_cache.most_used(top_n)
 
-def load_rag_engine(assistant_id: str):
+    loaded = []
+    for assistant_id in keys:
+        try:
+            load_rag_engine(assistant_id)
+            loaded.append(assistant_id)
+        except Exception as e:
+            print(f"Pre-warm failed for Assistant {assistant_id}: {e}")
+    print(f"--- Pre-warmed {len(loaded)} assistant(s) ---")
+    return loaded
+
+def ensure_local_copy(assistant_id: str) -> str:
+    """Download (if needed) and check the local copy; returns its path.
 
+    Downloads are checksummed against blob storage once; later opens check sizes and
+    mtimes only. Copies not verified yet (older manifests, edits) get the full check once.
+    """
     local_path = download_assistant_data(assistant_id)
-    
-    embedding_model = GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001", 
-        google_api_key=settings.GOOGLE_API_KEY,
-        task_type="retrieval_query"
-    )
-    
-    index_path = os.path.join(local_path, "faiss_index")
-    print(f"Loading Index from: {index_path}")
-
-    vector_store = FAISS.load_local(
-        folder_path=index_path, 
-        embeddings=embedding_model, 
-        allow_dangerous_deserialization=True
-    )
-    
-    return vector_store
\ No newline at end of file
+    full = not (read_manifest(local_path) or {}).get("verified_at")
+    if not verify_manifest(local_path, full=full):
+        print(f"--- Local copy of Assistant {assistant_id} changed or corrupt, downloading again ---")
+        shutil.rmtree(local_path, ignore_errors=True)
+        return download_assistant_data(assistant_id)
+    if full:
+        mark_verified(local_path)
+    return local_path
+
+def replace_local_copy(assistant_id: str, new_dir: str):
+    """Swap a freshly uploaded directory in as the local copy, so edits need no re-download."""
+    write_manifest(new_dir, get_blob_backend().list(f"{assistant_id}/"), f"{assistant_id}/")
+    local_path = os.path.join(TEMP_DATA_DIR, assistant_id)
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with _download_lock(assistant_id), FileLock(os.path.join(LOCK_DIR, f"{assistant_id}.lock")):
+        # Open mmaps keep the old files alive until the stores using them are dropped
+        shutil.rmtree(local_path, ignore_errors=True)
+        os.rename(new_dir, local_path)
+
+    local_cache.forget(assistant_id)
+    local_cache.record_download(assistant_id, LocalArtifactCache.directory_bytes(local_path))
+    vector_store_cache.invalidate(assistant_id)
+
+def load_rag_engine(assistant_id: str):
+
+    local_cache.record_access(assistant_id)
+    index_usage.record(assistant_id)
+    if local_cache.needs_freshness_check(assistant_id):
+        refresh_if_stale(assistant_id)
+
+    vector_store = vector_store_cache.get(assistant_id)
+    if vector_store is not None:
+        return vector_store
+
+    with vector_store_cache.load_lock(assistant_id):
+        # Another request may have loaded it while we waited
+        vector_store = vector_store_cache.get(assistant_id, record_stats=False)
+        if vector_store is not None:
+            return vector_store
+
+        generation = vector_store_cache.generation(assistant_id)
+        local_path = ensure_local_copy(assistant_id)
+
+        if os.path.exists(os.path.join(local_path, STORE_DIR)):
+            print(f"Opening mmap Index from: {local_path}")
+            with stage("index_open"):
+                # Queries must be embedded by the model that wrote the store
+                descriptor = read_format(os.path.join(local_path, STORE_DIR))
+                embedding_model = get_query_embeddings(spec_for_document_key((descriptor or {}).get("embedding_model")))
+                vector_store = MmapVectorStore.open(local_path, embedding_model)
+        else:
+            # Legacy pickle-based layout (always Gemini); app.rag.convert_index migrates these
+            embedding_model = get_query_embeddings(GeminiEmbeddingProvider.name)
+            index_path = os.path.join(local_path, "faiss_index")
+            print(f"Loading legacy FAISS Index from: {index_path}")
+
+            vector_store = FAISS.load_local(
+                folder_path=index_path, 
+                embeddings=embedding_model, 
+                allow_dangerous_deserialization=True
+            )
+
+        vector_store_cache.put(assistant_id, vector_store, estimate_vector_store_bytes(vector_store), generation)
+
+    return vector_store
@@ -0,0 +1,145 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+from filelock import FileLock, Timeout
+
+
+class LocalArtifactCache:
+    """Disk-budgeted bookkeeping for downloaded assistant directories under temp_rag_data.
+
+    Tracks size, last access and hit count per storage key in a small SQLite index
+    (so rankings survive restarts), evicts by LRU or LFU when the byte budget is
+    exceeded, and rate-limits freshness checks against blob ETags.
+    """
+
+    def __init__(self, data_dir: str, lock_dir: str, max_bytes: int, policy: str, freshness_seconds: int):
+        self.data_dir = data_dir
+        self.lock_dir = lock_dir
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.freshness_seconds = freshness_seconds
+
+        os.makedirs(data_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(data_dir, ".cache_index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS local_artifacts ("
+            "key TEXT PRIMARY KEY, bytes INTEGER NOT NULL, last_access REAL NOT NULL, "
+            "hits INTEGER NOT NULL DEFAULT 0, checked_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        # Access bumps are batched in memory and flushed periodically, not written per request
+        self._pending_hits = {}
+        self._last_flush = time.time()
+
+        self.evictions = 0
+        self.stale_refreshes = 0
+
+    @staticmethod
+    def directory_bytes(path: str) -> int:
+        total = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+
+    def record_download(self, key: str, size: int):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO local_artifacts (key, bytes, last_access, hits, checked_at) VALUES (?, ?, ?, 0, ?) "
+                "ON CONFLICT(key) DO UPDATE SET bytes = excluded.bytes, last_access = excluded.last_access, "
+                "checked_at = excluded.checked_at",
+                (key, size, now, now)
+            )
+            self._conn.commit()
+
+    def record_access(self, key: str):
+        with self._lock:
+            self._pending_hits[key] = (self._pending_hits.get(key, (0, 0))[0] + 1, time.time())
+            if time.time() - self._last_flush > 30:
+                self._flush()
+
+    def _flush(self):
+        self._conn.executemany(
+            "UPDATE local_artifacts SET hits = hits + ?, last_access = MAX(last_access, ?) WHERE key = ?",
+            [(hits, last_access, key) for key, (hits, last_access) in self._pending_hits.items()]
+        )
+        self._conn.commit()
+        self._pending_hits.clear()
+        self._last_flush = time.time()
+
+    def forget(self, key: str):
+        with self._lock:
+            self._pending_hits.pop(key, None)
+            self._conn.execute("DELETE FROM local_artifacts WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def needs_freshness_check(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT checked_at FROM local_artifacts WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] > self.freshness_seconds
+
+    def mark_checked(self, key: str):
+        with self._lock:
+            self._conn.execute("UPDATE local_artifacts SET checked_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def most_used(self, limit: int) -> List[str]:
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT key FROM local_artifacts ORDER BY hits DESC, last_access DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def enforce_budget(self, protect: Optional[str] = None, on_evict: Callable[[str], None] = None):
+        """Evict cold directories until the total fits the budget; `protect` is never evicted."""
+        order = "hits ASC, last_access ASC" if self.policy == "lfu" else "last_access ASC"
+        with self._lock:
+            self._flush()
+            total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM local_artifacts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            candidates = self._conn.execute(
+                f"SELECT key, bytes FROM local_artifacts ORDER BY {order}"
+            ).fetchall()
+
+        for key, size in candidates:
+            if total <= self.max_bytes:
+                break
+            if key == protect:
+                continue
+
+            # Skip anything being downloaded or loaded right now
+            try:
+                with FileLock(os.path.join(self.lock_dir, f"{key}.lock"), timeout=0):
+                    shutil.rmtree(os.path.join(self.data_dir, key), ignore_errors=True)
+            except Timeout:
+                continue
+
+            self.forget(key)
+            total -= size
+            self.evictions += 1
+            print(f"--- Local Cache: evicted Assistant {key} ({size} bytes) ---")
+            if on_evict:
+                on_evict(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM local_artifacts"
+            ).fetchone()
+        return {
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "evictions": self.evictions,
+            "stale_refreshes": self.stale_refreshes,
+        }
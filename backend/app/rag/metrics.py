@@ -0,0 +1,147 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app.config.config import settings
+
+# Per-stage latency, ingest throughput and blob transfer rates for GET /metrics.
+# Recording is a perf_counter pair and a histogram bucket increment (~µs per stage);
+# cache hit ratios are read from the caches' own counters only when scraped.
+#
+# Ingestion workers run in separate processes; set PROMETHEUS_MULTIPROC_DIR (shared
+# by the API and the workers) so their samples show up on the API's /metrics too.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent per request stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+INGEST_PAGES = Counter("rag_ingest_pages_total", "PDF pages ingested")
+INGEST_CHUNKS = Counter("rag_ingest_chunks_total", "Chunks ingested")
+INGEST_PAGES_PER_SECOND = Histogram(
+    "rag_ingest_pages_per_second", "Ingest throughput per document (pages/s)",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+INGEST_CHUNKS_PER_SECOND = Histogram(
+    "rag_ingest_chunks_per_second", "Ingest throughput per document (chunks/s)",
+    buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+BLOB_BYTES = Counter("rag_blob_bytes_total", "Bytes moved to/from blob storage", ["direction"])
+BLOB_SECONDS = Counter("rag_blob_seconds_total", "Time spent in blob transfers", ["direction"])
+BLOB_BYTES_PER_SECOND = Histogram(
+    "rag_blob_bytes_per_second", "Throughput of individual blob transfers", ["direction"],
+    buckets=(1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8)
+)
+
+
+def _init_tracer():
+    if not settings.OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        # The exporter endpoint comes from the standard OTEL_EXPORTER_OTLP_* variables
+        provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+        return trace.get_tracer("app.rag")
+    except Exception as e:
+        print(f"OpenTelemetry disabled, failed to set up tracing: {e}")
+        return None
+
+
+tracer = _init_tracer()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into rag_stage_seconds{stage=name} (and an OpenTelemetry span if enabled)."""
+    started = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+        return
+
+    with tracer.start_as_current_span(name):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def observe_stage(name: str, seconds: float):
+    # For stages that don't map onto one block (time to first token, streamed totals)
+    STAGE_SECONDS.labels(name).observe(seconds)
+
+
+def record_ingest(pages: int, chunks: int, seconds: float):
+    INGEST_PAGES.inc(pages)
+    INGEST_CHUNKS.inc(chunks)
+    if seconds > 0:
+        INGEST_PAGES_PER_SECOND.observe(pages / seconds)
+        INGEST_CHUNKS_PER_SECOND.observe(chunks / seconds)
+
+
+def record_blob_transfer(direction: str, size: int, seconds: float):
+    BLOB_BYTES.labels(direction).inc(size)
+    BLOB_SECONDS.labels(direction).inc(seconds)
+    if seconds > 0 and size:
+        BLOB_BYTES_PER_SECOND.labels(direction).observe(size / seconds)
+
+
+class CacheCollector:
+    """Hit/miss counters and hit ratios of the in-process caches, read at scrape time."""
+
+    def __init__(self, caches: dict):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("rag_cache_hit_ratio", "Cache hit ratio since start", labels=["cache"])
+
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            if "misses" not in stats:
+                continue
+            hit_count = stats.get("hits", stats.get("memory_hits", 0) + stats.get("disk_hits", 0))
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats.get("hit_ratio", 0.0))
+
+        yield hits
+        yield misses
+        yield ratio
+
+
+_cache_collectors = []
+
+
+def register_cache_metrics(caches: dict):
+    collector = CacheCollector(caches)
+    _cache_collectors.append(collector)
+    REGISTRY.register(collector)
+
+
+def render_metrics():
+    """Body and content type for GET /metrics."""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        # Histograms and counters of every process come from the shared directory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _cache_collectors:
+            registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,106 @@
+import time
+import threading
+from typing import List
+from langchain_core.documents import Document
+from app.config.config import settings
+from app.rag.metrics import observe_stage
+
+
+class Reranker:
+    """Local CPU cross-encoder that re-scores retrieved chunks against the query.
+
+    The model loads on first use. The ONNX backend uses the int8-quantized export
+    shipped with the model; the torch backend is dynamically quantized instead.
+    If the model cannot be loaded, reranking is switched off and retrieval order is kept.
+    """
+
+    def __init__(self):
+        self._model = None
+        self._failed = False
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.calls = 0
+        self.pairs = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.RERANK_ENABLED and not self._failed
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is not None or self._failed:
+                return self._model
+
+            started = time.perf_counter()
+            try:
+                from sentence_transformers import CrossEncoder
+
+                if settings.RERANK_BACKEND == "onnx":
+                    model = CrossEncoder(
+                        settings.RERANK_MODEL,
+                        max_length=settings.RERANK_MAX_LENGTH,
+                        backend="onnx",
+                        model_kwargs={"file_name": settings.RERANK_ONNX_FILE}
+                    )
+                else:
+                    import torch
+                    model = CrossEncoder(settings.RERANK_MODEL, max_length=settings.RERANK_MAX_LENGTH, device="cpu")
+                    model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+            except Exception as e:
+                print(f"Reranker disabled, failed to load {settings.RERANK_MODEL}: {e}")
+                self._failed = True
+                return None
+
+            self.load_seconds = time.perf_counter() - started
+            print(f"--- Loaded reranker {settings.RERANK_MODEL} ({settings.RERANK_BACKEND}) in {self.load_seconds:.2f}s ---")
+            self._model = model
+            return model
+
+    def rerank(self, query: str, docs: List[Document], top_k: int) -> List[Document]:
+        if not self.enabled or len(docs) <= 1:
+            return docs[:top_k]
+        model = self._load()
+        if model is None:
+            return docs[:top_k]
+
+        started = time.perf_counter()
+        scores = model.predict(
+            [(query, doc.page_content) for doc in docs],
+            batch_size=settings.RERANK_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        observe_stage("rerank", elapsed_ms / 1000)
+
+        with self._stats_lock:
+            self.calls += 1
+            self.pairs += len(docs)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.last_ms = elapsed_ms
+        print(f"Reranked {len(docs)} candidates in {elapsed_ms:.1f}ms")
+
+        order = sorted(range(len(docs)), key=lambda i: -float(scores[i]))
+        return [docs[i] for i in order[:top_k]]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "loaded": self._model is not None,
+                "model": settings.RERANK_MODEL,
+                "backend": settings.RERANK_BACKEND,
+                "load_seconds": round(self.load_seconds, 2),
+                "calls": self.calls,
+                "pairs": self.pairs,
+                "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+                "max_ms": round(self.max_ms, 2),
+                "last_ms": round(self.last_ms, 2)
+            }
+
+
+reranker = Reranker()
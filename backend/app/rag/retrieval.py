@@ -0,0 +1,109 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi.concurrency import run_in_threadpool
+from langchain_core.documents import Document
+from app.config.config import settings
+from app.rag.rerank import reranker
+
+# BM25 runs here so it overlaps with the query embedding call and the vector search
+_lexical_pool = ThreadPoolExecutor(max_workers=settings.LEXICAL_SEARCH_WORKERS, thread_name_prefix="bm25")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """Merge ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
+
+
+class HybridSearch:
+    """Retrieval for one query.
+
+    BM25 starts as soon as the object is created; the vector half joins once the
+    query embedding is available, and both rankings are fused with RRF. Stores
+    without a lexical index (legacy FAISS, or hybrid disabled) fall back to
+    plain vector search. With reranking on, more candidates are kept and the
+    cross-encoder picks the final top_k.
+    """
+
+    def __init__(self, vector_store, query: str, k: int):
+        self.vector_store = vector_store
+        self.query = query
+        self.top_k = k
+        self.k = max(k, settings.RERANK_CANDIDATES) if reranker.enabled else k
+        self.candidates = self.k * settings.HYBRID_CANDIDATE_FACTOR
+
+        lexical = getattr(vector_store, "lexical", None) if settings.HYBRID_RETRIEVAL_ENABLED else None
+        self.lexical_future = _lexical_pool.submit(lexical.search, query, self.candidates) if lexical else None
+        self.rare_lookup = bool(lexical) and lexical.is_rare_lookup(
+            query, settings.LEXICAL_ONLY_MAX_TERMS, settings.LEXICAL_ONLY_MAX_DF,
+            settings.LEXICAL_ONLY_MAX_DF_RATIO, settings.LEXICAL_ONLY_MIN_CHUNKS
+        )
+
+    def lexical_only(self) -> Optional[List[Document]]:
+        """Results for rare-term lookups, which need no query embedding; None otherwise."""
+        if not self.rare_lookup:
+            return None
+        hits = self.lexical_future.result()
+        if not hits:
+            return None
+        docs = [self.vector_store.document(row) for row, _ in hits[:self.k]]
+        return reranker.rerank(self.query, docs, self.top_k)
+
+    async def alexical_only(self) -> Optional[List[Document]]:
+        if not self.rare_lookup:
+            return None
+        await asyncio.wrap_future(self.lexical_future)
+        return await run_in_threadpool(self.lexical_only)
+
+    def fused(self, query_vector: List[float], vector_hits: List[Tuple[int, float]] = None) -> List[Document]:
+        """Final results; `vector_hits` are search_rows results (at least `candidates` of them) if already known."""
+        if vector_hits is not None and self.lexical_future is None:
+            docs = [self.vector_store.document(row) for row, _ in vector_hits[:self.k]]
+        elif self.lexical_future is None:
+            docs = self.vector_store.similarity_search_by_vector(query_vector, k=self.k)
+        else:
+            if vector_hits is None:
+                vector_hits = self.vector_store.search_rows(query_vector, self.candidates)
+            vector_rows = [row for row, _ in vector_hits[:self.candidates]]
+            lexical_rows = [row for row, _ in self.lexical_future.result()]
+            fused = reciprocal_rank_fusion([vector_rows, lexical_rows], k=settings.RRF_K)
+            docs = [self.vector_store.document(row) for row in fused[:self.k]]
+        return reranker.rerank(self.query, docs, self.top_k)
+
+    async def afused(self, query_vector: List[float]) -> List[Document]:
+        if self.lexical_future is not None:
+            await asyncio.wrap_future(self.lexical_future)
+        return await run_in_threadpool(self.fused, query_vector)
+
+
+def search_many(vector_store, queries: List[str], k: int, embeddings) -> Tuple[List[List[Document]], dict]:
+    """HybridSearch for a batch of queries against one store.
+
+    Queries needing a vector are embedded in one call and, on mmap stores, searched
+    together in one vectorized pass. Returns the results in query order and timings.
+    """
+    searches = [HybridSearch(vector_store, query, k) for query in queries]
+    results = [search.lexical_only() for search in searches]
+    pending = [i for i, docs in enumerate(results) if docs is None]
+    timings = {"lexical_only": len(queries) - len(pending), "embed_seconds": 0.0, "search_seconds": 0.0}
+    if not pending:
+        return results, timings
+
+    started = time.perf_counter()
+    vectors = embeddings.embed_queries([queries[i] for i in pending])
+    timings["embed_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if hasattr(vector_store, "search_rows_batch"):
+        hits = vector_store.search_rows_batch(vectors, max(searches[i].candidates for i in pending))
+    else:
+        hits = [None] * len(pending)  # legacy FAISS stores are searched one query at a time
+    for i, vector, vector_hits in zip(pending, vectors, hits):
+        results[i] = searches[i].fused(vector, vector_hits)
+    timings["search_seconds"] = time.perf_counter() - started
+    return results, timings
@@ -0,0 +1,159 @@
+"""Server-side chat sessions.
+
+The conversation lives in the chat_sessions table as compact [role, content] pairs,
+so clients send a session id instead of their whole history on every turn. The last
+retrieval of each session is kept in memory: a follow-up question close to the one
+it was made for reuses those chunks instead of searching the store again.
+"""
+import time
+import uuid
+import weakref
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.config.config import settings
+from app.database import models
+from app.database.database import AsyncSessionLocal
+
+
+class SessionMessage(NamedTuple):
+    role: str  # 'user' or 'assistant'
+    content: str
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def session_history(chat_session: models.ChatSession) -> List[SessionMessage]:
+    return [SessionMessage(role, content) for role, content in chat_session.messages or []]
+
+
+def _session_query(session_id: str, user_id: int, assistant_id: int = None):
+    query = select(models.ChatSession).where(
+        models.ChatSession.id == session_id,
+        models.ChatSession.user_id == user_id
+    )
+    if assistant_id is not None:
+        query = query.where(models.ChatSession.assistant_id == assistant_id)
+    return query
+
+
+def get_chat_session(db: Session, session_id: str, user_id: int, assistant_id: int = None) -> models.ChatSession:
+    chat_session = db.execute(_session_query(session_id, user_id, assistant_id)).scalar_one_or_none()
+    if chat_session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return chat_session
+
+
+async def aget_chat_session(session_id: str, user_id: int, assistant_id: int) -> models.ChatSession:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(_session_query(session_id, user_id, assistant_id))
+        chat_session = result.scalar_one_or_none()
+    if chat_session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return chat_session
+
+
+def _locked_messages(session_id: str):
+    # Row lock: overlapping turns of one session (two tabs, a retry) append one after the other
+    return select(models.ChatSession.messages).where(models.ChatSession.id == session_id).with_for_update()
+
+
+def _record_turn_statement(session_id: str, messages, query: str, answer: str):
+    # Only the newest messages are kept; prompts never use more (see compress_history)
+    messages = list(messages or []) + [["user", query], ["assistant", answer]]
+    return update(models.ChatSession).where(models.ChatSession.id == session_id).values(
+        messages=messages[-settings.CHAT_SESSION_MAX_MESSAGES:],
+        turns=models.ChatSession.turns + 1,
+        updated_at=func.now()
+    ).execution_options(synchronize_session=False)
+
+
+def record_turn(db: Session, chat_session: models.ChatSession, query: str, answer: str):
+    """Append a turn to the stored history as it is now, not as it was when the request started."""
+    messages = db.execute(_locked_messages(chat_session.id)).scalar_one_or_none()
+    db.execute(_record_turn_statement(chat_session.id, messages, query, answer))
+    db.commit()
+
+
+async def arecord_turn(chat_session: models.ChatSession, query: str, answer: str):
+    async with AsyncSessionLocal() as db:
+        messages = (await db.execute(_locked_messages(chat_session.id))).scalar_one_or_none()
+        await db.execute(_record_turn_statement(chat_session.id, messages, query, answer))
+        await db.commit()
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SessionRetrievalCache:
+    """Last retrieval (query embedding + retrieved chunks) per chat session, per process.
+
+    Entries are tied to the loaded store object, so once a store is reloaded (after a
+    document edit, or eviction) older chunks are never served. Reuse does not move the
+    anchor: a drifting conversation searches again once it strays from the original query.
+    """
+
+    def __init__(self, similarity: float, ttl_seconds: int, max_entries: int):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # session id -> (expires_at, store ref, vector, docs)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, session_id: str, vector_store, query_vector) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and (entry[0] < time.monotonic() or entry[1]() is not vector_store):
+                del self._entries[session_id]
+                entry = None
+
+            if entry is not None and float(entry[2] @ _normalize(query_vector)) >= self.similarity:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return entry[3]
+
+            self.misses += 1
+            return None
+
+    def store(self, session_id: str, vector_store, query_vector, docs: list):
+        with self._lock:
+            self._entries[session_id] = (
+                time.monotonic() + self.ttl_seconds, weakref.ref(vector_store), _normalize(query_vector), docs
+            )
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "similarity": self.similarity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0
+            }
+
+
+session_retrieval_cache = SessionRetrievalCache(
+    similarity=settings.SESSION_RETRIEVAL_SIMILARITY,
+    ttl_seconds=settings.SESSION_RETRIEVAL_TTL_SECONDS,
+    max_entries=settings.SESSION_RETRIEVAL_MAX_ENTRIES
+)
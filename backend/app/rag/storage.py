@@ -1,28 +1,181 @@
 import os
-from azure.storage.blob import BlobServiceClient
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
 from app.config.config import settings
+from app.rag.metrics import record_blob_transfer
 
-def upload_assistant_data(local_dir: str, assistant_id: str):
+
+# index_format's store/format.json
+STORE_DESCRIPTOR = "/store/format.json"
+
+
+class BlobInfo(NamedTuple):
+    name: str
+    size: int
+    etag: str
+    md5: Optional[str] = None  # hex Content-MD5, when the backend records one
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AzureBlobBackend:
+    """Azure Blob Storage through one shared, connection-pooled client.
+
+    Large blobs are split into blocks/ranges that transfer concurrently and are
+    streamed straight to/from disk instead of being buffered in memory.
+    """
+
+    def __init__(self, connection_string: str, container_name: str):
+        from azure.storage.blob import BlobServiceClient
+
+        self._service = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_block_size=settings.BLOB_BLOCK_SIZE,
+            max_single_put_size=settings.BLOB_BLOCK_SIZE,
+            max_chunk_get_size=settings.BLOB_BLOCK_SIZE,
+            max_single_get_size=settings.BLOB_BLOCK_SIZE
+        )
+        self._container = self._service.get_container_client(container_name)
+
+    def list(self, prefix: str) -> List[BlobInfo]:
+        blobs = []
+        for blob in self._container.list_blobs(name_starts_with=prefix):
+            md5 = blob.content_settings.content_md5 if blob.content_settings else None
+            blobs.append(BlobInfo(name=blob.name, size=blob.size, etag=blob.etag, md5=bytes(md5).hex() if md5 else None))
+        return blobs
+
+    def upload_file(self, local_path: str, blob_name: str):
+        from azure.storage.blob import ContentSettings
+
+        # Block uploads get no Content-MD5 from the service; downloads are verified against this one
+        content_settings = ContentSettings(content_md5=bytearray.fromhex(file_md5(local_path)))
+        with open(local_path, "rb") as data:
+            self._container.upload_blob(
+                name=blob_name,
+                data=data,
+                overwrite=True,
+                content_settings=content_settings,
+                max_concurrency=settings.BLOB_BLOCK_CONCURRENCY
+            )
+
+    def download_file(self, blob_name: str, dest_path: str):
+        with open(dest_path, "wb") as file:
+            downloader = self._container.download_blob(blob_name, max_concurrency=settings.BLOB_BLOCK_CONCURRENCY)
+            downloader.readinto(file)
+
+    def delete(self, blob_name: str):
+        self._container.delete_blob(blob_name)
+
+
+class LocalBlobBackend:
+    """Directory-backed stand-in for blob storage (tests, benchmarks, offline dev)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.root, *blob_name.split("/"))
+
+    def list(self, prefix: str) -> List[BlobInfo]:
+        blobs = []
+        # Only walk the directory the prefix points into
+        start = self._path(prefix.rsplit("/", 1)[0]) if "/" in prefix else self.root
+        for root, dirs, files in os.walk(start):
+            for file in files:
+                path = os.path.join(root, file)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    stat = os.stat(path)
+                    blobs.append(BlobInfo(name=name, size=stat.st_size, etag=f"{stat.st_mtime_ns}-{stat.st_size}"))
+        return blobs
+
+    def upload_file(self, local_path: str, blob_name: str):
+        dest = self._path(blob_name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(local_path, dest)
+
+    def download_file(self, blob_name: str, dest_path: str):
+        shutil.copyfile(self._path(blob_name), dest_path)
+
+    def delete(self, blob_name: str):
+        path = self._path(blob_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_blob_backend():
+    """Process-wide blob backend, created once so HTTP connections are reused."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if settings.BLOB_BACKEND == "local":
+                _backend = LocalBlobBackend(settings.LOCAL_BLOB_DIR)
+            else:
+                _backend = AzureBlobBackend(settings.AZURE_STORAGE_CONNECTION_STRING, settings.AZURE_CONTAINER_NAME)
+        return _backend
+
+
+def _run_concurrently(fn, jobs):
+    # Files transfer in parallel; each large file is additionally split into blocks by the backend
+    with ThreadPoolExecutor(max_workers=settings.BLOB_FILE_CONCURRENCY) as pool:
+        for future in [pool.submit(fn, *job) for job in jobs]:
+            future.result()
+
+
+def upload_assistant_data(local_dir: str, assistant_id: str, unchanged: frozenset = frozenset(), remove_missing: bool = False):
+    """Upload local_dir under `<assistant_id>/`.
+
+    Relative paths in `unchanged` are already stored and skipped. With remove_missing,
+    store blobs that no longer exist locally (e.g. a deleted document's segment) are removed.
+    """
 
     try:
-        # Connect to Azure
-        blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER_NAME)
+        backend = get_blob_backend()
 
         print(f"--- Starting Upload for Assistant {assistant_id} ---")
-        
+
+        jobs = []
+        uploaded = set()
         for root, dirs, files in os.walk(local_dir):
             for file in files:
-               
                 local_file_path = os.path.join(root, file)
-                
-                relative_path = os.path.relpath(local_file_path, local_dir)
+                relative_path = os.path.relpath(local_file_path, local_dir).replace(os.sep, "/")
                 blob_name = f"{assistant_id}/{relative_path}"
-                
-                
-                print(f"Uploading: {blob_name}")
-                with open(local_file_path, "rb") as data:
-                    container_client.upload_blob(name=blob_name, data=data, overwrite=True)
+                uploaded.add(blob_name)
+                if relative_path not in unchanged:
+                    jobs.append((local_file_path, blob_name))
+
+        def upload(local_file_path, blob_name):
+            print(f"Uploading: {blob_name}")
+            started = time.perf_counter()
+            backend.upload_file(local_file_path, blob_name)
+            record_blob_transfer("upload", os.path.getsize(local_file_path), time.perf_counter() - started)
+
+        # The store descriptor goes last so it never points at segments not yet uploaded
+        descriptor_jobs = [job for job in jobs if job[1].endswith(STORE_DESCRIPTOR)]
+        _run_concurrently(upload, [job for job in jobs if job not in descriptor_jobs])
+        _run_concurrently(upload, descriptor_jobs)
+
+        if remove_missing:
+            for blob in backend.list(f"{assistant_id}/store/"):
+                if blob.name not in uploaded:
+                    print(f"Deleting blob: {blob.name}")
+                    backend.delete(blob.name)
 
         print("--- Upload Complete ---")
         return True
@@ -30,22 +183,42 @@ def upload_assistant_data(local_dir: str, assistant_id: str):
     except Exception as e:
         print(f"Error uploading to Azure: {e}")
         raise e
-    
+
+
+def download_assistant_blobs(assistant_id: str, local_dir: str) -> List[BlobInfo]:
+    """Stream every blob under `<assistant_id>/` into local_dir; returns what was downloaded."""
+    backend = get_blob_backend()
+    blobs = backend.list(f"{assistant_id}/")
+
+    jobs = []
+    for blob in blobs:
+        relative_path = blob.name.replace(f"{assistant_id}/", "", 1)
+        dest_file_path = os.path.join(local_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+        jobs.append((blob.name, dest_file_path))
+
+    def download(blob_name, dest_file_path):
+        print(f"Downloading: {blob_name}")
+        started = time.perf_counter()
+        backend.download_file(blob_name, dest_file_path)
+        record_blob_transfer("download", os.path.getsize(dest_file_path), time.perf_counter() - started)
+
+    _run_concurrently(download, jobs)
+    return blobs
+
 
 def delete_assistant_data(assistant_id: str):
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(settings.AZURE_STORAGE_CONNECTION_STRING)
-        container_client = blob_service_client.get_container_client(settings.AZURE_CONTAINER_NAME)
-        
-        blobs = container_client.list_blobs(name_starts_with=f"{assistant_id}/")
-        
+        backend = get_blob_backend()
+        blobs = backend.list(f"{assistant_id}/")
+
         for blob in blobs:
             print(f"Deleting blob: {blob.name}")
-            container_client.delete_blob(blob.name)
-            
+            backend.delete(blob.name)
+
         print(f"--- Deleted all cloud data for Assistant {assistant_id} ---")
         return True
 
     except Exception as e:
         print(f"Error deleting from Azure: {e}")
-        return False
\ No newline at end of file
+        return False
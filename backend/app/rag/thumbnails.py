@@ -0,0 +1,141 @@
+"""First-page thumbnails, stored as PNG blobs instead of base64 in the assistants table.
+
+Blobs are content-addressed (thumbnails/<sha256>.png), so assistants sharing a PDF
+share one blob and a thumbnail URL never changes its content.
+
+Move thumbnails still stored inline (also done in the background at startup):
+    python -m app.rag.thumbnails --migrate
+"""
+import os
+import sys
+import uuid
+import base64
+import hashlib
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.database import models
+from app.database.database import SessionLocal
+from app.rag.extract import inspect_pdf
+from app.rag.storage import get_blob_backend
+
+THUMBNAIL_PREFIX = "thumbnails/"
+THUMBNAIL_CACHE_DIR = "temp_thumbnails"
+MIGRATE_BATCH = 50
+
+os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+
+
+def thumbnail_blob(thumbnail_key: str) -> str:
+    return f"{THUMBNAIL_PREFIX}{thumbnail_key}.png"
+
+
+def _cache_path(thumbnail_key: str) -> str:
+    return os.path.join(THUMBNAIL_CACHE_DIR, f"{thumbnail_key}.png")
+
+
+def store_thumbnail(image_bytes: bytes) -> str:
+    """Upload a PNG (once per distinct image); returns its key."""
+    thumbnail_key = hashlib.sha256(image_bytes).hexdigest()
+    path = _cache_path(thumbnail_key)
+    if not os.path.exists(path):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(image_bytes)
+        os.replace(temp_path, path)
+    get_blob_backend().upload_file(path, thumbnail_blob(thumbnail_key))
+    return thumbnail_key
+
+
+def local_thumbnail(thumbnail_key: str) -> str:
+    """Path of a thumbnail on local disk, downloaded on first use (keys are immutable)."""
+    path = _cache_path(thumbnail_key)
+    if not os.path.exists(path):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        get_blob_backend().download_file(thumbnail_blob(thumbnail_key), temp_path)
+        os.replace(temp_path, path)
+    return path
+
+
+def generate_thumbnail(assistant_id: int, file_path: str) -> Optional[int]:
+    """Render and attach an assistant's thumbnail; returns the page count (None if the PDF can't be opened)."""
+    try:
+        total_pages, image_bytes = inspect_pdf(file_path)
+    except Exception as e:
+        print(f"Thumbnail generation failed: {e}")
+        return None
+
+    if image_bytes:
+        try:
+            thumbnail_key = store_thumbnail(image_bytes)
+        except Exception as e:
+            print(f"Thumbnail upload failed: {e}")
+            return total_pages
+
+        db = SessionLocal()
+        try:
+            db.query(models.Assistant).filter(models.Assistant.id == assistant_id).update(
+                {"thumbnail_key": thumbnail_key}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+    return total_pages
+
+
+def release_thumbnail(db: Session, assistant: models.Assistant):
+    """Delete an assistant's thumbnail blob unless another assistant shows the same image."""
+    thumbnail_key = assistant.thumbnail_key
+    if not thumbnail_key:
+        return
+    shared = db.query(models.Assistant.id).filter(
+        models.Assistant.thumbnail_key == thumbnail_key,
+        models.Assistant.id != assistant.id
+    ).first()
+    if shared:
+        return
+
+    try:
+        get_blob_backend().delete(thumbnail_blob(thumbnail_key))
+    except Exception as e:
+        print(f"Failed to delete thumbnail {thumbnail_key}: {e}")
+    if os.path.exists(_cache_path(thumbnail_key)):
+        os.remove(_cache_path(thumbnail_key))
+
+
+def migrate_inline_thumbnails() -> int:
+    """Move base64 thumbnails from the assistants table to blobs; returns how many were moved."""
+    moved = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(models.Assistant.id, models.Assistant.image_base64).filter(
+                models.Assistant.image_base64.isnot(None)
+            ).limit(MIGRATE_BATCH).all()
+            if not rows:
+                break
+
+            for assistant_id, image_base64 in rows:
+                values = {"image_base64": None}
+                try:
+                    values["thumbnail_key"] = store_thumbnail(base64.b64decode(image_base64))
+                except Exception as e:
+                    # Unreadable data is dropped; the UI falls back to its placeholder icon
+                    print(f"Could not migrate thumbnail of Assistant {assistant_id}: {e}")
+                db.query(models.Assistant).filter(models.Assistant.id == assistant_id).update(
+                    values, synchronize_session=False
+                )
+                moved += 1
+            db.commit()
+        finally:
+            db.close()
+
+    if moved:
+        print(f"--- Moved {moved} inline thumbnails to blob storage ---")
+    return moved
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["--migrate"]:
+        print(__doc__)
+        sys.exit(1)
+    migrate_inline_thumbnails()
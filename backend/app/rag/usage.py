@@ -0,0 +1,84 @@
+import time
+import threading
+from typing import List
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from app.config.config import settings
+from app.database import models
+from app.database.database import SessionLocal
+
+
+class IndexUsageCounter:
+    """Load counts per storage key, shared by every pod through the index_usage table.
+
+    Unlike the local disk cache's hit counts, these survive evictions and pod restarts,
+    so a fresh pod knows which indexes to pre-warm. Counts are batched in memory and
+    added to the table every `flush_seconds`.
+    """
+
+    def __init__(self, enabled: bool, flush_seconds: float):
+        self.enabled = enabled
+        self.flush_seconds = flush_seconds
+        self._pending = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, key: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+            if time.time() - self._last_flush < self.flush_seconds:
+                return
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        self._write(pending)
+
+    def _write(self, pending: dict):
+        if not pending:
+            return
+        statement = insert(models.IndexUsage).values([
+            {"storage_key": key, "hits": hits, "last_used_at": func.now()} for key, hits in pending.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[models.IndexUsage.storage_key],
+            set_={"hits": models.IndexUsage.hits + statement.excluded.hits, "last_used_at": func.now()}
+        )
+        db = SessionLocal()
+        try:
+            db.execute(statement)
+            db.commit()
+        except Exception as e:
+            # Usage is advisory; a lost batch only makes pre-warming slightly less accurate
+            db.rollback()
+            print(f"Failed to record index usage: {e}")
+        finally:
+            db.close()
+
+    def most_used(self, limit: int) -> List[str]:
+        self.flush()
+        db = SessionLocal()
+        try:
+            rows = db.query(models.IndexUsage.storage_key).order_by(
+                models.IndexUsage.hits.desc(), models.IndexUsage.last_used_at.desc()
+            ).limit(limit).all()
+            return [row[0] for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def forget(db, key: str):
+        """Drop a deleted index's row; the caller commits."""
+        db.query(models.IndexUsage).filter(models.IndexUsage.storage_key == key).delete(synchronize_session=False)
+
+
+index_usage = IndexUsageCounter(
+    enabled=settings.INDEX_USAGE_TRACKING,
+    flush_seconds=settings.INDEX_USAGE_FLUSH_SECONDS
+)
@@ -2,10 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from app.database import models, database, schemas
 from app.security import Oauth2
-from app.rag.storage import delete_assistant_data
+from app.rag.cache import vector_store_cache, answer_cache
+from app.rag.embeddings import query_embedding_cache
+from app.rag.sessions import session_retrieval_cache
+from app.rag.artifacts import release_assistant_storage
+from app.rag.load import local_cache, prewarm
+from app.rag.rerank import reranker
+from app.rag.thumbnails import release_thumbnail
+from app.security.auth_cache import auth_cache
 from typing import List
-import os
-import shutil
 
 
 
@@ -25,6 +30,7 @@ def delete_user(user_id: int, db: Session = Depends(database.get_db),
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     db.delete(user)
     db.commit()
+    auth_cache.invalidate_user(user_id)
     return
 
 @router.delete("/assistant/{assistant_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -34,18 +40,31 @@ def delete_assistant(assistant_id: int, db: Session = Depends(database.get_db),
     if not assistant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assistant not found")
     
-    # Clean up cloud storage
-    delete_assistant_data(str(assistant_id))
-    
-    # Clean up local temp files
-    local_path = os.path.join("temp_rag_data", str(assistant_id))
-    if os.path.exists(local_path):
-        shutil.rmtree(local_path)
-    
+    # Release the index; blobs are only deleted once no other assistant shares them
+    release_assistant_storage(db, assistant)
+    release_thumbnail(db, assistant)
+
     db.delete(assistant)
     db.commit()
+    auth_cache.invalidate_assistant(assistant_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+def get_cache_stats(current_user: models.User = Depends(Oauth2.get_admin_user)):
+    return {
+        "vector_store_cache": vector_store_cache.stats(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "local_disk_cache": local_cache.stats(),
+        "reranker": reranker.stats(),
+        "auth_cache": auth_cache.stats(),
+        "session_retrieval_cache": session_retrieval_cache.stats()
+    }
+
+@router.post("/prewarm", status_code=status.HTTP_200_OK)
+def prewarm_assistants(top_n: int = 10, current_user: models.User = Depends(Oauth2.get_admin_user)):
+    return {"loaded": prewarm(top_n)}
+
 @router.post("/grant-admin/{user_id}", status_code=status.HTTP_200_OK)
 def grant_admin_privileges(user_id: int, db: Session = Depends(database.get_db),
                            current_user: models.User = Depends(Oauth2.get_admin_user)):
@@ -58,4 +77,5 @@ def grant_admin_privileges(user_id: int, db: Session = Depends(database.get_db),
     
     user.role = models.UserRole.ADMIN
     db.commit()
+    auth_cache.invalidate_user(user_id)
     return {"message": f"User '{user.username}' has been granted admin privileges"}
\ No newline at end of file
@@ -1,17 +1,28 @@
 import json
 import os
-import shutil
-import fitz  # PyMuPDF
-import base64
-from fastapi.responses import StreamingResponse
+import uuid
+import hashlib
+from fastapi.responses import StreamingResponse, FileResponse
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Response, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from app.database import models, database, schemas
 from app.security import Oauth2
+from app.security.auth_cache import auth_cache
 from app.database.database import get_db
-from app.rag.ingest import ingest_pdf
-from app.rag.storage import upload_assistant_data, delete_assistant_data
+from app.rag.ann_index import INDEX_TYPES
+from app.rag.embeddings import get_allowed_embedding_provider
+from app.rag.extract import inspect_pdf
+from app.rag.artifacts import artifact_content_key, find_ready_artifact, release_assistant_storage
+from app.rag.index_format import LEGACY_SEGMENT, remove_document
+from app.rag.documents import (
+    LegacyIndexError, document_key, edit_target, open_working_copy,
+    publish_working_copy, discard_working_copy
+)
+from app.rag.ingest_jobs import enqueue_job, follow_job, finish_document_edit
+from app.rag.thumbnails import local_thumbnail, release_thumbnail
 
 router = APIRouter(
     prefix="/assistants",
@@ -21,54 +32,24 @@ router = APIRouter(
 UPLOAD_DIR = "temp_uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-def ingest_stream_generator(file_path: str, assistant_id: str, chunk_size: int, chunk_overlap: int):
-    output_dir = None
-    
-    try:
-        iterator = ingest_pdf(
-            file_path=file_path,
-            assistant_id=assistant_id,
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
-
-        for message_json in iterator:
-            message_data = json.loads(message_json)
-            
-            # Optional: Keep logging for debug
-            # print(f" [STREAM] {message_data.get('message')}")
-
-            if message_data.get("status") == "ingestion_complete":
-                output_dir = message_data.get("output_dir")
-            else:
-                yield message_json + "\n"
-
-        # Cleanup and finalize
-        if output_dir:
-            upload_assistant_data(output_dir, assistant_id)
-            
-            shutil.rmtree(output_dir)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                
-            final_msg = "Assistant Ready!"
-            # print(f" [STREAM] {final_msg}")
-
-            yield json.dumps({
-                "status": "complete", 
-                "message": "Assistant Ready!", 
-                "assistant_id": assistant_id
-            }) + "\n"
-        else:
-            print(" [STREAM ERROR] Ingestion failed to return output.")
-            yield json.dumps({"status": "error", "message": "Ingestion failed to produce output."}) + "\n"
-
-    except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        print(f" [STREAM ERROR] {str(e)}")
-        yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+def save_upload_with_hash(upload: UploadFile, destination: str) -> str:
+    # Hash while streaming to disk so dedup costs no extra pass over the file
+    digest = hashlib.sha256()
+    with open(destination, "wb") as buffer:
+        while True:
+            block = upload.file.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+            buffer.write(block)
+    return digest.hexdigest()
 
+def reused_index_stream(assistant_id: str):
+    yield json.dumps({
+        "status": "complete", 
+        "message": "Assistant Ready!", 
+        "assistant_id": assistant_id
+    }) + "\n"
 
 @router.post("/") 
 def create_assistant_stream(
@@ -77,6 +58,8 @@ def create_assistant_stream(
     top_k: int = Form(5),
     chunk_size: int = Form(500),
     chunk_overlap: int = Form(50),
+    index_type: str = Form("auto"),
+    embedding_model: str = Form(None),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(Oauth2.get_current_user)
@@ -90,27 +73,66 @@ def create_assistant_stream(
     # 2. Validate
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    if index_type not in INDEX_TYPES:
+        raise HTTPException(status_code=400, detail=f"index_type must be one of {', '.join(INDEX_TYPES)}.")
+    try:
+        provider = get_allowed_embedding_provider(embedding_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 3. Save PDF locally
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 3. Save PDF locally, hashing it on the way (unique name: the file waits for a worker)
+    file_location = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}-{file.filename}")
+    file_hash = save_upload_with_hash(file, file_location)
+    content_key = artifact_content_key(file_hash, chunk_size, chunk_overlap, provider.document_key, index_type)
 
-    # 4. Generate Thumbnail (Base64)
-    encoded_image = None
-    try:
-        doc = fitz.open(file_location)
-        if len(doc) > 0:
-            page = doc.load_page(0) # Get 1st page
-            # Scale down to 30% size to save DB space
-            pix = page.get_pixmap(matrix=fitz.Matrix(0.3, 0.3)) 
-            image_bytes = pix.tobytes("png")
-            encoded_image = base64.b64encode(image_bytes).decode('utf-8')
-        doc.close()
-    except Exception as e:
-        print(f"Thumbnail generation failed: {e}")
+    # 4. Same bytes + same chunking already ingested: share the existing index
+    artifact = find_ready_artifact(db, content_key)
+    if artifact:
+        os.remove(file_location)
+        sibling = db.query(models.Assistant).filter(
+            models.Assistant.artifact_id == artifact.id,
+            models.Assistant.thumbnail_key.isnot(None)
+        ).first()
+
+        # Shared indexes keep the document ids they were written with (seg-0000 for older ones)
+        shared_document = db.query(models.AssistantDocument).join(models.Assistant).filter(
+            models.Assistant.artifact_id == artifact.id,
+            models.AssistantDocument.file_hash == file_hash
+        ).first()
 
-    # 5. Create DB Entry with Image
+        artifact.ref_count += 1
+        new_assistant = models.Assistant(
+            name=name,
+            file_name=file.filename,
+            owner_id=current_user.id,
+            temperature=temperature,
+            top_k=top_k,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            index_type=index_type,
+            embedding_model=provider.spec,
+            thumbnail_key=sibling.thumbnail_key if sibling else None,
+            artifact_id=artifact.id
+        )
+        new_assistant.documents.append(models.AssistantDocument(
+            file_name=file.filename,
+            file_hash=file_hash,
+            document_key=shared_document.document_key if shared_document else LEGACY_SEGMENT,
+            page_count=shared_document.page_count if shared_document else None,
+            chunk_count=shared_document.chunk_count if shared_document else None,
+            status="ready"
+        ))
+        db.add(new_assistant)
+        db.commit()
+        db.refresh(new_assistant)
+        print(f"--- Reusing index {artifact.blob_prefix} for Assistant {new_assistant.id} ---")
+
+        return StreamingResponse(
+            reused_index_stream(str(new_assistant.id)),
+            media_type="application/x-ndjson"
+        )
+
+    # 5. Create DB Entry (the worker renders the thumbnail and counts pages)
     new_assistant = models.Assistant(
         name=name,
         file_name=file.filename,
@@ -119,22 +141,74 @@ def create_assistant_stream(
         top_k=top_k,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        image_base64=encoded_image # <--- Save the image string here
+        index_type=index_type,
+        embedding_model=provider.spec
+    )
+    document = models.AssistantDocument(
+        file_name=file.filename,
+        file_hash=file_hash,
+        document_key=document_key(file_hash)
     )
+    new_assistant.documents.append(document)
     db.add(new_assistant)
     db.commit()
     db.refresh(new_assistant)
 
-    # 6. Return the Stream
-    return StreamingResponse(
-        ingest_stream_generator(
-            file_path=file_location, 
-            assistant_id=str(new_assistant.id), 
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
-        ),
-        media_type="application/x-ndjson"
-    )
+    # 6. Register the index so later identical uploads can share it.
+    # If the same content is being ingested right now, this assistant simply keeps its own copy.
+    artifact_id = None
+    if not db.query(models.IndexArtifact).filter(models.IndexArtifact.content_key == content_key).first():
+        try:
+            artifact = models.IndexArtifact(
+                content_key=content_key,
+                file_hash=file_hash,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                embedding_model=provider.document_key,
+                blob_prefix=str(new_assistant.id),
+                ref_count=1
+            )
+            db.add(artifact)
+            db.flush()
+            new_assistant.artifact_id = artifact.id
+            db.commit()
+            artifact_id = artifact.id
+        except IntegrityError:
+            db.rollback()
+
+    # 7. Queue the ingestion; the response only follows the job, which outlives it
+    job = enqueue_job(db, "create", new_assistant, document, file_location, {
+        "storage_key": str(new_assistant.id),
+        "artifact_id": artifact_id,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "index_type": index_type,
+        "embedding_model": provider.spec,
+        "document_key": document.document_key
+    })
+    db.commit()
+
+    return StreamingResponse(follow_job(job.id), media_type="application/x-ndjson")
+
+# Content-addressed and immutable, so browsers may keep them for good. Served without a
+# bearer token so <img> tags can load them; the 256-bit key is the capability.
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+@router.get("/thumbnails/{thumbnail_key}.png", include_in_schema=False)
+async def get_thumbnail(thumbnail_key: str, request: Request):
+    if len(thumbnail_key) != 64 or any(c not in "0123456789abcdef" for c in thumbnail_key):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    etag = f'"{thumbnail_key}"'
+    headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path = await run_in_threadpool(local_thumbnail, thumbnail_key)
+    except Exception:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(path, media_type="image/png", headers=headers)
 
 # Use the schema from app/schemas.py
 @router.get("/", response_model=List[schemas.AssistantResponse])
@@ -156,14 +230,153 @@ def delete_assistant(assistant_id: int, db: Session = Depends(get_db), current_u
     if assistant.owner_id != current_user.id and not is_admin:
         raise HTTPException(status_code=403, detail="Not authorized to delete this assistant")
 
-    delete_assistant_data(str(assistant_id))
-
-    # Clean up any local temp files
-    local_path = os.path.join("temp_rag_data", str(assistant_id))
-    if os.path.exists(local_path):
-        shutil.rmtree(local_path)
+    # Release the index; blobs are only deleted once no other assistant shares them
+    release_assistant_storage(db, assistant)
+    release_thumbnail(db, assistant)
 
     assistant_query.delete(synchronize_session=False)
     db.commit()
+    auth_cache.invalidate_assistant(assistant_id)
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# --- Documents of an assistant ---
+
+def get_owned_assistant_for_edit(db: Session, assistant_id: int, user_id: int) -> models.Assistant:
+    # Row lock: concurrent document edits of one assistant are checked one at a time
+    assistant = db.query(models.Assistant).filter(
+        models.Assistant.id == assistant_id,
+        models.Assistant.owner_id == user_id
+    ).with_for_update().first()
+    if not assistant:
+        raise HTTPException(status_code=404, detail="Assistant not found")
+
+    if any(doc.status in ("processing", "deleting") for doc in assistant.documents):
+        raise HTTPException(status_code=409, detail="Another document change is still in progress for this assistant.")
+    return assistant
+
+@router.get("/{assistant_id}/documents", response_model=List[schemas.AssistantDocumentResponse])
+def list_documents(assistant_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(Oauth2.get_current_user)):
+    assistant = db.query(models.Assistant).filter(
+        models.Assistant.id == assistant_id,
+        models.Assistant.owner_id == current_user.id
+    ).first()
+    if not assistant:
+        raise HTTPException(status_code=404, detail="Assistant not found")
+    return assistant.documents
+
+
+@router.post("/{assistant_id}/documents")
+def add_document(
+    assistant_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(Oauth2.get_current_user)
+):
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+
+    file_location = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}-{file.filename}")
+    file_hash = save_upload_with_hash(file, file_location)
+    key = document_key(file_hash)
+
+    try:
+        assistant = get_owned_assistant_for_edit(db, assistant_id, current_user.id)
+        if any(doc.document_key == key for doc in assistant.documents):
+            raise HTTPException(status_code=409, detail="This PDF is already part of the assistant.")
+    except HTTPException:
+        os.remove(file_location)
+        raise
+
+    total_pages = None
+    try:
+        total_pages, _ = inspect_pdf(file_location, with_thumbnail=False)
+    except Exception as e:
+        print(f"Page count failed: {e}")
+
+    # Only new chunks are embedded; the existing documents' vectors are reused as-is
+    source_key = assistant.storage_key
+    document = models.AssistantDocument(file_name=file.filename, file_hash=file_hash, document_key=key, page_count=total_pages)
+    assistant.documents.append(document)
+    db.commit()
+    target_key = edit_target(db, assistant)
+
+    job = enqueue_job(db, "append", assistant, document, file_location, {
+        "source_key": source_key,
+        "target_key": target_key,
+        "chunk_size": assistant.chunk_size,
+        "chunk_overlap": assistant.chunk_overlap,
+        "total_pages": total_pages,
+        "index_type": assistant.index_type,
+        "embedding_model": assistant.embedding_model,
+        "document_key": key
+    })
+    db.commit()
+    auth_cache.invalidate_assistant(assistant.id)
+
+    return StreamingResponse(follow_job(job.id), media_type="application/x-ndjson")
+
+
+def get_latest_job(db: Session, assistant_id: int, user_id: int):
+    assistant = db.query(models.Assistant).filter(
+        models.Assistant.id == assistant_id,
+        models.Assistant.owner_id == user_id
+    ).first()
+    if not assistant:
+        raise HTTPException(status_code=404, detail="Assistant not found")
+    return db.query(models.IngestJob).filter(
+        models.IngestJob.assistant_id == assistant_id
+    ).order_by(models.IngestJob.created_at.desc(), models.IngestJob.id.desc()).first()
+
+
+@router.get("/{assistant_id}/ingest-status", response_model=schemas.IngestJobResponse)
+def get_ingest_status(assistant_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(Oauth2.get_current_user)):
+    job = get_latest_job(db, assistant_id, current_user.id)
+    if job is None:
+        # Reused indexes and assistants from before the job queue never had a job
+        return schemas.IngestJobResponse(status="succeeded", stage="done", progress=100)
+    return job
+
+
+@router.get("/{assistant_id}/ingest-status/stream")
+def stream_ingest_status(assistant_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(Oauth2.get_current_user)):
+    job = get_latest_job(db, assistant_id, current_user.id)
+    if job is None:
+        return StreamingResponse(reused_index_stream(str(assistant_id)), media_type="application/x-ndjson")
+    return StreamingResponse(follow_job(job.id), media_type="application/x-ndjson")
+
+
+@router.delete("/{assistant_id}/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_document(assistant_id: int, document_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(Oauth2.get_current_user)):
+    assistant = get_owned_assistant_for_edit(db, assistant_id, current_user.id)
+    document = next((doc for doc in assistant.documents if doc.id == document_id), None)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if len(assistant.documents) == 1:
+        raise HTTPException(status_code=400, detail="An assistant needs at least one document; delete the assistant instead.")
+
+    source_key = assistant.storage_key
+    document.status = "deleting"
+    db.commit()
+    target_key = edit_target(db, assistant)
+
+    work_dir = None
+    try:
+        work_dir = open_working_copy(source_key)
+        # The document's segment is dropped; the other documents are not re-embedded
+        remove_document(work_dir, document.document_key, assistant.index_type)
+        publish_working_copy(work_dir, source_key, target_key)
+        work_dir = None
+    except LegacyIndexError as e:
+        finish_document_edit(assistant_id, target_key, document_id, "restored")
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        finish_document_edit(assistant_id, target_key, document_id, "restored")
+        raise HTTPException(status_code=500, detail=f"Failed to remove document: {str(e)}")
+    finally:
+        if work_dir:
+            discard_working_copy(work_dir)
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    finish_document_edit(assistant_id, target_key, document_id, "deleted")
+    auth_cache.invalidate_assistant(assistant_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,32 +1,42 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
 from . import JWT
+from .auth_cache import auth_cache
 from ..database import database, models
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_email = JWT.verify_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.username == token_email).first()
-    
+
+    # Steady state: no database round trip at all
+    user = auth_cache.get_user(token_email)
+    if user is not None:
+        return user
+
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User).where(models.User.username == token_email))
+        user = result.scalar_one_or_none()
+
     if user is None:
-        raise credentials_exception       
+        raise credentials_exception
+    auth_cache.put_user(token_email, user)
     return user
 
 
 def get_admin_user(current_user: models.User = Depends(get_current_user)):
     if current_user.role != models.UserRole.ADMIN:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have Admin privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from app.config.config import settings
+
+
+class AuthCache:
+    """Short-lived, per-process snapshots of users (keyed by token subject) and of owned assistants.
+
+    Entries are detached ORM objects and are only read. Changes made by this
+    process invalidate them directly; changes made elsewhere (other API
+    workers, ingestion workers) are picked up once the TTL runs out.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._users = OrderedDict()  # token subject -> (expires_at, user)
+        self._assistants = OrderedDict()  # (user_id, assistant_id) -> (expires_at, assistant)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _get(self, entries: OrderedDict, key):
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                entries.pop(key, None)
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, entries: OrderedDict, key, value):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def get_user(self, subject: str):
+        return self._get(self._users, subject)
+
+    def put_user(self, subject: str, user):
+        self._put(self._users, subject, user)
+
+    def get_assistant(self, user_id: int, assistant_id: int):
+        return self._get(self._assistants, (user_id, assistant_id))
+
+    def put_assistant(self, user_id: int, assistant_id: int, assistant):
+        self._put(self._assistants, (user_id, assistant_id), assistant)
+
+    def invalidate_user(self, user_id: int):
+        """Forget a user and everything cached for them (role change, deletion)."""
+        with self._lock:
+            for subject in [s for s, (_, user) in self._users.items() if user.id == user_id]:
+                del self._users[subject]
+            for key in [key for key in self._assistants if key[0] == user_id]:
+                del self._assistants[key]
+            self.invalidations += 1
+
+    def invalidate_assistant(self, assistant_id: int):
+        with self._lock:
+            for key in [key for key in self._assistants if key[1] == assistant_id]:
+                del self._assistants[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._users),
+                "assistants": len(self._assistants),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+
+auth_cache = AuthCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
@@ -0,0 +1 @@
+"""Offline benchmarks; run `python -m benchmarks --help`."""
@@ -0,0 +1,73 @@
+import os
+import random
+import fitz  # PyMuPDF
+
+# Common words make up most of the text; every page also carries a few rare
+# identifiers so rare-term lookups (the lexical-only path) have something to hit.
+VOCABULARY = (
+    "analysis approach average balance boundary capacity channel coefficient component condition "
+    "constant context control curve data decision density derivative design distribution domain "
+    "energy equation error estimate factor feature field function gradient graph growth interval "
+    "layer limit linear matrix measure memory method model network node operator order parameter "
+    "pattern point pressure probability process property quantity random rate ratio region result "
+    "sample scale sequence series signal solution space spectrum state structure surface system "
+    "theorem theory transform value variable vector velocity volume wave weight"
+).split()
+PAGE_WORDS = 420
+RARE_TERMS_PER_PAGE = 3
+
+
+def rare_term(page: int, index: int) -> str:
+    return f"ref{page:05d}x{index}"
+
+
+def _sentence(rng: random.Random, page: int) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(len(words)), rare_term(page, rng.randrange(RARE_TERMS_PER_PAGE)))
+    return " ".join(words).capitalize() + "."
+
+
+def page_text(seed: int, pages: int, page: int) -> str:
+    # Seeded per document size too, so a larger corpus never repeats a smaller one's pages
+    # (identical chunks would be served from the embedding dedup cache)
+    rng = random.Random(f"{seed}:{pages}:{page}")
+    sentences, count = [], 0
+    while count < PAGE_WORDS:
+        sentence = _sentence(rng, page)
+        sentences.append(sentence)
+        count += sentence.count(" ") + 1
+    terms = " ".join(rare_term(page, i) for i in range(RARE_TERMS_PER_PAGE))
+    return f"Section {page + 1}. Index terms: {terms}.\n" + " ".join(sentences)
+
+
+def synthetic_pdf(corpus_dir: str, pages: int, seed: int = 0) -> str:
+    """Path of a deterministic `pages`-page text PDF, generated on first use."""
+    os.makedirs(corpus_dir, exist_ok=True)
+    path = os.path.join(corpus_dir, f"synthetic-{pages}p-s{seed}.pdf")
+    if os.path.exists(path):
+        return path
+
+    print(f"--- Generating {pages}-page synthetic PDF ---")
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page(width=595, height=842)  # A4
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), page_text(seed, pages, page_number), fontsize=9)
+    temp_path = f"{path}.tmp"
+    document.save(temp_path, garbage=3, deflate=True)
+    document.close()
+    os.replace(temp_path, path)
+    return path
+
+
+def sample_queries(count: int, seed: int, pages: int) -> list:
+    """Benchmark questions: mostly natural-language, every fifth a rare-term lookup."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if i % 5 == 4:
+            queries.append(f"Where is {rare_term(rng.randrange(pages), rng.randrange(RARE_TERMS_PER_PAGE))} defined?")
+        else:
+            words = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(4, 10)))
+            queries.append(f"How does the {words} relate to question {i}?")
+    return queries
@@ -0,0 +1,145 @@
+import os
+import time
+import hashlib
+from typing import Any, Iterator, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.rag.embeddings import EmbeddingProvider, register_embedding_provider
+from app.rag.storage import LocalBlobBackend
+
+WORDS = (
+    "the model index vector page chapter memory latency cache query answer document search "
+    "matrix gradient network layer token batch storage cluster signal theorem proof example"
+).split()
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors seeded by the text's hash, with simulated API latency."""
+
+    def __init__(self, dim: int = 768, call_latency: float = 0.0, text_latency: float = 0.0):
+        self.dim = dim
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.call_latency + self.text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers with deterministic filler after a configurable delay.
+
+    The first token arrives after first_token_latency, every further one after token_latency.
+    """
+
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    response_tokens: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _words(self, messages: List[BaseMessage]) -> List[str]:
+        rng = np.random.default_rng(_seed(str(messages[-1].content)))
+        return [WORDS[i] for i in rng.integers(0, len(WORDS), self.response_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        words = self._words(messages)
+        time.sleep(self.first_token_latency + self.token_latency * (len(words) - 1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for index, word in enumerate(self._words(messages)):
+            if index:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class ThrottledBlobBackend(LocalBlobBackend):
+    """LocalBlobBackend that adds per-request latency and a bandwidth cap, like a remote store."""
+
+    def __init__(self, root: str, request_latency: float = 0.0, bandwidth: float = 0.0):
+        super().__init__(root)
+        self.request_latency = request_latency
+        self.bandwidth = bandwidth  # bytes/s, 0 = unlimited
+
+    def _delay(self, size: int):
+        time.sleep(self.request_latency + (size / self.bandwidth if self.bandwidth else 0.0))
+
+    def list(self, prefix: str):
+        self._delay(0)
+        return super().list(prefix)
+
+    def upload_file(self, local_path: str, blob_name: str):
+        super().upload_file(local_path, blob_name)
+        self._delay(self._size(blob_name))
+
+    def download_file(self, blob_name: str, dest_path: str):
+        self._delay(self._size(blob_name))
+        super().download_file(blob_name, dest_path)
+
+    def _size(self, blob_name: str) -> int:
+        return os.path.getsize(self._path(blob_name))
+
+
+@register_embedding_provider
+class HashEmbeddingProvider(EmbeddingProvider):
+    """Embedding provider "hash:<dim>" serving HashEmbeddings; latency is set by install_fakes."""
+
+    name = "hash"
+    default_model = "768"
+    call_latency = 0.0
+    requests_per_minute = 10 ** 9
+
+    def __init__(self, model: str = None):
+        super().__init__(model)
+        self.embeddings = HashEmbeddings(int(self.model), self.call_latency)
+
+    def document_embeddings(self) -> Embeddings:
+        return self.embeddings
+
+    def query_embeddings(self) -> Embeddings:
+        return self.embeddings
+
+
+def install_fakes(config: dict):
+    """Point the app's Gemini chat model and Azure client at the stand-ins.
+
+    Embeddings need no patching: scenarios pass config["embedding_model"] (a "hash:<dim>"
+    spec by default, or a real provider such as "local") like an Assistant row would.
+    """
+    from app.rag import chat, storage
+
+    HashEmbeddingProvider.call_latency = config["embedding_call_latency"]
+    chat.build_llm = lambda assistant: FakeChatModel(
+        first_token_latency=config["llm_first_token_latency"],
+        token_latency=config["llm_token_latency"],
+        response_tokens=config["llm_response_tokens"]
+    )
+    storage._backend = ThrottledBlobBackend(
+        storage.settings.LOCAL_BLOB_DIR,
+        request_latency=config["blob_request_latency"],
+        bandwidth=config["blob_bandwidth"]
+    )
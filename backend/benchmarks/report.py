@@ -0,0 +1,55 @@
+import json
+from typing import Iterator, Tuple
+
+# Metric direction by name; anything else (counts, sizes, config) is not compared
+HIGHER_IS_BETTER = ("_per_second",)
+LOWER_IS_BETTER = ("_ms", "_seconds")
+
+
+def round_floats(value, digits: int = 3):
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {key: round_floats(item, digits) for key, item in value.items()}
+    if isinstance(value, list):
+        return [round_floats(item, digits) for item in value]
+    return value
+
+
+def write_report(report: dict, path: str):
+    # Sorted keys and rounded numbers keep diffs between runs readable
+    with open(path, "w") as file:
+        json.dump(round_floats(report), file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def _row_id(row: dict) -> str:
+    # Rows of a scenario are told apart by their parameters, not their position
+    return ",".join(f"{key}={row[key]}" for key in ("pages", "top_k", "concurrency") if key in row)
+
+
+def flatten(value, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{path}.{key}" if path else key)
+    elif isinstance(value, list):
+        for item in value:
+            yield from flatten(item, f"{path}[{_row_id(item)}]" if isinstance(item, dict) else path)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield path, float(value)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Metrics that got worse by more than `threshold` (a fraction); each as (name, old, new, change)."""
+    old = dict(flatten(baseline["scenarios"]))
+    regressions = []
+    for name, new in flatten(current["scenarios"]):
+        if name not in old or old[name] == 0:
+            continue
+        leaf = name.rsplit(".", 1)[-1]
+        change = (new - old[name]) / old[name]
+        if leaf.endswith(HIGHER_IS_BETTER) and change < -threshold:
+            regressions.append((name, old[name], new, change))
+        elif leaf.endswith(LOWER_IS_BETTER) and change > threshold:
+            regressions.append((name, old[name], new, change))
+    return regressions
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import shutil
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from app.database import models
+from app.rag import chat
+from app.rag.cache import vector_store_cache
+from app.rag.embeddings import get_embedding_provider, get_query_embeddings
+from app.rag.ingest import ingest_pdf
+from app.rag.load import TEMP_DATA_DIR, load_rag_engine, local_cache
+from app.rag.retrieval import HybridSearch
+from app.rag.storage import delete_assistant_data, upload_assistant_data
+from app.security.auth_cache import auth_cache
+from benchmarks.corpus import sample_queries, synthetic_pdf
+
+BENCH_USER_ID = 1
+
+
+def storage_key(pages: int) -> str:
+    return f"bench-{pages}p"
+
+
+def latency_summary(samples: list) -> dict:
+    ordered = sorted(samples)
+
+    def percentile(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50) * 1000,
+        "p95_ms": percentile(0.95) * 1000,
+        "max_ms": ordered[-1] * 1000
+    }
+
+
+def run_ingest(config: dict, pages: int) -> dict:
+    """Extract, embed and index a synthetic PDF, then upload it; the store is left in blob storage."""
+    key = storage_key(pages)
+    pdf_path = synthetic_pdf(config["corpus_dir"], pages, config["seed"])
+    output_dir = os.path.join("bench_ingest", key)
+
+    delete_assistant_data(key)
+    started = time.perf_counter()
+    chunks = 0
+    for message in ingest_pdf(pdf_path, key, config["chunk_size"], config["chunk_overlap"], total_pages=pages,
+                              index_type=config["index_type"], document_id=f"{key}-doc", output_dir=output_dir,
+                              embedding_model=config["embedding_model"]):
+        event = json.loads(message)
+        if event["status"] == "ingestion_complete":
+            chunks = event["chunks"]
+    ingest_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    upload_assistant_data(output_dir, key)
+    upload_seconds = time.perf_counter() - started
+    store_bytes = local_cache.directory_bytes(output_dir)
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        "pages": pages,
+        "chunks": chunks,
+        "ingest_seconds": ingest_seconds,
+        "pages_per_second": pages / ingest_seconds,
+        "chunks_per_second": chunks / ingest_seconds,
+        "upload_seconds": upload_seconds,
+        "store_bytes": store_bytes
+    }
+
+
+def _drop_local_copy(key: str):
+    vector_store_cache.invalidate(key)
+    local_cache.forget(key)
+    shutil.rmtree(os.path.join(TEMP_DATA_DIR, key), ignore_errors=True)
+
+
+def _timed_load(key: str) -> float:
+    started = time.perf_counter()
+    load_rag_engine(key)
+    return time.perf_counter() - started
+
+
+def run_load(config: dict, pages: int) -> dict:
+    """Cold (download + open), disk-warm (open only) and warm (in-memory cache) store loads."""
+    key = storage_key(pages)
+    repeats = config["load_repeats"]
+
+    cold = []
+    for _ in range(repeats):
+        _drop_local_copy(key)
+        cold.append(_timed_load(key))
+
+    disk_warm = []
+    for _ in range(repeats):
+        vector_store_cache.invalidate(key)
+        disk_warm.append(_timed_load(key))
+
+    warm = [_timed_load(key) for _ in range(repeats * 10)]
+    return {
+        "pages": pages,
+        "cold": latency_summary(cold),
+        "disk_warm": latency_summary(disk_warm),
+        "warm": latency_summary(warm)
+    }
+
+
+def run_retrieval(config: dict, pages: int) -> list:
+    """Hybrid search QPS per top_k, single-threaded and with query embedding excluded."""
+    vector_store = load_rag_engine(storage_key(pages))
+    queries = sample_queries(config["queries"], config["seed"], pages)
+    vectors = get_query_embeddings(config["embedding_model"]).embed_documents(queries)
+
+    results = []
+    for top_k in config["top_k"]:
+        latencies = []
+        started = time.perf_counter()
+        for query, vector in zip(queries, vectors):
+            query_started = time.perf_counter()
+            search = HybridSearch(vector_store, query, top_k)
+            if search.lexical_only() is None:
+                search.fused(vector)
+            latencies.append(time.perf_counter() - query_started)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "pages": pages,
+            "top_k": top_k,
+            "queries_per_second": len(queries) / elapsed,
+            "latency": latency_summary(latencies)
+        })
+    return results
+
+
+def run_query_embedding(config: dict) -> dict:
+    """Uncached single-query embedding latency of the configured provider."""
+    embeddings = get_embedding_provider(config["embedding_model"]).query_embeddings()
+    queries = sample_queries(config["queries"], config["seed"] + 1, 1)
+    embeddings.embed_query(queries[0])  # model load / connection setup
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - started)
+    return {"embedding_model": config["embedding_model"], "latency": latency_summary(latencies)}
+
+
+def bench_assistant(pages: int, config: dict) -> models.Assistant:
+    """A detached Assistant row for the chat endpoint, served from the auth cache instead of the database."""
+    assistant = models.Assistant(
+        id=100_000 + pages, name=f"Benchmark {pages}p", file_name=f"synthetic-{pages}p.pdf",
+        owner_id=BENCH_USER_ID, top_k=config["chat_top_k"], temperature=0.5,
+        chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"],
+        embedding_model=config["embedding_model"]
+    )
+    # storage_key resolves through the artifact, which points at the store run_ingest uploaded
+    assistant.artifact = models.IndexArtifact(blob_prefix=storage_key(pages))
+    assistant.documents = []
+    return assistant
+
+
+def run_chat(config: dict, pages: int) -> list:
+    """End-to-end POST /chat/ handler (retrieval + prompt packing + fake LLM) at several concurrency levels."""
+    assistant = bench_assistant(pages, config)
+    user = models.User(id=BENCH_USER_ID, username="benchmark")
+    auth_cache.put_assistant(BENCH_USER_ID, assistant.id, assistant)
+    load_rag_engine(assistant.storage_key)
+
+    results = []
+    for concurrency in config["concurrency"]:
+        # Fresh questions per level, so the query embedding cache doesn't carry over
+        queries = sample_queries(config["chat_requests"], config["seed"] + concurrency, pages)
+
+        def ask(query):
+            started = time.perf_counter()
+            chat.chat_with_assistant(chat.ChatRequest(assistant_id=assistant.id, query=query),
+                                     db=None, current_user=user)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(ask, queries))
+        elapsed = time.perf_counter() - started
+        results.append({
+            "pages": pages,
+            "concurrency": concurrency,
+            "requests_per_second": len(queries) / elapsed,
+            "latency": latency_summary(latencies)
+        })
+    return results
+
@@ -1,5 +1,5 @@
 import React from 'react';
-import { Assistant } from '@/services/assistant.service';
+import { Assistant, thumbnailSrc } from '@/services/assistant.service';
 import { Bot, Sparkles, Book } from 'lucide-react';
 
 interface GeminiWelcomeProps {
@@ -12,9 +12,9 @@ export const GeminiWelcome: React.FC<GeminiWelcomeProps> = ({ assistant, onSugge
         <div className="w-full max-w-3xl mx-auto text-center animate-fade-in">
             <div className="space-y-2">
                 <div className="inline-flex items-center justify-center h-24 w-17 border border-border/50 mb-4 overflow-hidden">
-                    {assistant.image_base64 ? (
+                    {assistant.thumbnail_url ? (
                         <img 
-                            src={`data:image/png;base64,${assistant.image_base64}`} 
+                            src={thumbnailSrc(assistant.thumbnail_url)} 
                             alt={assistant.name}
                             className="h-full w-full object-contain"
                         />
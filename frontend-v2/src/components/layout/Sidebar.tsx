@@ -3,6 +3,7 @@ import { Plus, Trash2, Bot, Settings, Book, MoreVertical, Info, LogOut, Sun, Moo
 import { useNavigate } from 'react-router-dom';
 import { useAssistants } from '@/contexts/AssistantContext';
 import { useAuth } from '@/contexts/AuthContext';
+import { thumbnailSrc } from '@/services/assistant.service';
 import { Button } from '@/components/ui/button';
 import {
   Sidebar as SidebarRoot,
@@ -128,9 +129,9 @@ export const Sidebar: React.FC = () => {
                           size="lg"
                         >
                           <div className="h-10 w-7 flex items-center justify-center shrink-0 overflow-hidden border border-border/50">
-                            {assistant.image_base64 ? (
+                            {assistant.thumbnail_url ? (
                               <img
-                                src={`data:image/png;base64,${assistant.image_base64}`}
+                                src={thumbnailSrc(assistant.thumbnail_url)}
                                 alt={assistant.name}
                                 className="h-full w-full object-contain"
                               />
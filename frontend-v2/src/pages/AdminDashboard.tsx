@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useAuth } from '@/contexts/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { adminService, UserWithAssistants } from '@/services/admin.service';
+import { thumbnailSrc } from '@/services/assistant.service';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
@@ -236,9 +237,9 @@ export const AdminDashboard: React.FC = () => {
                             >
                               {/* Thumbnail */}
                               <div className="h-16 w-12 flex-shrink-0 border border-border/50 overflow-hidden">
-                                {assistant.image_base64 ? (
+                                {assistant.thumbnail_url ? (
                                   <img
-                                    src={`data:image/png;base64,${assistant.image_base64}`}
+                                    src={thumbnailSrc(assistant.thumbnail_url)}
                                     alt={assistant.name}
                                     className="h-full w-full object-contain"
                                   />
@@ -12,7 +12,7 @@ export interface UserWithAssistants {
     top_k: number;
     chunk_size: number;
     chunk_overlap: number;
-    image_base64?: string;
+    thumbnail_url?: string;
   }[];
 }
 
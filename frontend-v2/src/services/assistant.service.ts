@@ -8,7 +8,7 @@ export interface Assistant {
   top_k: number;
   chunk_size: number;
   chunk_overlap: number;
-  image_base64?: string;
+  thumbnail_url?: string;
 }
 
 export interface CreateAssistantProgress {
@@ -27,6 +27,9 @@ export interface CreateAssistantParams {
   file: File;
 }
 
+// Thumbnail URLs are relative to the API and need no auth header, so <img> can load them
+export const thumbnailSrc = (thumbnailUrl: string) => `${API_BASE_URL}${thumbnailUrl}`;
+
 export const assistantService = {
   async getAssistants(): Promise<Assistant[]> {
     const response = await api.get<Assistant[]>('/assistants/');